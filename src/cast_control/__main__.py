@@ -1,5 +1,3 @@
-from anyio._backends import *
-
 from .app.cli import cli
 
 
@@ -6,9 +6,9 @@ from typing import Final, NamedTuple
 import click
 
 from .daemon import Args, MprisDaemon, get_daemon, get_daemon_from_args
-from .run import run_safe
+from .instances import Instance, find_instance, get_instances
 from .. import CLI_MODULE_NAME, ENTRYPOINT_NAME, HOMEPAGE, __copyright__, __version__
-from ..base import DEFAULT_DEVICE_NAME, DEFAULT_RETRY_WAIT, LOG, LOG_LEVEL, NAME, Rc, Seconds
+from ..base import DEFAULT_DEVICE_NAME, DEFAULT_RETRY_WAIT, LOG_LEVEL, NAME, Rc, Seconds
 
 
 assert __name__ == CLI_MODULE_NAME
@@ -16,12 +16,15 @@ assert __name__ == CLI_MODULE_NAME
 
 log: Final[logging.Logger] = logging.getLogger(__name__)
 
-LOG_MODE: Final[str] = 'r'
 LOG_END: Final[str] = ''
+LOG_LEVELS: Final[tuple[str, ...]] = 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
 
 VERSION_INFO: Final[str] = f'{NAME} v{__version__}'
 
 NOT_RUNNING_MSG: Final[str] = "Daemon isn't running."
+NOTHING_CHANGED_MSG: Final[str] = 'Nothing changed.'
+RUNNING: Final[str] = 'running'
+STOPPED: Final[str] = 'stopped'
 HELP: Final[str] = f'''
 Control casting devices via Linux media controls and desktops.
 
@@ -89,6 +92,27 @@ RETRY_ARGS: Final[CliArgs] = CliArgs(
   )
 )
 
+DEVICE_ARGS: Final[CliArgs] = CliArgs(
+  args=('--device', '-d'),
+  kwargs=dict(
+    multiple=True,
+    show_default=True,
+    type=click.STRING,
+    help="Serve several devices from one process. Takes a name, host or UUID, and can be repeated."
+  )
+)
+
+ALL_ARGS: Final[CliArgs] = CliArgs(
+  args=('--all', '-a', 'attach_all'),
+  kwargs=dict(
+    is_flag=True,
+    default=False,
+    show_default=True,
+    type=click.BOOL,
+    help="Serve every device on the network as it appears, and stop serving devices that leave."
+  )
+)
+
 ICON_ARGS: Final[CliArgs] = CliArgs(
   args=('--icon', '-i'),
   kwargs=dict(
@@ -111,6 +135,103 @@ LOG_ARGS: Final[CliArgs] = CliArgs(
 )
 
 
+WATCH_ARGS: Final[CliArgs] = CliArgs(
+  args=('--watch', '-w'),
+  kwargs=dict(
+    is_flag=True,
+    default=False,
+    show_default=True,
+    type=click.BOOL,
+    help="Keep printing changes as they happen."
+  )
+)
+
+JSON_ARGS: Final[CliArgs] = CliArgs(
+  args=('--json', '-j', 'as_json'),
+  kwargs=dict(
+    is_flag=True,
+    default=False,
+    show_default=True,
+    type=click.BOOL,
+    help="Print the service's replies as JSON lines."
+  )
+)
+
+TAIL_ARGS: Final[CliArgs] = CliArgs(
+  args=('--tail', '-n'),
+  kwargs=dict(
+    default=None,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Only show the last N lines, in whole records, without reading the rest of the log."
+  )
+)
+
+FOLLOW_ARGS: Final[CliArgs] = CliArgs(
+  args=('--follow', '-f'),
+  kwargs=dict(
+    is_flag=True,
+    default=False,
+    show_default=True,
+    type=click.BOOL,
+    help="Keep showing lines as they're written."
+  )
+)
+
+LEVEL_ARGS: Final[CliArgs] = CliArgs(
+  args=('--level', '-L'),
+  kwargs=dict(
+    default=None,
+    show_default=True,
+    type=click.Choice(LOG_LEVELS, case_sensitive=False),
+    help="Only show records at or above this level."
+  )
+)
+
+LOGGER_ARGS: Final[CliArgs] = CliArgs(
+  args=('--logger', '-m'),
+  kwargs=dict(
+    multiple=True,
+    show_default=True,
+    type=click.STRING,
+    help="Only show records from this logger and its children, like cast_control.device. Can be repeated."
+  )
+)
+
+
+INSTANCE_ARGS: Final[CliArgs] = CliArgs(
+  args=('instance',),
+  kwargs=dict(
+    required=False,
+    default=None,
+    type=click.STRING,
+  )
+)
+
+
+def reload_service(daemon: MprisDaemon, instance: Instance):
+  """Apply the saved args in place, and only restart if they need a new process"""
+  from . import client
+
+  try:
+    reply = client.reload(instance.socket)
+
+  except client.ClientError as e:
+    click.echo(f"Couldn't reload, restarting instead: {e}")
+    daemon.restart()
+    return
+
+  if reply['restart']:
+    click.echo(f"Restarting to apply {', '.join(reply['changed'])}.")
+    daemon.restart()
+
+  elif changed := reply['changed']:
+    click.echo(f"Reloaded {', '.join(changed)}.")
+
+  else:
+    click.echo(NOTHING_CHANGED_MSG)
+
+
 # see https://alexdelorenzo.dev/notes/click
 class OrderAsCreated(click.Group):
   """List `click` commands in the order they're declared."""
@@ -164,6 +285,8 @@ assert cli.name == ENTRYPOINT_NAME
 @click.option(*UUID_ARGS.args, **UUID_ARGS.kwargs)
 @click.option(*WAIT_ARGS.args, **WAIT_ARGS.kwargs)
 @click.option(*RETRY_ARGS.args, **RETRY_ARGS.kwargs)
+@click.option(*DEVICE_ARGS.args, **DEVICE_ARGS.kwargs)
+@click.option(*ALL_ARGS.args, **ALL_ARGS.kwargs)
 @click.option(*ICON_ARGS.args, **ICON_ARGS.kwargs)
 @click.option(*LOG_ARGS.args, **LOG_ARGS.kwargs)
 def connect(
@@ -172,13 +295,51 @@ def connect(
   uuid: str | None,
   wait: Seconds | None,
   retry_wait: Seconds | None,
+  device: tuple[str, ...],
+  attach_all: bool,
   icon: bool,
   log_level: str
 ):
-  args = Args(name, host, uuid, wait, retry_wait, icon, log_level, set_logging=True)
+  from .run import run_safe
+
+  args = Args(name, host, uuid, wait, retry_wait, icon, log_level, set_logging=True, devices=device, attach_all=attach_all)
   run_safe(args)
 
 
+@cli.command(help="Show what the background service is playing, without looking for devices.")
+@click.argument(*INSTANCE_ARGS.args, **INSTANCE_ARGS.kwargs)
+@click.option(*WATCH_ARGS.args, **WATCH_ARGS.kwargs)
+@click.option(*JSON_ARGS.args, **JSON_ARGS.kwargs)
+def status(instance: str | None, watch: bool, as_json: bool):
+  from . import client
+
+  path = find_instance(instance).socket
+
+  try:
+    if as_json:
+      lines = client.subscribe(path) if watch else [client.get_status(path)]
+
+      for line in lines:
+        click.echo(line, nl=False)
+
+    elif watch:
+      for line in client.watch(client.subscribe(path)):
+        click.echo(line)
+
+    else:
+      reply = client.parse(client.get_status(path))
+
+      for line in client.format_status(reply):
+        click.echo(line)
+
+  except client.ClientError as e:
+    log.error(e)
+    quit(Rc.NOT_RUNNING)
+
+  except KeyboardInterrupt:
+    pass
+
+
 @cli.group(
   cls=OrderAsCreated,
   help='Connect, disconnect or reconnect the background service to or from your device.',
@@ -193,6 +354,8 @@ def service():
 @click.option(*UUID_ARGS.args, **UUID_ARGS.kwargs)
 @click.option(*WAIT_ARGS.args, **WAIT_ARGS.kwargs)
 @click.option(*RETRY_ARGS.args, **RETRY_ARGS.kwargs)
+@click.option(*DEVICE_ARGS.args, **DEVICE_ARGS.kwargs)
+@click.option(*ALL_ARGS.args, **ALL_ARGS.kwargs)
 @click.option(*ICON_ARGS.args, **ICON_ARGS.kwargs)
 @click.option(*LOG_ARGS.args, **LOG_ARGS.kwargs)
 def connect(
@@ -201,42 +364,56 @@ def connect(
   uuid: str | None,
   wait: Seconds | None,
   retry_wait: Seconds | None,
+  device: tuple[str, ...],
+  attach_all: bool,
   icon: bool,
   log_level: str
 ):
-  args = Args(name, host, uuid, wait, retry_wait, icon, log_level)
+  from .run import run_service
+
+  args = Args(name, host, uuid, wait, retry_wait, icon, log_level, devices=device, attach_all=attach_all)
   args.save()
+  daemon = get_daemon_from_args(run_service, args)
+
+  if daemon.pid:
+    # already running, apply the new args without reconnecting
+    reload_service(daemon, args.instance)
+    return
 
   try:
-    daemon = get_daemon_from_args(run_safe, args)
     daemon.start()
 
   except Exception as e:
     log.exception(e)
     log.error("Error launching daemon.")
 
-    args.delete()
+    Args.delete(args.instance)
 
 
 @service.command(help='Disconnect the background service from the device.')
-def disconnect():
-  daemon = get_daemon()
+@click.argument(*INSTANCE_ARGS.args, **INSTANCE_ARGS.kwargs)
+def disconnect(instance: str | None):
+  instance = find_instance(instance)
+  daemon = get_daemon(_instance=instance)
 
   if not daemon.pid:
     log.error(NOT_RUNNING_MSG)
     quit(Rc.NOT_RUNNING)
 
   daemon.stop()
-  Args.delete()
+  Args.delete(instance)
 
 
 @service.command(help='Reconnect the background service to the device.')
-def reconnect():
+@click.argument(*INSTANCE_ARGS.args, **INSTANCE_ARGS.kwargs)
+def reconnect(instance: str | None):
+  from .run import run_service
+
   daemon: MprisDaemon | None = None
-  args = Args.load()
+  args = Args.load(find_instance(instance))
 
   if args:
-    daemon = get_daemon_from_args(run_safe, args)
+    daemon = get_daemon_from_args(run_service, args)
 
   if not args or not daemon.pid:
     log.error(NOT_RUNNING_MSG)
@@ -245,15 +422,62 @@ def reconnect():
   daemon.restart()
 
 
-@service.command(help='Show the service log.')
-def log():
-  click.echo(f"<Log file: {LOG}>")
+@service.command(help='Apply the saved args to the background service without reconnecting.')
+@click.argument(*INSTANCE_ARGS.args, **INSTANCE_ARGS.kwargs)
+def reload(instance: str | None):
+  from .run import run_service
+
+  daemon: MprisDaemon | None = None
+  args = Args.load(instance := find_instance(instance))
+
+  if args:
+    daemon = get_daemon_from_args(run_service, args)
+
+  if not args or not daemon.pid:
+    log.error(NOT_RUNNING_MSG)
+    quit(Rc.NOT_RUNNING)
+
+  reload_service(daemon, instance)
+
+
+@service.command(name='log', help='Show the service log.')
+@click.argument(*INSTANCE_ARGS.args, **INSTANCE_ARGS.kwargs)
+@click.option(*TAIL_ARGS.args, **TAIL_ARGS.kwargs)
+@click.option(*FOLLOW_ARGS.args, **FOLLOW_ARGS.kwargs)
+@click.option(*LEVEL_ARGS.args, **LEVEL_ARGS.kwargs)
+@click.option(*LOGGER_ARGS.args, **LOGGER_ARGS.kwargs)
+def show_log(
+  instance: str | None,
+  tail: int | None,
+  follow: bool,
+  level: str | None,
+  logger: tuple[str, ...],
+):
+  from .logs import LogFilter, read_log
+
+  path = find_instance(instance).log
+
+  if not path.exists():
+    log.error(f"There's no log at {path}.")
+    quit(Rc.NOT_RUNNING)
+
+  click.echo(f"<Log file: {path}>")
+
+  # a large log could hang Python or the system, so
+  # stream it instead of using Path.read_text()
+  try:
+    for line in read_log(path, LogFilter(level, logger), tail, follow):
+      print(line, end=LOG_END, flush=follow)
+
+  except KeyboardInterrupt:
+    pass
+
 
-  # a large log could hang Python or the system
-  # iterate over the file instead of using Path.read_text()
-  with LOG.open(LOG_MODE) as file:
-    for line in file:
-      print(line, end=LOG_END)
+@service.command(name='list', help='List background service instances.')
+def list_instances():
+  for instance in get_instances():
+    state = RUNNING if instance.is_running() else STOPPED
+    click.echo(f'{instance}\t{state}\t{instance.get_pid()}\t{instance.log}')
 
 
 if __name__ == "__main__":
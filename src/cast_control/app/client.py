@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import socket
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Final
+
+from .retry import Attempt
+
+
+# only import the standard library and .retry here, the client talks to
+# a running service and shouldn't pay for discovery or D-Bus
+
+ENCODING: Final[str] = 'utf-8'
+NEWLINE: Final[str] = '\n'
+STATUS: Final[str] = 'status'
+SUBSCRIBE: Final[str] = 'subscribe'
+RELOAD: Final[str] = 'reload'
+CHANGED: Final[str] = 'changed'
+TIMEOUT: Final[float] = 5.0
+RELOAD_TIMEOUT: Final[float] = 15.0  # the service waits up to 10 seconds for its loop
+
+FIELD_SEP: Final[str] = ' '
+TITLE_SEP: Final[str] = ' – '
+NO_TIME: Final[str] = '--:--'
+SEC_IN_MIN: Final[int] = 60
+
+# every field but the position, which changes without an event
+WATCHED: Final[tuple[str, ...]] = (
+  'device', 'app', 'state', 'title', 'artist', 'album', 'duration', 'volume', 'mute', 'url', 'art_url',
+)
+
+type Reply = dict[str, Any]
+
+
+class ClientError(Exception):
+  pass
+
+
+def connect(path: Path, timeout: float | None = TIMEOUT) -> socket.socket:
+  client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  client.settimeout(timeout)
+
+  try:
+    client.connect(str(path))
+
+  except OSError as e:
+    client.close()
+    raise ClientError(f"Couldn't connect to the service at {path}: {e}") from e
+
+  return client
+
+
+def get_lines(client: socket.socket) -> Iterator[str]:
+  with client.makefile('r', encoding=ENCODING) as file:
+    yield from file
+
+
+def parse(line: str) -> Reply:
+  reply: Reply = json.loads(line)
+
+  if not reply.get('ok', True):
+    raise ClientError(reply.get('error'))
+
+  return reply
+
+
+def send(path: Path, command: str, timeout: float | None = TIMEOUT) -> Iterator[str]:
+  """Send a command to the service, and yield every line it replies with"""
+  with connect(path, timeout) as client:
+    client.sendall(f'{command}{NEWLINE}'.encode(ENCODING))
+    yield from get_lines(client)
+
+
+def get_reply(path: Path, command: str, timeout: float | None = TIMEOUT) -> str:
+  for line in send(path, command, timeout):
+    return line
+
+  raise ClientError('The service closed the connection.')
+
+
+def get_status(path: Path) -> str:
+  return get_reply(path, STATUS)
+
+
+def reload(path: Path) -> Reply:
+  """Make the service apply its saved args, the reply says if it needs a restart"""
+  return parse(get_reply(path, RELOAD, RELOAD_TIMEOUT))
+
+
+def subscribe(path: Path) -> Iterator[str]:
+  """The status, then a line for every change, until the service stops"""
+  yield from send(path, SUBSCRIBE, timeout=None)
+
+
+def format_time(seconds: float | None) -> str:
+  if seconds is None:
+    return NO_TIME
+
+  minutes, seconds = divmod(int(seconds), SEC_IN_MIN)
+  return f'{minutes:02}:{seconds:02}'
+
+
+def format_player(status: Reply) -> str:
+  titles = TITLE_SEP.join(title for key in ('title', 'artist') if (title := status.get(key)))
+  position = format_time(status.get('position'))
+  duration = format_time(status.get('duration'))
+  volume = status.get('volume')
+
+  fields = [
+    f"{status['player']}:",
+    str(status.get('state')),
+    titles or '-',
+    f'[{position}/{duration}]',
+    f'vol {volume:.0%}' if volume is not None else 'vol -',
+  ]
+
+  if status.get('mute'):
+    fields.append('(muted)')
+
+  if app := status.get('app'):
+    fields.append(f'({app})')
+
+  return FIELD_SEP.join(fields)
+
+
+def format_attempts(reply: Reply) -> Iterator[str]:
+  for attempt in reply.get('attempts', ()):
+    yield f'Attempt {Attempt(**attempt)}'
+
+
+def format_status(reply: Reply) -> Iterator[str]:
+  yield from map(format_player, reply['players'])
+  yield from format_attempts(reply)
+
+
+def get_changes(old: Reply, new: Reply) -> Reply:
+  """The fields that changed, or the position if only the position did"""
+  if changes := {key: new.get(key) for key in WATCHED if new.get(key) != old.get(key)}:
+    return changes
+
+  return dict(position=new.get('position'))
+
+
+def format_changes(player: str, changes: Reply) -> str:
+  fields = (f'{key}={value}' for key, value in changes.items())
+  return FIELD_SEP.join((f'{player}:', *fields))
+
+
+def watch(lines: Iterator[str]) -> Iterator[str]:
+  """Format the status, then only what changed for each player"""
+  players: dict[str, Reply] = {}
+
+  for line in lines:
+    reply = parse(line)
+
+    if reply.get('event') != CHANGED:
+      players = {status['player']: status for status in reply['players']}
+      yield from format_status(reply)
+      continue
+
+    name = reply['player']
+    old = players.get(name)
+    players[name] = reply
+
+    if old is None:
+      yield format_player(reply)
+
+    else:
+      yield format_changes(name, get_changes(old, reply))
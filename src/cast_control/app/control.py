@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import select
+import socket
+from collections.abc import Callable
+from concurrent.futures import Future
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from pathlib import Path
+from queue import Empty, Full, Queue
+from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+from threading import Lock, Thread
+from typing import Any, Final, override
+
+from gi.repository import GLib
+from mpris_server import PlayState, Server
+
+from .retry import Backoff
+from ..base import US_IN_SEC
+from ..device.base import Snapshot
+
+
+log: Final[logging.Logger] = logging.getLogger(__name__)
+
+ENCODING: Final[str] = 'utf-8'
+NEWLINE: Final[bytes] = b'\n'
+SOCKET_MODE: Final[int] = 0o600
+SOCKET_UMASK: Final[int] = 0o177  # leaves SOCKET_MODE while binding
+DIR_MODE: Final[int] = 0o700
+MAX_LINE: Final[int] = 1_024  # bytes per request
+MAX_QUEUED: Final[int] = 64  # events a slow subscriber can fall behind by
+RELATIVE: Final[tuple[str, ...]] = ('+', '-')
+SEPARATORS: Final[tuple[str, str]] = (',', ':')
+LOOP_TIMEOUT: Final[float] = 4.0  # seconds to wait for the GLib loop, under the client's timeout
+CLOSED_CHECK: Final[float] = 1.0  # seconds between checks that a subscriber is still connected
+NO_WAIT: Final[float] = 0.0
+PEEK_SIZE: Final[int] = 1
+
+type Players = Callable[[], dict[str, Server]]
+type Reply = dict[str, Any]
+type Command = Callable[[Server, list[str]], Reply | None]
+type Reload = Callable[[], Reply]
+
+
+class ControlError(Exception):
+  pass
+
+
+def call_in_loop[T](func: Callable[[], T], timeout: float = LOOP_TIMEOUT) -> T:
+  """Run `func` on the GLib loop's thread, where players and devices are used, and wait for its result"""
+  future: Future[T] = Future()
+
+  def call() -> bool:
+    try:
+      future.set_result(func())
+
+    except Exception as e:
+      future.set_exception(e)
+
+    return GLib.SOURCE_REMOVE
+
+  GLib.idle_add(call)
+
+  try:
+    return future.result(timeout)
+
+  except TimeoutError as e:
+    raise ControlError(f"The service didn't answer within {timeout} seconds.") from e
+
+
+def dumps(reply: Reply) -> bytes:
+  return json.dumps(reply, separators=SEPARATORS, default=str).encode(ENCODING) + NEWLINE
+
+
+def to_seconds(us: int | None) -> float | None:
+  if us is None:
+    return None
+
+  return us / US_IN_SEC
+
+
+def get_status(name: str, server: Server) -> Reply:
+  """Everything here is read from the wrapper's memory, nothing asks the device"""
+  wrapper = server.adapter.wrapper
+  snapshot: Snapshot = wrapper.snapshot
+  title, artist, album, _ = snapshot.titles
+
+  return dict(
+    player=name,
+    device=wrapper.name,
+    app=wrapper.device.app_display_name,
+    state=snapshot.playstate,
+    title=title,
+    artist=artist,
+    album=album,
+    position=to_seconds(wrapper.get_current_position()),
+    duration=to_seconds(snapshot.duration),
+    volume=snapshot.volume,
+    mute=snapshot.is_mute,
+    url=snapshot.url,
+    art_url=snapshot.art_url,
+    titles_cache=wrapper.titles_cache_info()._asdict(),
+  )
+
+
+def get_number(args: list[str]) -> tuple[Decimal, bool]:
+  """The first argument as a number, and whether it's relative"""
+  if not args:
+    raise ControlError('Missing a number.')
+
+  arg, *_ = args
+
+  try:
+    number = Decimal(arg)
+
+  except InvalidOperation as e:
+    raise ControlError(f'Not a number: {arg}') from e
+
+  # Decimal takes nan and inf too
+  if not number.is_finite():
+    raise ControlError(f'Not a finite number: {arg}')
+
+  return number, arg.startswith(RELATIVE)
+
+
+def seek(server: Server, args: list[str]) -> None:
+  wrapper = server.adapter.wrapper
+  seconds, relative = get_number(args)
+  position = round(seconds * US_IN_SEC)
+
+  if relative:
+    position += wrapper.get_current_position()
+
+  wrapper.seek(max(position, 0))
+
+
+def set_volume(server: Server, args: list[str]) -> None:
+  wrapper = server.adapter.wrapper
+  volume, relative = get_number(args)
+
+  if relative:
+    volume += Decimal(str(wrapper.get_volume() or 0))
+
+  wrapper.set_volume(float(min(max(volume, 0), 1)))
+
+
+def toggle_mute(server: Server, args: list[str]) -> None:
+  wrapper = server.adapter.wrapper
+  wrapper.set_mute(not wrapper.is_mute())
+
+
+def toggle(server: Server, args: list[str]) -> None:
+  wrapper = server.adapter.wrapper
+
+  if wrapper.get_playstate() == PlayState.PLAYING:
+    wrapper.pause()
+
+  else:
+    wrapper.play()
+
+
+COMMANDS: Final[dict[str, Command]] = {
+  'play': lambda server, args: server.adapter.wrapper.play(),
+  'pause': lambda server, args: server.adapter.wrapper.pause(),
+  'toggle': toggle,
+  'stop': lambda server, args: server.adapter.wrapper.stop(),
+  'next': lambda server, args: server.adapter.wrapper.next(),
+  'previous': lambda server, args: server.adapter.wrapper.previous(),
+  'seek': seek,
+  'volume': set_volume,
+  'mute': toggle_mute,
+}
+
+
+class Subscriber:
+  events: Queue[bytes | None]
+
+  def __init__(self):
+    self.events = Queue(MAX_QUEUED)
+
+  def send(self, event: bytes) -> bool:
+    try:
+      self.events.put_nowait(event)
+      return True
+
+    except Full:
+      return False
+
+  def close(self):
+    try:
+      self.events.put_nowait(None)
+
+    except Full:
+      pass
+
+
+class ControlHandler(StreamRequestHandler):
+  """
+    Serve one client.
+
+    Each request is a line, `<command> [args...] [@player]`. Each reply is
+    a line of JSON. After `subscribe`, the client gets a line of JSON for
+    every change until it disconnects.
+  """
+
+  server: ControlServer
+
+  def _reply(self, reply: Reply):
+    self.wfile.write(dumps(reply))
+
+  def _get_player(self, args: list[str]) -> tuple[str, Server]:
+    players = self.server.get_players()
+
+    if args and args[-1].startswith('@'):
+      name = args.pop().removeprefix('@')
+
+      if not (server := players.get(name)):
+        raise ControlError(f'No player named {name}.')
+
+      return name, server
+
+    if len(players) != 1:
+      raise ControlError(f'Choose one of {len(players)} players with @<name>.')
+
+    name, server = next(iter(players.items()))
+    return name, server
+
+  def _is_closed(self) -> bool:
+    """True if the client hung up, without reading what it sent"""
+    readable, _, _ = select.select([self.connection], [], [], NO_WAIT)
+
+    if not readable:
+      return False
+
+    try:
+      return not self.connection.recv(PEEK_SIZE, socket.MSG_PEEK)
+
+    except OSError:
+      return True
+
+  def _status(self) -> Reply:
+    players = self.server.get_players()
+    statuses = [get_status(name, server) for name, server in players.items()]
+    attempts = [attempt._asdict() for attempt in backoff] if (backoff := self.server.backoff) else []
+
+    return dict(ok=True, players=statuses, attempts=attempts)
+
+  def _reload(self) -> Reply:
+    if not (reload := self.server.reload):
+      raise ControlError("This service can't reload its args.")
+
+    return reload()
+
+  def _subscribe(self):
+    subscriber = self.server.subscribe()
+
+    try:
+      self._reply(call_in_loop(self._status))
+
+      while True:
+        try:
+          event = subscriber.events.get(timeout=CLOSED_CHECK)
+
+        except Empty:
+          # nothing changed for a while, so make sure someone's still listening
+          if self._is_closed():
+            break
+
+          continue
+
+        if event is None:
+          break
+
+        self.wfile.write(event)
+
+    except OSError:
+      pass  # the client went away
+
+    finally:
+      self.server.unsubscribe(subscriber)
+
+  def _command(self, func: Command, args: list[str]) -> Reply:
+    name, server = self._get_player(args)
+    func(server, args)
+
+    return dict(ok=True, player=name)
+
+  def _handle(self, line: str) -> Reply | None:
+    command, *args = line.split()
+
+    # players and devices are used from the GLib loop, so commands run there
+    if command == 'status':
+      return call_in_loop(self._status)
+
+    if command == 'subscribe':
+      self._subscribe()
+      return None
+
+    if command == 'reload':
+      return self._reload()
+
+    if not (func := COMMANDS.get(command)):
+      raise ControlError(f'Unknown command: {command}')
+
+    return call_in_loop(partial(self._command, func, args))
+
+  @override
+  def handle(self):
+    while line := self.rfile.readline(MAX_LINE):
+      if not (line := line.decode(ENCODING, errors='replace').strip()):
+        continue
+
+      try:
+        if (reply := self._handle(line)) is None:
+          return
+
+      except ControlError as e:
+        reply = dict(ok=False, error=str(e))
+
+      except Exception as e:
+        log.exception(e)
+        reply = dict(ok=False, error=repr(e))
+
+      try:
+        self._reply(reply)
+
+      except OSError:
+        return
+
+
+class ControlServer(ThreadingUnixStreamServer):
+  """Answer status queries and commands on a Unix socket, reading requests in threads and running them on the GLib loop"""
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  path: Path
+  get_players: Players
+  backoff: Backoff | None
+  reload: Reload | None
+
+  _lock: Lock
+  _subscribers: set[Subscriber]
+  _thread: Thread | None
+
+  def __init__(self, path: Path, players: Players, backoff: Backoff | None = None):
+    self.path = path
+    self.get_players = players
+    self.backoff = backoff
+    self.reload = None
+
+    self._lock = Lock()
+    self._subscribers = set()
+    self._thread = None
+
+    make_dir(path.parent)
+    remove_stale(path)
+
+    # the socket is created by bind, so others can't connect before it's chmodded
+    umask = os.umask(SOCKET_UMASK)
+
+    try:
+      super().__init__(str(path), ControlHandler)
+
+    finally:
+      os.umask(umask)
+
+    os.chmod(path, SOCKET_MODE)
+
+  def subscribe(self) -> Subscriber:
+    subscriber = Subscriber()
+
+    with self._lock:
+      self._subscribers.add(subscriber)
+
+    return subscriber
+
+  def unsubscribe(self, subscriber: Subscriber):
+    with self._lock:
+      self._subscribers.discard(subscriber)
+
+  def publish(self, name: str, server: Server):
+    """Send the player's status to subscribers, called from the GLib loop"""
+    with self._lock:
+      if not (subscribers := list(self._subscribers)):
+        return
+
+    event = dumps(dict(event='changed', **get_status(name, server)))
+
+    for subscriber in subscribers:
+      if not subscriber.send(event):
+        # it fell too far behind, make it reconnect
+        log.warning('Dropping a slow control subscriber.')
+        self.unsubscribe(subscriber)
+        subscriber.close()
+
+  def observe(self, name: str, server: Server):
+    server.events.observers.append(lambda changes: self.publish(name, server))
+
+  def start(self):
+    self._thread = Thread(target=self.serve_forever, name='control', daemon=True)
+    self._thread.start()
+    log.info(f'Control socket listening on {self.path}.')
+
+  def stop(self):
+    with self._lock:
+      subscribers = list(self._subscribers)
+      self._subscribers.clear()
+
+    for subscriber in subscribers:
+      subscriber.close()
+
+    if self._thread:
+      self.shutdown()
+      self._thread = None
+
+    self.server_close()
+    self.path.unlink(missing_ok=True)
+
+
+def make_dir(directory: Path):
+  """Make the socket's directory, refusing one someone else made first, as in a shared temp dir"""
+  directory.mkdir(DIR_MODE, parents=True, exist_ok=True)
+
+  if directory.stat().st_uid != os.getuid():
+    raise ControlError(f'{directory} belongs to another user.')
+
+
+def remove_stale(path: Path):
+  """Remove a socket left behind by a service that died, refuse one that's in use"""
+  if not path.exists():
+    return
+
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+    try:
+      client.connect(str(path))
+
+    except OSError:
+      path.unlink(missing_ok=True)
+      return
+
+  raise ControlError(f'{path} is in use by another service.')
+
+
+def start_control(path: Path, players: Players, backoff: Backoff | None = None) -> ControlServer | None:
+  try:
+    control = ControlServer(path, players, backoff)
+
+  except (ControlError, OSError) as e:
+    log.warning(f"Couldn't start the control socket: {e}")
+    return None
+
+  control.start()
+  return control
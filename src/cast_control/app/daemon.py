@@ -1,22 +1,44 @@
 from __future__ import annotations
 
-import pickle
+import logging
 from collections.abc import Callable
+from decimal import Decimal
 from functools import partial
 from pathlib import Path
-from typing import NamedTuple
+from typing import Final, NamedTuple, Self
 from uuid import UUID
 
 from daemons.prefab.run import RunDaemon
 
-from .state import setup_logging
-from ..base import ARGS, ARGS_STEM, DEFAULT_ICON, DEFAULT_NO_DEVICE_NAME, DEFAULT_RETRY_WAIT, DEFAULT_SET_LOG, \
-  DEFAULT_WAIT, LOG, LOG_LEVEL, PID, Seconds
+from .instances import ALL_INSTANCE, DEVICES_SEP, Instance
+from .. import store
+from ..base import DEFAULT_DEVICE_NAME, DEFAULT_ICON, DEFAULT_NO_DEVICE_NAME, DEFAULT_RETRY_WAIT, DEFAULT_SET_LOG, \
+  DEFAULT_WAIT, LOG, LOG_LEVEL, Seconds
+from ..store import Data, OPTIONAL_NUMBER, OPTIONAL_STR, Schema, StoreError
+
+
+log: Final[logging.Logger] = logging.getLogger(__name__)
+
+ARGS_KIND: Final[str] = 'args'
+ARGS_SCHEMA: Final[Schema] = {
+  'name': OPTIONAL_STR,
+  'host': OPTIONAL_STR,
+  'uuid': OPTIONAL_STR,
+  'wait': OPTIONAL_NUMBER,
+  'retry_wait': OPTIONAL_NUMBER,
+  'icon': (bool,),
+  'log_level': (str,),
+  'set_logging': (bool,),
+  'background': (bool,),
+  'devices': (list,),
+  'attach_all': (bool,),
+}
 
 
 class MprisDaemon[**P, T](RunDaemon):
   target: Callable[P, T] | None = None
   args: Args | None = None
+  log_file: Path = LOG
   _logging: str | None = None
 
   @property
@@ -53,13 +75,15 @@ class MprisDaemon[**P, T](RunDaemon):
     self.target = partial(func, args)
 
   def setup_logging(self):
+    from .state import setup_logging
+
     if self.args:
       level = self.args.log_level
 
     else:
       level = self.logging
 
-    setup_logging(level, file=LOG)
+    setup_logging(level, file=self.log_file)
 
   def run(self):
     if not self.target:
@@ -79,47 +103,97 @@ class Args(NamedTuple):
   log_level: str = LOG_LEVEL
   set_logging: bool = DEFAULT_SET_LOG
   background: bool = False
+  devices: tuple[str, ...] = ()
+  attach_all: bool = False
+
+  @classmethod
+  def from_data(cls: type[Self], data: Data) -> Self:
+    fields = store.check(data, ARGS_SCHEMA)
+
+    if 'devices' in fields:
+      fields['devices'] = tuple(map(str, fields['devices']))
+
+    return cls(**fields)
+
+  def to_data(self) -> Data:
+    return dict(
+      self._asdict(),
+      uuid=None if self.uuid is None else str(self.uuid),
+      wait=to_number(self.wait),
+      retry_wait=to_number(self.retry_wait),
+      devices=list(self.devices),
+    )
 
   @staticmethod
-  def load(identifier: str | None = None) -> Args | None:
-    if identifier:
-      args = ARGS.with_stem(f'{identifier}{ARGS_STEM}')
+  def load(identifier: Instance | str | None = None) -> Args | None:
+    args = get_instance(identifier).args
 
-    else:
-      args = ARGS
+    try:
+      if (data := store.read(args, ARGS_KIND)) is None:
+        return None
 
-    if args.exists():
-      dump = args.read_bytes()
-      return pickle.loads(dump)
+      return Args.from_data(data)
 
-    return None
+    except (OSError, StoreError) as e:
+      log.warning(f"Couldn't load {args}: {e}")
+      return None
 
   @staticmethod
-  def delete():
-    if ARGS.exists():
-      ARGS.unlink()
+  def delete(identifier: Instance | str | None = None):
+    args = get_instance(identifier).args
+
+    if args.exists():
+      args.unlink()
 
   def save(self) -> Path:
-    dump = pickle.dumps(self)
-    ARGS.write_bytes(dump)
+    return store.write(self.file, ARGS_KIND, self.to_data())
 
-    return ARGS
+  @property
+  def instance(self) -> Instance:
+    """Each device, or set of devices, gets its own service instance"""
+    if self.attach_all:
+      return Instance.new(ALL_INSTANCE)
+
+    if self.devices:
+      return Instance.new(DEVICES_SEP.join(self.devices))
+
+    name = None if self.name == DEFAULT_DEVICE_NAME else self.name
+    return Instance.new(self.host or self.uuid or name)
 
   @property
   def file(self) -> Path:
-    name, host, uuid, *_ = self
-    device = get_name(name, host, uuid)
+    return self.instance.args
+
+
+def to_number(seconds: Seconds | float | None) -> float | None:
+  # JSON has no decimals
+  if isinstance(seconds, Decimal):
+    return float(seconds)
+
+  return seconds
 
-    return ARGS.with_stem(f'{device}{ARGS_STEM}')
+
+def get_instance(identifier: Instance | str | None = None) -> Instance:
+  if isinstance(identifier, Instance):
+    return identifier
+
+  return Instance.new(identifier)
+
+
+def new_daemon(instance: Instance) -> MprisDaemon:
+  daemon = MprisDaemon(pidfile=str(instance.pid))
+  daemon.log_file = instance.log
+
+  return daemon
 
 
 def get_daemon[**P, T](
   func: Callable[P, T] | None = None,
   *args,
-  _pidfile: str = str(PID),
+  _instance: Instance | str | None = None,
   **kwargs,
 ) -> MprisDaemon:
-  daemon = MprisDaemon(pidfile=_pidfile)
+  daemon = new_daemon(get_instance(_instance))
   daemon.set_target(func, *args, **kwargs)
 
   return daemon
@@ -128,9 +202,9 @@ def get_daemon[**P, T](
 def get_daemon_from_args[**P, T](
   func: Callable[P, T] | None = None,
   args: Args | None = None,
-  _pidfile: str = str(PID),
 ) -> MprisDaemon:
-  daemon = MprisDaemon(pidfile=_pidfile)
+  instance = args.instance if args else Instance()
+  daemon = new_daemon(instance)
   daemon.set_target_via_args(func, args)
 
   return daemon
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from operator import not_
+from threading import Event, Thread
+from typing import Final, NamedTuple
+from uuid import UUID
+
+from gi.repository import GLib
+from mpris_server import Server
+from pychromecast.models import CastInfo
+
+from .control import ControlServer
+from .retry import Backoff, timed_attempt
+from ..adapter import DeviceAdapter
+from ..base import DEFAULT_ICON, DEFAULT_RETRY_WAIT, DEFAULT_WAIT, Device, Seconds
+from ..device.device import Announcements, Discovery, Target, Watcher, find_device, set_retry_wait
+from ..device.listeners import EventListener
+
+
+log: Final[logging.Logger] = logging.getLogger(__name__)
+
+NAME_SEP: Final[str] = '-'
+CONNECT_WORKERS: Final[int] = 4
+NO_WAIT: Final[float] = 0.0
+
+
+class Player(NamedTuple):
+  server: Server
+  device: Device
+  events: EventListener
+
+
+def publish_device(
+  device: Device,
+  name: str | None = None,
+  icon: bool = DEFAULT_ICON,
+) -> Player:
+  adapter = DeviceAdapter(device)
+  adapter.set_icon(icon)
+  server = Server(name, adapter)
+
+  events = EventListener.register(server, device)
+  server.publish()
+
+  return Player(server, device, events)
+
+
+def get_key(device: Device) -> str:
+  return str(device.uuid)
+
+
+class Hub:
+  """
+    Serve several devices from one process.
+
+    Every player is published under its own MPRIS name, device lookups
+    share one discovery browse, and all players run on one GLib loop.
+  """
+
+  players: dict[str, Player]
+  icon: bool
+  wait: Seconds | None
+  retry_wait: Seconds | None
+  backoff: Backoff
+  control: ControlServer | None
+
+  _connecting: set[str]
+  _loop: GLib.MainLoop | None
+  _pool: ThreadPoolExecutor
+  _stopped: Event
+  _watcher: Watcher | None
+
+  def __init__(
+    self,
+    icon: bool = DEFAULT_ICON,
+    wait: Seconds | None = DEFAULT_WAIT,
+    retry_wait: Seconds | None = DEFAULT_RETRY_WAIT,
+  ):
+    self.players = {}
+    self.icon = icon
+    self.wait = wait
+    self.retry_wait = retry_wait
+    self.backoff = Backoff() if wait is None else Backoff(cap=wait)
+    self.control = None
+
+    self._connecting = set()
+    self._loop = None
+    self._pool = ThreadPoolExecutor(CONNECT_WORKERS, thread_name_prefix='connect')
+    self._stopped = Event()
+    self._watcher = None
+
+  def __contains__(self, device: Device) -> bool:
+    return get_key(device) in self.players
+
+  def __len__(self) -> int:
+    return len(self.players)
+
+  def _get_name(self, device: Device) -> str:
+    name = device.cast_info.friendly_name or get_key(device)
+    names = {player.server.name for player in self.players.values()}
+
+    if name in names:
+      # two devices can share a friendly name, but not a bus name
+      name = f'{name}{NAME_SEP}{get_key(device)}'
+
+    return name
+
+  def add(self, device: Device) -> Player:
+    if player := self.players.get(key := get_key(device)):
+      if player.device is not device:
+        # another connection to a device we already serve
+        device.disconnect(timeout=NO_WAIT)
+
+      return player
+
+    name = self._get_name(device)
+    self.players[key] = player = publish_device(device, name, self.icon)
+
+    if control := self.control:
+      control.observe(name, player.server)
+
+    log.info(f'Serving {name} ({len(self)} device(s)).')
+
+    return player
+
+  def remove(self, key: str):
+    if not (player := self.players.pop(key, None)):
+      return
+
+    server, device, events = player
+    events.unregister()
+    server.unpublish()
+
+    # don't block the loop while the socket thread winds down
+    device.disconnect(timeout=NO_WAIT)
+    log.info(f'Stopped serving {server.name} ({len(self)} device(s)).')
+
+  def set_icon(self, icon: bool):
+    self.icon = icon
+
+    for server, _, events in self.players.values():
+      server.adapter.set_icon(icon)
+      events.refresh()
+
+  def set_waits(self, wait: Seconds | None, retry_wait: Seconds | None):
+    self.wait = wait
+    self.retry_wait = retry_wait
+
+    if wait is not None:
+      self.backoff.set_cap(wait)
+
+    if watcher := self._watcher:
+      watcher.retry_wait = retry_wait
+
+    for player in self.players.values():
+      set_retry_wait(player.device, retry_wait)
+
+  def get_servers(self) -> dict[str, Server]:
+    # called from control threads while the loop adds and removes players
+    players = list(self.players.values())
+    return {player.server.name: player.server for player in players}
+
+  def _add_when_idle(self, device: Device) -> bool:
+    self._connecting.discard(get_key(device))
+
+    if self._stopped.is_set():
+      device.disconnect(timeout=NO_WAIT)
+
+    elif self._watcher and not self._watcher.is_present(device.uuid):
+      # it left while we were connecting
+      device.disconnect(timeout=NO_WAIT)
+
+    else:
+      self.add(device)
+
+    return GLib.SOURCE_REMOVE
+
+  def _remove_when_idle(self, key: str) -> bool:
+    self.remove(key)
+    return GLib.SOURCE_REMOVE
+
+  def _failed_when_idle(self, key: str) -> bool:
+    self._connecting.discard(key)
+    return GLib.SOURCE_REMOVE
+
+  def _connect(self, info: CastInfo):
+    try:
+      if not (watcher := self._watcher):
+        raise RuntimeError('Stopped watching for devices.')
+
+      device = watcher.connect(info)
+
+    except Exception as e:
+      log.warning(f'Could not connect to {info.friendly_name}: {e}')
+      GLib.idle_add(self._failed_when_idle, str(info.uuid))
+
+    else:
+      GLib.idle_add(self._add_when_idle, device)
+
+  def _connect_when_idle(self, info: CastInfo) -> bool:
+    # runs after any removal queued before it, so a device that left and
+    # came back isn't mistaken for one we still serve
+    key = str(info.uuid)
+
+    if not self._stopped.is_set() and key not in self.players and key not in self._connecting:
+      self._connecting.add(key)
+      self._pool.submit(self._connect, info)
+
+    return GLib.SOURCE_REMOVE
+
+  def _on_added(self, info: CastInfo):
+    # players and connections are only tracked on the loop, in the order
+    # devices come and go
+    GLib.idle_add(self._connect_when_idle, info)
+
+  def _on_removed(self, uuid: UUID):
+    GLib.idle_add(self._remove_when_idle, str(uuid))
+
+  def watch(self):
+    """Serve every device on the network as it appears, and stop serving it when it leaves"""
+    self._watcher = Watcher(self._on_added, self._on_removed, self.retry_wait)
+    self._watcher.start()
+
+  def find(self, targets: Iterable[Target]) -> list[Target]:
+    """Look up every target over one browse and serve them, returning the ones not found"""
+    missing: list[Target] = []
+
+    with Discovery(self.retry_wait) as discovery:
+      for target in targets:
+        if device := find_device(*target, self.retry_wait, discovery):
+          # players are published from the loop's thread
+          GLib.idle_add(self._add_when_idle, device)
+
+        else:
+          missing.append(target)
+
+    return missing
+
+  def _attempt(self, targets: Iterable[Target]) -> list[Target]:
+    # found once none are missing
+    return timed_attempt(self.backoff, partial(self.find, targets), found=not_)
+
+  def attach(self, targets: Iterable[Target]) -> list[Target]:
+    """Serve every target found now, then keep looking for the rest in the background"""
+    missing = self._attempt(targets)
+
+    if missing and self.wait is not None:
+      Thread(target=self._retry, args=(missing,), name='retry', daemon=True).start()
+
+    return missing
+
+  def _retry(self, missing: list[Target]):
+    backoff = self.backoff
+    announcements = Announcements()
+
+    while missing and not self._stopped.is_set():
+      log.warning(f'{len(missing)} device(s) not found on attempt #{backoff.attempts}.')
+
+      # retry early if a missing device announces itself
+      announcements.want(missing)
+      backoff.wait(announcements.wait)
+
+      if self._stopped.is_set():
+        break
+
+      missing = self._attempt(missing)
+
+  def loop(self):
+    self._loop = GLib.MainLoop()
+
+    try:
+      self._loop.run()
+
+    finally:
+      self.quit()
+
+  def quit(self):
+    self._stopped.set()
+
+    if control := self.control:
+      self.control = None
+      control.stop()
+
+    if watcher := self._watcher:
+      self._watcher = None
+      watcher.stop()
+
+    self._pool.shutdown(wait=False, cancel_futures=True)
+
+    for key in list(self.players):
+      self.remove(key)
+
+    if loop := self._loop:
+      self._loop = None
+      loop.quit()
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import os
+import re
+from hashlib import sha256
+from pathlib import Path
+from typing import Final, NamedTuple, Self
+
+from .. import NAME
+from ..paths import ARGS, ARGS_STEM, LOG, LOG_DIR, PID, RUNTIME_DIR, STATE_DIR, TMP_DIR
+
+
+# only import the standard library and ..paths here, so listing
+# instances stays cheap
+
+DEFAULT_INSTANCE: Final[str] = 'service'  # matches the files used before instances existed
+ALL_INSTANCE: Final[str] = 'all'
+DEVICES_SEP: Final[str] = '+'
+INSTANCE_SEP: Final[str] = '-'
+PID_SUFFIX: Final[str] = '.pid'
+LOG_SUFFIX: Final[str] = '.log'
+SOCKET_SUFFIX: Final[str] = '.sock'
+ARGS_SUFFIX: Final[str] = ARGS.suffix
+INVALID_CHARS: Final[re.Pattern] = re.compile(r'[^\w.+-]+')
+REPLACEMENT: Final[str] = '_'
+NO_SIGNAL: Final[int] = 0
+MAX_SOCKET_PATH: Final[int] = 107  # bytes, sun_path holds 108 with its NUL, see unix(7)
+HASH_SIZE: Final[int] = 16  # hex digits of a long instance name's hash
+
+
+class Instance(NamedTuple):
+  """A background service and the pid, args and log files that belong to it"""
+
+  name: str = DEFAULT_INSTANCE
+
+  def __str__(self) -> str:
+    return self.name
+
+  @classmethod
+  def new(cls: type[Self], name: str | None = None) -> Self:
+    if not name:
+      return cls()
+
+    name = INVALID_CHARS.sub(REPLACEMENT, name.strip())
+    return cls(name or DEFAULT_INSTANCE)
+
+  @classmethod
+  def from_pid(cls: type[Self], pid: Path) -> Self | None:
+    if pid == PID:
+      return cls()
+
+    prefix = f'{NAME}{INSTANCE_SEP}'
+
+    if pid.stem.startswith(prefix):
+      return cls(pid.stem.removeprefix(prefix))
+
+    return None
+
+  @property
+  def is_default(self) -> bool:
+    return self.name == DEFAULT_INSTANCE
+
+  @property
+  def pid(self) -> Path:
+    if self.is_default:
+      return PID
+
+    return STATE_DIR / f'{NAME}{INSTANCE_SEP}{self.name}{PID_SUFFIX}'
+
+  @property
+  def args(self) -> Path:
+    return ARGS.with_stem(f'{self.name}{ARGS_STEM}')
+
+  @property
+  def socket(self) -> Path:
+    """The running service's control socket, short enough to bind"""
+    directory = RUNTIME_DIR or STATE_DIR
+    path = directory / self.pid.with_suffix(SOCKET_SUFFIX).name
+
+    if fits(path):
+      return path
+
+    # hub instances are named after their devices, and can run long
+    digest = sha256(self.name.encode()).hexdigest()[:HASH_SIZE]
+    name = f'{NAME}{INSTANCE_SEP}{digest}{SOCKET_SUFFIX}'
+
+    if fits(path := directory / name):
+      return path
+
+    return TMP_DIR / name
+
+  @property
+  def log(self) -> Path:
+    if self.is_default:
+      return LOG
+
+    return LOG_DIR / f'{NAME}{INSTANCE_SEP}{self.name}{LOG_SUFFIX}'
+
+  def get_pid(self) -> int | None:
+    try:
+      return int(self.pid.read_text().strip())
+
+    except (OSError, ValueError):
+      return None
+
+  def is_running(self) -> bool:
+    if not (pid := self.get_pid()):
+      return False
+
+    try:
+      os.kill(pid, NO_SIGNAL)
+
+    except ProcessLookupError:
+      return False
+
+    except PermissionError:
+      return True
+
+    return True
+
+
+def fits(socket: Path) -> bool:
+  return len(bytes(socket)) <= MAX_SOCKET_PATH
+
+
+def get_instances() -> list[Instance]:
+  """Every instance with a pidfile, running or stale"""
+  if not STATE_DIR.exists():
+    return []
+
+  pids = sorted(STATE_DIR.glob(f'{NAME}*{PID_SUFFIX}'))
+  instances = map(Instance.from_pid, pids)
+
+  return [instance for instance in instances if instance]
+
+
+def get_running() -> list[Instance]:
+  return [instance for instance in get_instances() if instance.is_running()]
+
+
+def find_instance(name: str | None = None) -> Instance:
+  """The named instance, otherwise the only running instance, otherwise the default instance"""
+  if name:
+    return Instance.new(name)
+
+  if len(running := get_running()) == 1:
+    instance, = running
+    return instance
+
+  return Instance()
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import select
+from collections.abc import Iterable, Iterator
+from io import SEEK_END
+from pathlib import Path
+from time import sleep
+from typing import BinaryIO, Final, NamedTuple, Self
+
+
+# only import the standard library here, so `service log` starts instantly
+
+log: Final[logging.Logger] = logging.getLogger(__name__)
+
+READ_MODE: Final[str] = 'rb'
+ENCODING: Final[str] = 'utf-8'
+NEWLINE: Final[bytes] = b'\n'
+LINE_END: Final[str] = '\n'
+NOT_FOUND: Final[int] = -1
+BLOCK_SIZE: Final[int] = 64 * 1_024  # bytes read at a time, from either end
+POLL_WAIT: Final[float] = 0.5  # seconds between checks without inotify
+LOGGER_SEP: Final[str] = '.'
+
+# lines written by logging's default format, `LEVEL:logger:message`
+RECORD: Final[re.Pattern] = re.compile(r'^(?P<level>[A-Z]+):(?P<logger>[\w.]+):')
+LEVELS: Final[dict[str, int]] = logging.getLevelNamesMapping()
+
+# see inotify(7)
+IN_MODIFY: Final[int] = 0x002
+IN_MOVED_TO: Final[int] = 0x080
+IN_CREATE: Final[int] = 0x100
+IN_CLOEXEC: Final[int] = 0o2_000_000
+WATCH_MASK: Final[int] = IN_MODIFY | IN_MOVED_TO | IN_CREATE
+EVENTS_SIZE: Final[int] = 64 * 1_024
+
+
+class Record(NamedTuple):
+  level: int
+  logger: str
+
+
+def parse(line: str) -> Record | None:
+  """The level and logger of a line that starts a record, None for tracebacks and other continuations"""
+  if not (match := RECORD.match(line)):
+    return None
+
+  if (level := LEVELS.get(match['level'])) is None:
+    return None
+
+  return Record(level, match['logger'])
+
+
+def decode(line: bytes) -> str:
+  return line.decode(ENCODING, errors='replace')
+
+
+class LogFilter:
+  """
+    Keep records at or above `level` from `loggers` and their children.
+
+    Lines that don't start a record, like tracebacks, go with the record
+    before them.
+  """
+
+  level: int
+  loggers: tuple[str, ...]
+
+  _keep: bool
+
+  def __init__(self, level: str | None = None, loggers: Iterable[str] = ()):
+    self.level = LEVELS[level.upper()] if level else logging.NOTSET
+    self.loggers = tuple(loggers)
+    self.reset()
+
+  def __call__(self, line: str) -> bool:
+    if record := parse(line):
+      self._keep = self.matches(record)
+
+    return self._keep
+
+  def reset(self, record: Record | None = None):
+    """Pass the lines that follow `record`, or that start a log without one"""
+    # lines before the first record only pass without filters
+    self._keep = self.matches(record) if record else self.is_empty
+
+  @property
+  def is_empty(self) -> bool:
+    return self.level == logging.NOTSET and not self.loggers
+
+  def matches(self, record: Record) -> bool:
+    if record.level < self.level:
+      return False
+
+    if not self.loggers:
+      return True
+
+    return any(
+      record.logger == logger or record.logger.startswith(f'{logger}{LOGGER_SEP}')
+      for logger in self.loggers
+    )
+
+
+def get_end(file: BinaryIO) -> int:
+  """The offset just past the last complete line, a line being written is left for later"""
+  position = file.seek(0, SEEK_END)
+
+  while position > 0:
+    start = max(position - BLOCK_SIZE, 0)
+    file.seek(start)
+    block = file.read(position - start)
+
+    if (index := block.rfind(NEWLINE)) != NOT_FOUND:
+      return start + index + len(NEWLINE)
+
+    position = start
+
+  return 0
+
+
+def read_backwards(file: BinaryIO, end: int) -> Iterator[bytes]:
+  """Yield the lines before `end` a block at a time, last line first"""
+  # skip the newline that ends the last line
+  position = end - len(NEWLINE) if end else 0
+  rest = b''
+
+  while position > 0:
+    start = max(position - BLOCK_SIZE, 0)
+    file.seek(start)
+    block = file.read(position - start) + rest
+    position = start
+
+    # the first line in the block may have started in the previous one
+    rest, *lines = block.split(NEWLINE)
+    yield from reversed(lines)
+
+  if end:
+    yield rest
+
+
+def tail(file: BinaryIO, count: int, keep: LogFilter) -> tuple[list[str], int]:
+  """
+    The last records that `keep` passes, up to `count` lines, and the offset to follow the log from.
+
+    Records are kept whole, so a traceback is never shown without the line
+    that starts it. The newest record is shown even if it's longer than `count`.
+  """
+  end = get_end(file)
+  records: list[list[str]] = []  # newest first, each one's lines last first
+  lines = 0
+  pending: list[str] = []  # lines waiting for the line that starts their record
+  newest: Record | None = None
+
+  if count <= 0:
+    return [], end
+
+  for line in map(decode, read_backwards(file, end)):
+    pending.append(line + LINE_END)
+
+    if not (record := parse(line)):
+      continue
+
+    newest = newest or record
+    group, pending = pending, []
+
+    if not keep.matches(record):
+      continue
+
+    if records and lines + len(group) > count:
+      break
+
+    records.append(group)
+
+    if (lines := lines + len(group)) >= count:
+      break
+
+  else:
+    # lines before the first record, when nothing filters them out
+    if pending and keep.is_empty and (not records or lines + len(pending) <= count):
+      records.append(pending)
+
+  # lines written later continue the newest record
+  keep.reset(newest)
+
+  return [line for group in reversed(records) for line in reversed(group)], end
+
+
+class Inotify:
+  """Block until something in `directory` changes"""
+
+  fd: int
+
+  def __init__(self, directory: Path):
+    import ctypes
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.inotify_add_watch.argtypes = ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32
+
+    if (fd := libc.inotify_init1(IN_CLOEXEC)) < 0:
+      raise OSError(ctypes.get_errno(), "Couldn't start inotify.")
+
+    # watch the directory, so a log that's replaced is still followed
+    if libc.inotify_add_watch(fd, bytes(directory), WATCH_MASK) < 0:
+      os.close(fd)
+      raise OSError(ctypes.get_errno(), f"Couldn't watch {directory}.")
+
+    self.fd = fd
+
+  def __enter__(self) -> Self:
+    return self
+
+  def __exit__(self, *args):
+    os.close(self.fd)
+
+  def wait(self):
+    select.select([self.fd], [], [])
+    os.read(self.fd, EVENTS_SIZE)
+
+
+class Poll:
+  """Wait a little, where inotify isn't available"""
+
+  def __enter__(self) -> Self:
+    return self
+
+  def __exit__(self, *args):
+    pass
+
+  def wait(self):
+    sleep(POLL_WAIT)
+
+
+def get_watch(directory: Path) -> Inotify | Poll:
+  try:
+    return Inotify(directory)
+
+  except (OSError, AttributeError) as e:
+    log.debug(f'Polling for log changes, inotify is unavailable: {e}')
+    return Poll()
+
+
+def is_replaced(path: Path, file: BinaryIO) -> bool:
+  try:
+    return path.stat().st_ino != os.fstat(file.fileno()).st_ino
+
+  except FileNotFoundError:
+    return False
+
+
+def follow(path: Path, offset: int, keep: LogFilter) -> Iterator[str]:
+  """Yield lines as they're appended to the log, until interrupted"""
+  file = path.open(READ_MODE)
+  file.seek(offset)
+  partial = b''
+
+  try:
+    with get_watch(path.parent) as watch:
+      while True:
+        # the service truncates its log when it starts
+        if os.fstat(file.fileno()).st_size < file.tell():
+          file.seek(0)
+          partial = b''
+          keep.reset()
+
+        if data := file.read(BLOCK_SIZE):
+          *lines, partial = (partial + data).split(NEWLINE)
+
+          for line in map(decode, lines):
+            if keep(line := line + LINE_END):
+              yield line
+
+          continue
+
+        if is_replaced(path, file):
+          file.close()
+          file = path.open(READ_MODE)
+          partial = b''
+          keep.reset()
+          continue
+
+        watch.wait()
+
+  finally:
+    file.close()
+
+
+def read_log(
+  path: Path,
+  keep: LogFilter | None = None,
+  count: int | None = None,
+  follow_log: bool = False,
+) -> Iterator[str]:
+  """
+    Yield the log's lines that `keep` passes.
+
+    If `count` is set, only the last `count` lines, found by reading
+    backwards from the end. If `follow_log` is set, keep yielding lines
+    as they're written.
+  """
+  keep = keep or LogFilter()
+
+  with path.open(READ_MODE) as file:
+    if count is not None:
+      lines, offset = tail(file, count, keep)
+      yield from lines
+
+    elif not follow_log:
+      yield from filter(keep, map(decode, file))
+      return
+
+    else:
+      offset = 0
+
+  if follow_log:
+    yield from follow(path, offset, keep)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import logging
+import signal
+from functools import partial
+from typing import Final, TYPE_CHECKING
+
+from gi.repository import GLib
+
+from .control import ControlError, ControlServer, Reply, call_in_loop
+from .daemon import Args
+from .instances import Instance
+
+if TYPE_CHECKING:
+  from .hub import Hub
+  from .run import SingleServer
+
+
+log: Final[logging.Logger] = logging.getLogger(__name__)
+
+RELOAD_TIMEOUT: Final[float] = 10.0  # seconds a control client waits for the loop
+
+# these shape the process itself, or pick what it serves, so they take a restart
+RESTART_FIELDS: Final[frozenset[str]] = frozenset({
+  'name', 'host', 'uuid', 'devices', 'attach_all', 'background', 'set_logging',
+})
+WAIT_FIELDS: Final[frozenset[str]] = frozenset({'wait', 'retry_wait'})
+
+type Service = Hub | SingleServer
+type Changes = frozenset[str]
+
+
+def get_changes(old: Args, new: Args) -> Changes:
+  return frozenset(
+    field
+    for field, before, after in zip(Args._fields, old, new)
+    if before != after
+  )
+
+
+def set_log_level(level: str):
+  logging.getLogger().setLevel(level.upper())
+
+
+class Reloader:
+  """
+    Apply a service's saved args in place, instead of restarting it.
+
+    Runs on the GLib loop, after SIGHUP or a `reload` control command.
+  """
+
+  instance: Instance
+  args: Args
+  service: Service
+
+  def __init__(self, args: Args, service: Service):
+    self.instance = args.instance
+    self.args = args
+    self.service = service
+
+  def reload(self) -> Reply:
+    if not (args := Args.load(self.instance)):
+      raise ControlError(f'No saved args for {self.instance}.')
+
+    if not (changes := get_changes(self.args, args)):
+      log.info('Reloaded, nothing changed.')
+      return dict(ok=True, changed=[], restart=False)
+
+    changed = sorted(changes)
+
+    if restart := changes & RESTART_FIELDS:
+      log.warning(f"Can't reload {', '.join(sorted(restart))} in place, restart the service.")
+      return dict(ok=True, changed=changed, restart=True)
+
+    # only what was applied is kept, so a failed reload is tried again next time
+    self._apply(args, changes)
+    self.args = args
+    log.info(f"Reloaded {', '.join(changed)}.")
+
+    return dict(ok=True, changed=changed, restart=False)
+
+  def _apply(self, args: Args, changes: Changes):
+    if 'log_level' in changes:
+      set_log_level(args.log_level)
+
+    if 'icon' in changes:
+      self.service.set_icon(args.icon)
+
+    if changes & WAIT_FIELDS:
+      self.service.set_waits(args.wait, args.retry_wait)
+
+  def on_signal(self) -> bool:
+    try:
+      self.reload()
+
+    except Exception as e:
+      log.exception(e)
+      log.error(f"Couldn't reload {self.instance}.")
+
+    return GLib.SOURCE_CONTINUE
+
+
+def setup_reload(args: Args, service: Service, control: ControlServer | None = None) -> Reloader:
+  """Reload on SIGHUP, and on the control socket's `reload` command"""
+  reloader = Reloader(args, service)
+  GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGHUP, reloader.on_signal)
+
+  if control:
+    control.reload = partial(call_in_loop, reloader.reload, RELOAD_TIMEOUT)
+
+  return reloader
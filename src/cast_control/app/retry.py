@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import logging
+from collections import deque
+from collections.abc import Callable, Iterator
+from math import ceil, log as get_log
+from random import uniform
+from time import monotonic, sleep, time
+from typing import Any, Final, NamedTuple
+
+from ..base import DEFAULT_BACKOFF_FACTOR, DEFAULT_HISTORY, DEFAULT_MIN_BACKOFF, DEFAULT_WAIT, Seconds
+
+
+log: Final[logging.Logger] = logging.getLogger(__name__)
+
+MIN_CAP: Final[float] = float(DEFAULT_MIN_BACKOFF)  # seconds, so `--wait 0` can't retry in a tight loop
+
+
+class Attempt(NamedTuple):
+  number: int
+  started: float  # unix time
+  elapsed: float  # seconds spent looking for the device
+  found: bool
+  delay: float | None = None  # seconds scheduled before the next attempt
+  woke: bool = False  # the device announced itself before the delay ran out
+
+  def __str__(self) -> str:
+    result = 'found' if self.found else 'not found'
+    text = f'#{self.number}: {result} after {self.elapsed:.1f}s'
+
+    if self.delay is not None:
+      text += f', waited {self.delay:.1f}s'
+
+    if self.woke:
+      text += ' (woken by mDNS)'
+
+    return text
+
+
+class Backoff:
+  """
+    Schedule retries with exponential backoff, capped at `cap` seconds,
+    but never less than MIN_CAP.
+
+    Each delay is jittered between half and all of its value so several
+    clients don't retry in lockstep.
+  """
+
+  start: float
+  cap: float
+  factor: int
+  history: deque[Attempt]
+
+  _attempts: int
+
+  def __init__(
+    self,
+    cap: Seconds | float = DEFAULT_WAIT,
+    start: Seconds | float = DEFAULT_MIN_BACKOFF,
+    factor: int = DEFAULT_BACKOFF_FACTOR,
+    size: int = DEFAULT_HISTORY,
+  ):
+    self.cap = max(float(cap), MIN_CAP)
+    self.start = min(float(start), self.cap)
+    self.factor = factor
+    self.history = deque(maxlen=size)
+
+    self._attempts = 0
+
+  def __iter__(self) -> Iterator[Attempt]:
+    return iter(self.history)
+
+  @property
+  def attempts(self) -> int:
+    return self._attempts
+
+  @property
+  def last(self) -> Attempt | None:
+    return self.history[-1] if self.history else None
+
+  def set_cap(self, cap: Seconds | float):
+    self.cap = max(float(cap), MIN_CAP)
+    self.start = min(self.start, self.cap)
+
+  @property
+  def max_exponent(self) -> int:
+    """The exponent where delays reach the cap, past it they'd only overflow"""
+    if self.start <= 0 or self.factor <= 1 or self.start >= self.cap:
+      return 0
+
+    return ceil(get_log(self.cap / self.start, self.factor))
+
+  def get_delay(self) -> float:
+    exponent = min(max(self._attempts - 1, 0), self.max_exponent)
+    delay = min(self.start * self.factor ** exponent, self.cap)
+
+    return uniform(delay / 2, delay)
+
+  def record(self, started: float, elapsed: float, found: bool) -> Attempt:
+    self._attempts += 1
+    attempt = Attempt(self._attempts, started, elapsed, found)
+    self.history.append(attempt)
+
+    return attempt
+
+  def wait(
+    self,
+    wake: Callable[[float], bool] | None = None,
+    delay: float | None = None,
+  ) -> Attempt:
+    """
+      Sleep until the next attempt is due, or until `wake` reports that
+      the device announced itself since the last attempt.
+    """
+    if delay is None:
+      delay = self.get_delay()
+
+    # always wait out the floor, so a device that's announced but
+    # unreachable doesn't make us spin
+    floor = min(self.start, delay)
+    sleep(floor)
+    woke = False
+
+    if wake:
+      start = monotonic()
+      woke = wake(delay - floor)
+      delay = floor + monotonic() - start
+
+    else:
+      sleep(delay - floor)
+
+    if woke:
+      log.info(f'Device announced itself after {delay:.1f} seconds, retrying now.')
+
+    attempt = self.history.pop()._replace(delay=delay, woke=woke)
+    self.history.append(attempt)
+
+    return attempt
+
+  def reset(self):
+    self._attempts = 0
+
+  def summary(self) -> str:
+    return '; '.join(map(str, self.history))
+
+
+def is_found(result: Any) -> bool:
+  return result is not None
+
+
+def timed_attempt[T](
+  backoff: Backoff,
+  func: Callable[[], T],
+  found: Callable[[T], bool] = is_found,
+) -> T:
+  started = time()
+  start = monotonic()
+  result = func()
+  backoff.record(started, monotonic() - start, found=found(result))
+
+  return result
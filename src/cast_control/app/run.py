@@ -1,19 +1,22 @@
 from __future__ import annotations
 
 import logging
-from time import sleep
+from functools import partial
+from pathlib import Path
 from typing import Final, NoReturn
 from uuid import UUID
 
 from mpris_server import Server
 
+from .control import ControlServer, start_control
 from .daemon import Args, get_name
-from .state import setup_logging
-from ..adapter import DeviceAdapter
-from ..base import DEFAULT_ICON, DEFAULT_RETRY_WAIT, DEFAULT_SET_LOG, DEFAULT_WAIT, LOG_LEVEL, \
+from .hub import Hub, publish_device
+from .reload import setup_reload
+from .retry import Backoff, timed_attempt
+from .state import setup_logging, setup_user_state
+from ..base import DEFAULT_ICON, DEFAULT_RETRY_WAIT, DEFAULT_SET_LOG, DEFAULT_WAIT, Device, LOG_LEVEL, \
   NoDevicesFound, Rc, Seconds
-from ..device.device import find_device
-from ..device.listeners import EventListener
+from ..device.device import Announcements, Target, find_device, set_retry_wait
 
 
 log: Final[logging.Logger] = logging.getLogger(__name__)
@@ -28,11 +31,7 @@ def create_server(
   if not (device := find_device(name, host, uuid, retry_wait)):
     return None
 
-  adapter = DeviceAdapter(device)
-  server = Server(name, adapter)
-
-  EventListener.register(server, device)
-  server.publish()
+  server, *_ = publish_device(device, name)
 
   return server
 
@@ -43,23 +42,78 @@ def retry_until_found(
   uuid: UUID | str | None = None,
   wait: Seconds | None = DEFAULT_WAIT,
   retry_wait: Seconds | None = DEFAULT_RETRY_WAIT,
+  backoff: Backoff | None = None,
 ) -> Server | None | NoReturn:
   """
     If the device isn't found, keep trying to find it.
 
-    If `wait` is None, then retrying is disabled.
+    Retries back off exponentially up to `wait` seconds apart, and happen
+    early if the device announces itself while waiting. If `wait` is None,
+    then retrying is disabled.
   """
+  device = get_name(name, host, uuid)
+  attempt = partial(create_server, name, host, uuid, retry_wait)
+  wake = Announcements(Target(name, host, uuid)).wait
+
+  if backoff is None:
+    backoff = Backoff() if wait is None else Backoff(cap=wait)
 
   while True:
-    if server := create_server(name, host, uuid, retry_wait):
+    if server := timed_attempt(backoff, attempt):
+      log.info(f'Found {device} after {backoff.attempts} attempt(s): {backoff.summary()}')
       return server
 
     elif wait is None:
       return None
 
-    device = get_name(name, host, uuid)
-    log.warning(f'{device} not found. Waiting {wait} seconds before retrying.')
-    sleep(wait)
+    delay = backoff.get_delay()
+    log.warning(f'{device} not found on attempt #{backoff.attempts}. Retrying in up to {delay:.1f} seconds.')
+
+    waited = backoff.wait(wake, delay)
+    log.debug(f'Retry {waited}')
+
+
+class SingleServer:
+  """Serve one device, and apply reloaded settings to it in place"""
+
+  name: str
+  server: Server
+  icon: bool
+  retry_wait: Seconds | None
+  backoff: Backoff
+
+  def __init__(
+    self,
+    name: str,
+    server: Server,
+    icon: bool = DEFAULT_ICON,
+    retry_wait: Seconds | None = DEFAULT_RETRY_WAIT,
+    backoff: Backoff | None = None,
+  ):
+    self.name = name
+    self.server = server
+    self.icon = icon
+    self.retry_wait = retry_wait
+    self.backoff = backoff or Backoff()
+
+  @property
+  def device(self) -> Device:
+    return self.server.events.device
+
+  def get_servers(self) -> dict[str, Server]:
+    return {self.name: self.server}
+
+  def set_icon(self, icon: bool):
+    self.icon = icon
+    self.server.adapter.set_icon(icon)
+    self.server.events.refresh()
+
+  def set_waits(self, wait: Seconds | None, retry_wait: Seconds | None):
+    self.retry_wait = retry_wait
+    set_retry_wait(self.device, retry_wait)
+
+    if wait is not None:
+      self.backoff.set_cap(wait)
 
 
 def run_server(
@@ -72,22 +126,94 @@ def run_server(
   log_level: str = LOG_LEVEL,
   set_logging: bool = DEFAULT_SET_LOG,
   background: bool = False,
+  devices: tuple[str, ...] = (),
+  attach_all: bool = False,
+  control: Path | None = None,
+  reload: bool = False,
 ):
   if set_logging:
     setup_logging(log_level)
 
-  if not (server := retry_until_found(name, host, uuid, wait, retry_wait)):
+  setup_user_state()
+  args = Args(name, host, uuid, wait, retry_wait, icon, log_level, set_logging, background, devices, attach_all)
+
+  if devices or attach_all:
+    run_hub(devices, wait, retry_wait, icon, attach_all, control, args if reload else None)
+    return
+
+  backoff = Backoff() if wait is None else Backoff(cap=wait)
+
+  if not (server := retry_until_found(name, host, uuid, wait, retry_wait, backoff)):
     device = get_name(name, host, uuid)
     raise NoDevicesFound(device)
 
   server.adapter.set_icon(icon)
-  server.loop(background=background)
+  single = SingleServer(get_name(name, host, uuid), server, icon, retry_wait, backoff)
+  control_server: ControlServer | None = None
+
+  if control and (control_server := start_control(control, single.get_servers, backoff)):
+    control_server.observe(single.name, server)
 
+  if reload:
+    setup_reload(args, single, control_server)
 
-def run_safe(args: Args):
   try:
-    run_server(*args)
+    server.loop(background=background)
+
+  finally:
+    if not background:
+      if events := server.events:
+        events.unregister()
+
+      if control_server:
+        control_server.stop()
+
+
+def run_hub(
+  devices: tuple[str, ...],
+  wait: Seconds | None = DEFAULT_WAIT,
+  retry_wait: Seconds | None = DEFAULT_RETRY_WAIT,
+  icon: bool = DEFAULT_ICON,
+  attach_all: bool = False,
+  control: Path | None = None,
+  reload: Args | None = None,
+):
+  """
+    Serve every device in `devices` from this process, each under its own MPRIS name.
+
+    If `attach_all` is set, serve every device on the network as it comes and goes.
+    If `reload` is set, reload those args in place on SIGHUP.
+  """
+  hub = Hub(icon, wait, retry_wait)
+
+  if control:
+    hub.control = start_control(control, hub.get_servers, hub.backoff)
+
+  if reload:
+    setup_reload(reload, hub, hub.control)
+
+  if attach_all:
+    hub.watch()
+
+  elif targets := [Target.parse(device) for device in devices]:
+    missing = hub.attach(targets)
+
+    if len(missing) == len(targets) and wait is None:
+      names = ', '.join(get_name(*target) for target in missing)
+      raise NoDevicesFound(names)
+
+  hub.loop()
+
+
+def run_safe(args: Args, reload: bool = False):
+  try:
+    run_server(*args, control=args.instance.socket, reload=reload)
 
   except NoDevicesFound as e:
     log.error(f'Device {e} not found.')
     quit(Rc.NO_DEVICE)
+
+
+def run_service(args: Args):
+  """Run as a background service, which reloads its saved args on SIGHUP"""
+  run_safe(args, reload=True)
@@ -1,21 +1,14 @@
 from __future__ import annotations
 
 import logging
-from asyncio import gather, run
-from collections.abc import Callable
-from functools import cache, wraps
-from os import stat_result
 from pathlib import Path
-
-from aiopath import AsyncPath
-from rich.logging import RichHandler
+from typing import Final, NamedTuple
 
 from ..base import DARK_END, DARK_ICON, DATA_DIR, DESKTOP_NAME, DESKTOP_SUFFIX, DESKTOP_TEMPLATE, LIGHT_END, \
-  LIGHT_ICON, LOG_FILE_MODE, LOG_LEVEL, NAME, PATHS, SRC_DIR, USER_DIRS, singleton
+  LIGHT_ICON, LOG_FILE_MODE, LOG_LEVEL, NAME, NO_DESKTOP_FILE, USER_DIRS, singleton
 
 
-type Decoratable[**P, T] = Callable[P, T]
-type Decorated[**P, T] = Callable[P, T]
+log: Final[logging.Logger] = logging.getLogger(__name__)
 
 
 def setup_logging(
@@ -34,41 +27,16 @@ def setup_logging(
     )
 
   else:
+    from rich.logging import RichHandler
+
     handlers = [RichHandler(rich_tracebacks=True)]
     logging.basicConfig(level=level, handlers=handlers)
 
 
-# check for user dirs and create them asynchronously
-async def _create_user_dirs():
-  await PATHS.create_user_paths()
-
-  paths = map(AsyncPath, USER_DIRS)
-  coros = (path.mkdir(parents=True, exist_ok=True) for path in paths)
-
-  await gather(*coros)
-
-
 @singleton
 def create_user_dirs():
-  run(_create_user_dirs())
-
-
-def ensure_user_dirs_exist[**P, T](func: Decoratable) -> Decorated:
-  @wraps(func)
-  def new_func(*args: P.args, **kwargs: P.kwargs) -> T:
-    create_user_dirs()
-    return func(*args, **kwargs)
-
-  return new_func
-
-
-def get_stat(file: Path) -> stat_result:
-  return file.stat()
-
-
-@singleton
-def get_src_stat() -> stat_result:
-  return get_stat(SRC_DIR)
+  for path in USER_DIRS:
+    path.mkdir(parents=True, exist_ok=True)
 
 
 @singleton
@@ -78,13 +46,6 @@ def get_template() -> list[str]:
     .splitlines()
 
 
-def is_older_than_module(other: Path) -> bool:
-  src_stat = get_src_stat()
-  other_stat = get_stat(other)
-
-  return src_stat.st_ctime > other_stat.st_ctime
-
-
 def get_paths(light_icon: bool = True) -> tuple[Path, Path]:
   icon_path = LIGHT_ICON if light_icon else DARK_ICON
   name_suffix = LIGHT_END if light_icon else DARK_END
@@ -94,23 +55,69 @@ def get_paths(light_icon: bool = True) -> tuple[Path, Path]:
   return desktop_path, icon_path
 
 
-@cache
-def new_file_from_template(file: Path, icon_path: Path):
+def new_text_from_template(icon_path: Path) -> str:
   *lines, name, icon = get_template()
   name += DESKTOP_NAME
   icon += str(icon_path)
   lines = (*lines, name, icon)
-  text = '\n'.join(lines)
 
-  file.write_text(text)
+  return '\n'.join(lines)
+
+
+def write_if_changed(file: Path, text: str) -> bool:
+  """Only rewrite `file` if its contents differ from `text`"""
+  data = text.encode()
+
+  try:
+    if file.read_bytes() == data:
+      return False
+
+  except FileNotFoundError:
+    pass
+
+  file.write_bytes(data)
+  return True
 
 
-@cache
-@ensure_user_dirs_exist
 def create_desktop_file(light_icon: bool = True) -> Path:
   file, icon = get_paths(light_icon)
+  text = new_text_from_template(icon)
 
-  if not file.exists() or is_older_than_module(file):
-    new_file_from_template(file, icon)
+  if write_if_changed(file, text):
+    log.debug(f'Wrote {file}.')
 
   return file
+
+
+class DesktopFiles(NamedTuple):
+  light: Path | str = NO_DESKTOP_FILE
+  dark: Path | str = NO_DESKTOP_FILE
+
+  def get(self, light_icon: bool = True) -> Path | str:
+    return self.light if light_icon else self.dark
+
+
+def try_create_desktop_file(light_icon: bool = True) -> Path | str:
+  try:
+    return create_desktop_file(light_icon)
+
+  except Exception as e:
+    log.exception(e)
+    log.error("Couldn't create desktop file.")
+
+    return NO_DESKTOP_FILE
+
+
+@singleton
+def setup_user_state() -> DesktopFiles:
+  """
+    Create user dirs and both desktop files once at startup.
+
+    Later calls return the cached paths without touching the filesystem.
+  """
+  create_user_dirs()
+
+  return DesktopFiles(
+    light=try_create_desktop_file(light_icon=True),
+    dark=try_create_desktop_file(light_icon=False),
+  )
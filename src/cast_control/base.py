@@ -1,19 +1,20 @@
 from __future__ import annotations
 
 from collections.abc import Callable
-from decimal import Context, Decimal, ROUND_HALF_UP, getcontext
+from decimal import Decimal
 from enum import IntEnum, StrEnum, auto
 from functools import lru_cache
 from pathlib import Path
-from typing import Final
+from typing import Final, TYPE_CHECKING
 
-from app_paths import AsyncAppPaths, get_paths
-from pychromecast import Chromecast
-from pychromecast.controllers.media import MediaStatus
-from pychromecast.controllers.receiver import CastStatus, LaunchFailure
-from pychromecast.socket_client import ConnectionStatus
+from . import NAME
+from .paths import ARGS, ARGS_STEM, DATA_DIR, DEVICES, LOG, LOG_DIR, PID, STATE_DIR, USER_DIRS
 
-from . import NAME, __author__, __version__
+if TYPE_CHECKING:
+  from pychromecast import Chromecast
+  from pychromecast.controllers.media import MediaStatus
+  from pychromecast.controllers.receiver import CastStatus, LaunchFailure
+  from pychromecast.socket_client import ConnectionStatus
 
 
 Seconds = Decimal
@@ -34,11 +35,18 @@ SINGLETON: Final[int] = 1
 YOUTUBE: Final[str] = 'YouTube'
 
 US_IN_SEC: Final[int] = 1_000_000  # seconds to microseconds
+MS_IN_SEC: Final[int] = 1_000  # seconds to milliseconds
+NS_IN_US: Final[int] = 1_000  # microseconds to nanoseconds
 DEFAULT_TRACK: Final[str] = '/track/1'
 DEFAULT_DISC_NO: Final[int] = 1
 
 DEFAULT_RETRY_WAIT: Final[Seconds] = Seconds(5.0)
 DEFAULT_WAIT: Final[Seconds] = Seconds(30)
+DEFAULT_DISCOVERY_WAIT: Final[Seconds] = Seconds(5)
+DEFAULT_MIN_BACKOFF: Final[Seconds] = Seconds(1)
+DEFAULT_BACKOFF_FACTOR: Final[int] = 2
+DEFAULT_HISTORY: Final[int] = 32  # retry attempts to remember
+DEFAULT_COALESCE_WAIT: Final[Seconds] = Seconds('0.03')  # collect status bursts for 30ms
 DEFAULT_DEVICE_NAME: Final[str] = DESKTOP_NAME
 DEFAULT_NO_DEVICE_NAME: Final[str] = 'Device'
 
@@ -49,26 +57,9 @@ DEFAULT_SET_LOG: Final[bool] = False
 DESKTOP_SUFFIX: Final[str] = '.desktop'
 NO_DESKTOP_FILE: Final[str] = ''
 
-ARGS_STEM: Final[str] = '-args'
 LIGHT_END: Final[str] = '-light'
 DARK_END: Final[str] = '-dark'
 
-PATHS: Final[AsyncAppPaths] = get_paths(
-  NAME,
-  __author__,
-  __version__,
-  is_async=True
-)
-DATA_DIR: Final[Path] = Path(PATHS.user_data_path)
-LOG_DIR: Final[Path] = Path(PATHS.user_log_path)
-STATE_DIR: Final[Path] = Path(PATHS.user_state_path)
-
-USER_DIRS: Final[tuple[Path, ...]] = DATA_DIR, LOG_DIR, STATE_DIR
-
-PID: Final[Path] = STATE_DIR / f'{NAME}.pid'
-ARGS: Final[Path] = STATE_DIR / f'service{ARGS_STEM}.tmp'
-LOG: Final[Path] = LOG_DIR / f'{NAME}.log'
-
 SRC_DIR: Final[Path] = Path(__file__).parent
 ASSETS_DIR: Final[Path] = SRC_DIR / 'assets'
 DESKTOP_TEMPLATE: Final[Path] = ASSETS_DIR / f'template{DESKTOP_SUFFIX}'
@@ -81,13 +72,9 @@ TEMPLATE_SVG: Final[Path] = ICON_DIR / 'cc-template.svg'
 LIGHT_ICON = LIGHT_THUMB = LIGHT_SVG
 DEFAULT_THUMB = DARK_ICON = DARK_SVG
 
-PRECISION: Final[int] = 4
-CONTEXT: Final[Context] = getcontext()
-CONTEXT.prec = PRECISION
-CONTEXT.rounding = ROUND_HALF_UP
-
-Device = Chromecast
-Status = MediaStatus | CastStatus | ConnectionStatus | LaunchFailure
+# lazily evaluated, so importing .base doesn't import pychromecast
+type Device = Chromecast
+type Status = MediaStatus | CastStatus | ConnectionStatus | LaunchFailure
 
 type Decorated[** P, T] = Callable[P, T]
 type Decoratable[** P, T] = Callable[P, T]
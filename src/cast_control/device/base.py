@@ -1,35 +1,41 @@
 from __future__ import annotations
 
+import logging
+import re
 from collections import deque
-from collections.abc import Iterable, Iterator
+from collections.abc import Callable, Iterable, Iterator
 from enum import StrEnum
+from functools import lru_cache
+from importlib import import_module
 from itertools import chain
+from threading import Lock
+from time import monotonic, monotonic_ns
 from typing import Any, Final, NamedTuple, Self, TYPE_CHECKING
 from urllib.parse import ParseResult, parse_qs, urlparse
 
 from iteration_utilities import unique_everseen
-from pychromecast.controllers.bbciplayer import BbcIplayerController
-from pychromecast.controllers.bbcsounds import BbcSoundsController
-from pychromecast.controllers.bubbleupnp import BubbleUPNPController
-from pychromecast.controllers.dashcast import DashCastController
-from pychromecast.controllers.homeassistant_media import HomeAssistantMediaController
-from pychromecast.controllers.media import DefaultMediaReceiverController
-from pychromecast.controllers.multizone import MultizoneController
-from pychromecast.controllers.plex import PlexController
-from pychromecast.controllers.receiver import ReceiverController
-from pychromecast.controllers.supla import SuplaController
-from pychromecast.controllers.yleareena import YleAreenaController
-from pychromecast.controllers.youtube import YouTubeController
+from mpris_server import BEGINNING, DEFAULT_RATE, Microseconds, PlayState, Rate, Volume
+from pychromecast.config import APP_BBCIPLAYER, APP_BBCSOUNDS, APP_BUBBLEUPNP, APP_DASHCAST, APP_HOMEASSISTANT_MEDIA, \
+  APP_PLEX, APP_SUPLA, APP_YLEAREENA, APP_YOUTUBE
+from pychromecast.const import CAST_TYPE_GROUP
+from pychromecast.controllers import BaseController
 from validators import url
 
-from ..base import Device, MediaType
+from ..base import Device, MediaType, NS_IN_US, US_IN_SEC
 
 if TYPE_CHECKING:
   from ..protocols import Wrapper
 
 
+log: Final[logging.Logger] = logging.getLogger(__name__)
+
 URL_PROTO: Final[str] = 'https'
 SKIP_FIRST: Final[slice] = slice(1, None)
+URL_CACHE_SIZE: Final[int] = 256
+
+CONTROLLERS_PKG: Final[str] = 'pychromecast.controllers'
+MULTIZONE_CONTROLLER: Final[str] = 'multizone'
+CONTROLLER_IDLE: Final[float] = 5 * 60.0  # seconds before an unused app controller is unregistered
 
 
 class CachedIcon(NamedTuple):
@@ -38,45 +44,202 @@ class CachedIcon(NamedTuple):
   title: str | None = None
 
 
-class Controllers(NamedTuple):
-  bbc_ip: BbcIplayerController | None = None
-  bbc_sound: BbcSoundsController | None = None
-  bubble: BubbleUPNPController | None = None
-  dash: DashCastController | None = None
-  default: DefaultMediaReceiverController | None = None
-  ha_media: HomeAssistantMediaController | None = None
-  multizone: MultizoneController | None = None
-  plex: PlexController | None = None
-  receiver: ReceiverController | None = None
-  supla: SuplaController | None = None
-  yle: YleAreenaController | None = None
-  youtube: YouTubeController | None = None
+class Factory(NamedTuple):
+  module: str  # in pychromecast.controllers
+  name: str  # class name
+  app_id: str | None = None  # load the controller when this app starts
+  cast_type: str | None = None  # load the controller up front for devices of this type
 
-  # plex_api: PlexApiController | None = None
-  # ha: HomeAssistantController | None= None
 
-  @classmethod
-  def new(cls: type[Self], device: Device | None) -> Self:
-    return cls(
-      BbcIplayerController(),
-      BbcSoundsController(),
-      BubbleUPNPController(),
-      DashCastController(),
-      DefaultMediaReceiverController(),
-      HomeAssistantMediaController(),
-      MultizoneController(device.uuid) if device else None,
-      PlexController(),
-      ReceiverController(),
-      SuplaController(),
-      YleAreenaController(),
-      YouTubeController(),
-      # HomeAssistantController(),
-    )
-
-  def register(self, device: Device):
-    for controller in self:
-      if controller:
-        device.register_handler(controller)
+FACTORIES: Final[dict[str, Factory]] = {
+  'bbc_ip': Factory('bbciplayer', 'BbcIplayerController', APP_BBCIPLAYER),
+  'bbc_sound': Factory('bbcsounds', 'BbcSoundsController', APP_BBCSOUNDS),
+  'bubble': Factory('bubbleupnp', 'BubbleUPNPController', APP_BUBBLEUPNP),
+  'dash': Factory('dashcast', 'DashCastController', APP_DASHCAST),
+  'default': Factory('media', 'DefaultMediaReceiverController'),
+  'ha_media': Factory('homeassistant_media', 'HomeAssistantMediaController', APP_HOMEASSISTANT_MEDIA),
+  'multizone': Factory('multizone', 'MultizoneController', cast_type=CAST_TYPE_GROUP),
+  'plex': Factory('plex', 'PlexController', APP_PLEX),
+  'receiver': Factory('receiver', 'ReceiverController'),
+  'supla': Factory('supla', 'SuplaController', APP_SUPLA),
+  'yle': Factory('yleareena', 'YleAreenaController', APP_YLEAREENA),
+  'youtube': Factory('youtube', 'YouTubeController', APP_YOUTUBE),
+
+  # 'plex_api': Factory('plex', 'PlexApiController'),
+  # 'ha': Factory('homeassistant', 'HomeAssistantController', APP_HOMEASSISTANT_LOVELACE),
+}
+
+APPS: Final[dict[str, str]] = {
+  factory.app_id: name
+  for name, factory in FACTORIES.items()
+  if factory.app_id
+}
+
+
+class Controllers:
+  """
+    Create and register app controllers when they're first needed.
+
+    Controllers for apps that stopped running are unregistered once they
+    have been idle for `idle` seconds, so pychromecast doesn't consult
+    them on every message.
+  """
+
+  device: Device
+  idle: float
+
+  _loaded: dict[str, BaseController]
+  _used: dict[str, float]
+  _lock: Lock
+
+  def __init__(self, device: Device, idle: float = CONTROLLER_IDLE):
+    self.device = device
+    self.idle = idle
+
+    self._loaded = {}
+    self._used = {}
+    self._lock = Lock()
+
+  def __contains__(self, name: str) -> bool:
+    return name in self._loaded
+
+  def __iter__(self) -> Iterator[BaseController]:
+    return iter(list(self._loaded.values()))
+
+  def _new(self, name: str) -> BaseController:
+    module, cls_name, *_ = FACTORIES[name]
+    cls = getattr(import_module(f'{CONTROLLERS_PKG}.{module}'), cls_name)
+
+    if name == MULTIZONE_CONTROLLER:
+      return cls(self.device.uuid)
+
+    return cls()
+
+  def get(self, name: str) -> BaseController | None:
+    """The controller if it's loaded, without loading it or counting it as used"""
+    return self._loaded.get(name)
+
+  def load(self, name: str) -> BaseController | None:
+    """The controller, creating and registering it if needed"""
+    if name not in FACTORIES:
+      return None
+
+    with self._lock:
+      if not (controller := self._loaded.get(name)):
+        controller = self._new(name)
+        self.device.register_handler(controller)
+        self._loaded[name] = controller
+        log.debug(f'Registered {name} controller.')
+
+        # pychromecast only connects controllers when their app starts, so
+        # one registered while its app runs would never hear from it
+        if controller.is_active:
+          controller.channel_connected()
+
+      self._used[name] = monotonic()
+
+    return controller
+
+  def load_for_cast_type(self):
+    """Load the controllers this kind of device needs whatever app runs, like multizone for groups"""
+    cast_type = self.device.cast_type
+
+    for name, factory in FACTORIES.items():
+      if factory.cast_type and factory.cast_type == cast_type:
+        self.load(name)
+
+  def unload(self, name: str):
+    with self._lock:
+      if not (controller := self._loaded.pop(name, None)):
+        return
+
+      self._used.pop(name, None)
+      self.device.unregister_handler(controller)
+      log.debug(f'Unregistered {name} controller.')
+
+  def on_app(self, app_id: str | None):
+    """Load the running app's controller and unload controllers for apps that stopped"""
+    if name := APPS.get(app_id):
+      self.load(name)
+
+    now = monotonic()
+
+    for name in list(self._loaded):
+      if (running := FACTORIES[name].app_id) is None or running == app_id:
+        continue
+
+      if now - self._used.get(name, now) >= self.idle:
+        self.unload(name)
+
+  def unload_all(self):
+    """Unregister every controller, before the device is replaced or disconnected"""
+    for name in list(self._loaded):
+      self.unload(name)
+
+
+type Parser = Callable[[str], str | None]
+
+
+class Route(NamedTuple):
+  controller: str  # key in FACTORIES
+  pattern: str  # regex with one named group, named after the route, that captures the content ID
+  parse: Parser | None = None  # finds the content ID instead of the group, for URIs with their own parser
+
+
+class Resolved(NamedTuple):
+  route: str
+  controller: str
+  content_id: str
+
+
+class Resolvers:
+  """Route URIs to the controller that plays them through one precompiled pattern"""
+
+  routes: dict[str, Route]
+
+  _pattern: re.Pattern[str] | None
+
+  def __init__(self, **routes: Route):
+    self.routes = {}
+    self._pattern = None
+
+    for name, route in routes.items():
+      self.register(name, route)
+
+  def _compile(self):
+    patterns = (route.pattern for route in self.routes.values())
+    self._pattern = re.compile('|'.join(patterns), re.IGNORECASE)
+
+  def register(self, name: str, route: Route):
+    if f'(?P<{name}>' not in route.pattern:
+      raise ValueError(f'Pattern for {name} must capture its content ID in a group named {name}.')
+
+    self.routes[name] = route
+    self._compile()
+
+  def resolve(self, uri: str | None) -> Resolved | None:
+    if not uri or not self._pattern or not (matched := match_route(self._pattern, uri)):
+      return None
+
+    name, content_id = matched
+    route = self.routes[name]
+
+    if route.parse and not (content_id := route.parse(uri)):
+      return None
+
+    return Resolved(name, route.controller, content_id)
+
+
+@lru_cache(URL_CACHE_SIZE)
+def match_route(pattern: re.Pattern[str], uri: str) -> tuple[str, str] | None:
+  """The name of the route that matches `uri`, and what its group captured"""
+  if not (match := pattern.match(uri)):
+    return None
+
+  # only the matching route's group takes part in the match
+  name = match.lastgroup
+
+  return name, match[name]
 
 
 class Titles(NamedTuple):
@@ -86,6 +249,73 @@ class Titles(NamedTuple):
   comments: str | None = None
 
 
+class TitlesKey(NamedTuple):
+  """The status fields that titles are built from"""
+
+  title: str | None = None
+  subtitle: str | None = None
+  series_title: str | None = None
+  artist: str | None = None
+  album: str | None = None
+  app_name: str | None = None
+  is_youtube: bool = False
+
+
+class CacheInfo(NamedTuple):
+  hits: int = 0
+  misses: int = 0
+
+  @property
+  def hit_rate(self) -> float:
+    if not (total := self.hits + self.misses):
+      return 0.0
+
+    return self.hits / total
+
+
+class Abilities(NamedTuple):
+  can_pause: bool = False
+  can_play_next: bool = False
+  can_play_prev: bool = False
+  can_seek: bool = False
+
+
+class Snapshot(NamedTuple):
+  """Values derived from the device's statuses, built once per new status"""
+
+  titles: Titles = Titles()
+  art_url: str | None = None
+  duration: Microseconds | None = None
+  playstate: PlayState = PlayState.STOPPED
+  abilities: Abilities = Abilities()
+  volume: Volume | None = None
+  is_mute: bool = False
+  url: str | None = None
+  track: int | None = None
+  stream_title: str | None = None
+
+
+class PositionClock(NamedTuple):
+  """Extrapolate the playback position from the last reported position"""
+
+  anchor: int = 0  # monotonic nanoseconds
+  position: Microseconds = BEGINNING
+  rate: Rate = DEFAULT_RATE
+  is_playing: bool = False
+  content_id: str | None = None
+
+  def get_position(self, now: int | None = None) -> Microseconds:
+    if not self.is_playing:
+      return self.position
+
+    if now is None:
+      now = monotonic_ns()
+
+    elapsed: Microseconds = (now - self.anchor) // NS_IN_US
+
+    return self.position + round(elapsed * self.rate)
+
+
 class TitlesBuilder(Iterable[str]):
   title: str | None = None
   artist: str | None = None
@@ -189,21 +419,6 @@ class YoutubeUrl(StrEnum):
   video = f'{URL_PROTO}://{long}/{watch_endpoint}?{video_query}='
   playlist = f'{URL_PROTO}://{long}/{playlist_endpoint}?{playlist_query}='
 
-  @classmethod
-  def domain(cls: type[Self], uri: str | ParseResult) -> Self | None:
-    match get_domain(uri):
-      case cls.long:
-        return cls.long
-
-      case cls.short:
-        return cls.short
-
-    return None
-
-  @classmethod
-  def get_content_id(cls: type[Self], uri: str | None) -> str | None:
-    return get_content_id(uri)
-
   @classmethod
   def get_url(cls: type[Self], video_id: str | None = None, playlist_id: str | None = None) -> str | None:
     if video_id:
@@ -214,74 +429,128 @@ class YoutubeUrl(StrEnum):
 
     return None
 
-  @classmethod
-  def is_youtube(cls: type[Self], uri: str | None) -> bool:
-    if not uri:
-      return False
 
-    uri = uri.casefold()
+class YoutubeUri(NamedTuple):
+  domain: YoutubeUrl | None = None
+  kind: YoutubeUrl | None = None
+  content_id: str | None = None
 
-    return get_domain(uri) in cls
 
-  @classmethod
-  def type(cls: type[Self], uri: str | None) -> Self | None:
-    if not (which := cls.which(uri)):
-      return None
+NOT_YOUTUBE: Final[YoutubeUri] = YoutubeUri()
 
-    if cls.watch_endpoint in uri:
-      return cls.video
 
-    elif cls.playlist_endpoint in uri:
-      return cls.playlist
+def _get_domain(parsed: ParseResult) -> str | None:
+  if len(parts := parsed.netloc.casefold().split(".")) < 2:
+    return None
 
-    return which
+  *_, name, tld = parts
 
-  @classmethod
-  def which(cls: type[Self], uri: str | None) -> Self | None:
-    if not cls.is_youtube(uri):
-      return None
+  return f"{name}.{tld}"
 
-    if cls.long in uri:
-      return cls.long
 
-    elif cls.short in uri:
-      return cls.short
+def _get_query(parsed: ParseResult, key: str) -> str | None:
+  qs = parse_qs(parsed.query)
 
-    return None
+  if values := qs.get(key):
+    first, *_ = values
+    return first
+
+  return None
 
 
-def get_domain(uri: str | ParseResult) -> str | None:
-  if not url(uri):
-    return None
+@lru_cache(URL_CACHE_SIZE)
+def classify(uri: str | ParseResult | None) -> YoutubeUri:
+  """Validate and parse a URI once to find its YouTube domain, kind and content ID"""
+  if isinstance(uri, ParseResult):
+    uri = uri.geturl()
 
-  if isinstance(uri, str):
-    uri = urlparse(uri)
+  if not uri or not url(uri):
+    return NOT_YOUTUBE
 
-  *_, name, tld = uri.netloc.split(".")
+  parsed = urlparse(uri)
 
-  return f"{name}.{tld}"
+  match _get_domain(parsed):
+    case YoutubeUrl.long:
+      domain = YoutubeUrl.long
 
+    case YoutubeUrl.short:
+      domain = YoutubeUrl.short
 
-def get_content_id(uri: str) -> str | None:
-  if not url(uri) or not YoutubeUrl.is_youtube(uri):
-    return None
+    case _:
+      return NOT_YOUTUBE
 
-  parsed = urlparse(uri)
-  content_id: str | None = None
+  if YoutubeUrl.watch_endpoint in uri:
+    kind = YoutubeUrl.video
 
-  match YoutubeUrl.domain(uri), YoutubeUrl.type(uri):
+  elif YoutubeUrl.playlist_endpoint in uri:
+    kind = YoutubeUrl.playlist
+
+  elif domain is YoutubeUrl.short:
+    kind = YoutubeUrl.video
+
+  else:
+    return YoutubeUri(domain)
+
+  match domain, kind:
     case YoutubeUrl.long, YoutubeUrl.video:
-      qs = parse_qs(parsed.query)
-      [content_id] = qs[YoutubeUrl.video_query]
+      content_id = _get_query(parsed, YoutubeUrl.video_query)
 
     case YoutubeUrl.long, YoutubeUrl.playlist:
-      qs = parse_qs(parsed.query)
-      [content_id] = qs[YoutubeUrl.playlist_query]
+      content_id = _get_query(parsed, YoutubeUrl.playlist_query)
+
+    case _:
+      content_id = parsed.path[SKIP_FIRST] or None
+
+  return YoutubeUri(domain, kind, content_id)
+
+
+def get_content_id(uri: str | None) -> str | None:
+  return classify(uri).content_id
+
+
+RESOLVERS: Final[Resolvers] = Resolvers(
+  # videos and playlists, classify() finds which and their IDs
+  youtube=Route(
+    'youtube',
+    r'https?://(?:[\w-]+\.)*(?P<youtube>youtube\.com|youtu\.be)/',
+    get_content_id,
+  ),
+  bbc_ip=Route(
+    'bbc_ip',
+    r'https?://(?:www\.)?bbc\.co\.uk/iplayer/episode/(?P<bbc_ip>\w+)',
+  ),
+  bbc_sound=Route(
+    'bbc_sound',
+    r'https?://(?:www\.)?bbc\.co\.uk/sounds/play/(?P<bbc_sound>\w+)',
+  ),
+  supla=Route(
+    'supla',
+    r'https?://(?:www\.)?supla\.fi/(?:[\w-]+/)*(?P<supla>\d+)',
+  ),
+  yle=Route(
+    'yle',
+    r'https?://areena\.yle\.fi/(?:[\w-]+/)*(?P<yle>1-\d+)',
+  ),
+)
+
+
+def to_microseconds(seconds: float | None) -> Microseconds | None:
+  """Convert pychromecast's float seconds to whole microseconds"""
+  if seconds is None:
+    return None
+
+  return round(seconds * US_IN_SEC)
+
+
+def to_seconds(microseconds: Microseconds) -> int:
+  """Round microseconds to whole seconds, halves round to even like round() does"""
+  seconds, rest = divmod(microseconds, US_IN_SEC)
+  twice = rest * 2
 
-    case YoutubeUrl.short, YoutubeUrl.video | YoutubeUrl.playlist:
-      content_id = parsed.path[SKIP_FIRST]
+  if twice > US_IN_SEC or (twice == US_IN_SEC and seconds % 2):
+    seconds += 1
 
-  return content_id
+  return seconds
 
 
 def get_media_type(wrapper: Wrapper) -> MediaType | None:
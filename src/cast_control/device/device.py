@@ -1,11 +1,47 @@
 from __future__ import annotations
 
-from typing import NamedTuple
+import logging
+from collections.abc import Callable, Iterable
+from contextlib import nullcontext
+from functools import partial
+from ipaddress import ip_address
+from threading import Event, Lock, Thread
+from time import monotonic, perf_counter, sleep
+from types import NoneType
+from typing import Final, NamedTuple, Self
 from uuid import UUID
 
-from pychromecast import get_chromecast_from_host, get_chromecasts, get_listed_chromecasts
+from pychromecast import get_chromecast_from_cast_info, get_chromecast_from_host
+from pychromecast.dial import get_device_info
+from pychromecast.discovery import CastBrowser, SimpleCastListener
+from pychromecast.models import CastInfo, HostServiceInfo
+from zeroconf import Zeroconf
 
-from ..base import DEFAULT_DEVICE_NAME, DEFAULT_RETRY_WAIT, Device, NO_PORT, NO_STR, Seconds
+from .. import store
+from ..base import DEFAULT_DEVICE_NAME, DEFAULT_DISCOVERY_WAIT, DEFAULT_RETRY_WAIT, DEVICES, Device, NO_PORT, \
+  NO_STR, Seconds
+from ..store import Schema
+
+
+log: Final[logging.Logger] = logging.getLogger(__name__)
+
+NO_WAIT: Final[float] = 0.0
+CAST_PORT: Final[int] = 8009  # what pychromecast assumes for a host without a port
+
+HOSTS_KIND: Final[str] = 'devices'
+HOST_SCHEMA: Final[Schema] = {
+  'host': (str,),
+  'port': (int, NoneType),
+  'uuid': (str,),
+  'model_name': (str,),
+  'friendly_name': (str,),
+}
+HOSTS_MIGRATIONS: Final[store.Migrations] = {
+  store.NO_VERSION: lambda data: data,  # the same mapping, without a header
+}
+
+# devices found at once are saved from their own threads, one at a time
+SAVE_LOCK: Final[Lock] = Lock()
 
 
 class Host(NamedTuple):
@@ -16,6 +52,156 @@ class Host(NamedTuple):
   friendly_name: str = DEFAULT_DEVICE_NAME
 
 
+type Hosts = dict[str, Host]
+
+
+class Target(NamedTuple):
+  name: str | None = None
+  host: str | None = None
+  uuid: UUID | str | None = None
+
+  @classmethod
+  def parse(cls: type[Self], identifier: str) -> Self:
+    """Treat `identifier` as a UUID or IP address if it is one, otherwise as a name"""
+    try:
+      return cls(uuid=str(UUID(identifier)))
+
+    except ValueError:
+      pass
+
+    try:
+      return cls(host=str(ip_address(identifier)))
+
+    except ValueError:
+      return cls(name=identifier)
+
+
+def parse_uuid(uuid: UUID | str | None) -> UUID | None:
+  if not uuid:
+    return None
+
+  try:
+    return UUID(str(uuid))
+
+  except ValueError:
+    return None
+
+
+def get_host(device: Device) -> Host | None:
+  """The device's address, if it identified itself well enough to find it again"""
+  info = device.cast_info
+
+  if not info.uuid or not info.friendly_name:
+    return None
+
+  return Host(
+    host=info.host,
+    port=info.port,
+    uuid=str(info.uuid),
+    model_name=info.model_name or NO_STR,
+    friendly_name=info.friendly_name,
+  )
+
+
+def is_valid(uuid: str, host: Host) -> bool:
+  return (parsed := parse_uuid(host.uuid)) is not None and str(parsed) == uuid
+
+
+def load_hosts() -> Hosts:
+  """Load the devices we've connected to before, keyed by UUID"""
+  if not DEVICES.exists():
+    return {}
+
+  try:
+    data = store.read(DEVICES, HOSTS_KIND, HOSTS_MIGRATIONS)
+    hosts = {uuid: Host(**store.check(info, HOST_SCHEMA)) for uuid, info in data.items()}
+
+  except Exception as e:
+    log.warning(f"Couldn't load device registry {DEVICES}: {e}")
+    return {}
+
+  # older versions saved devices connected via host without their UUIDs
+  return {uuid: host for uuid, host in hosts.items() if is_valid(uuid, host)}
+
+
+def save_host(host: Host):
+  with SAVE_LOCK:
+    hosts = load_hosts()
+    hosts[host.uuid] = host
+    data = {uuid: host._asdict() for uuid, host in hosts.items()}
+
+    store.write(DEVICES, HOSTS_KIND, data)
+
+
+def remember_device(device: Device):
+  """Save the device's address in the background"""
+  if not (host := get_host(device)):
+    log.debug(f"Not saving {device.name}, it didn't report a UUID.")
+    return
+
+  def save():
+    try:
+      save_host(host)
+      log.debug(f'Saved {host} to {DEVICES}.')
+
+    except Exception as e:
+      log.warning(f"Couldn't save {host} to {DEVICES}: {e}")
+
+  thread = Thread(target=save, daemon=True)
+  thread.start()
+
+
+def find_cached_host(
+  name: str | None = None,
+  host: str | None = None,
+  uuid: UUID | str | None = None,
+) -> Host | None:
+  hosts = load_hosts()
+
+  if (parsed := parse_uuid(uuid)) and (cached := hosts.get(str(parsed))):
+    return cached
+
+  # the default name isn't a device's name, so only match by host
+  if name == DEFAULT_DEVICE_NAME:
+    name = None
+
+  for cached in hosts.values():
+    if host and cached.host == host:
+      return cached
+
+    if name and cached.friendly_name.casefold() == name.casefold():
+      return cached
+
+  return None
+
+
+def get_device_via_cache(
+  cached: Host,
+  retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
+) -> Device | None:
+  """Connect to a device at its last known address without mDNS discovery"""
+  # addresses change hands, so make sure the same device is still there,
+  # on its own port, as groups aren't on the default one
+  services = {HostServiceInfo(cached.host, cached.port or CAST_PORT)}
+  status = get_device_info(cached.host, services, timeout=float(retry_wait))
+
+  if not status or status.uuid != parse_uuid(cached.uuid):
+    log.info(f"{cached.friendly_name} isn't at {cached.host} anymore, discovering devices.")
+    return None
+
+  info = cached._replace(uuid=status.uuid, friendly_name=status.friendly_name)
+  device = get_chromecast_from_host(info, retry_wait=float(retry_wait))
+  device.wait(timeout=float(retry_wait))
+
+  if device.status is not None:
+    return device
+
+  log.info(f"Couldn't connect to {cached.friendly_name} at {cached.host}, discovering devices.")
+  device.disconnect()
+
+  return None
+
+
 def get_device_via_host(
   host: str,
   name: str | None = DEFAULT_DEVICE_NAME,
@@ -24,6 +210,10 @@ def get_device_via_host(
   name = name or DEFAULT_DEVICE_NAME
   info = Host(host, friendly_name=name)
 
+  # fill in what the device says about itself, so it can be remembered
+  if status := get_device_info(host, timeout=float(retry_wait)):
+    info = info._replace(uuid=status.uuid, model_name=status.model_name, friendly_name=status.friendly_name)
+
   if device := get_chromecast_from_host(info, retry_wait=float(retry_wait)):
     device.wait()
     return device
@@ -31,81 +221,277 @@ def get_device_via_host(
   return None  # explicit
 
 
-def get_devices(retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT) -> list[Device]:
-  devices, service_browser = get_chromecasts(retry_wait=float(retry_wait))
-  service_browser.stop_discovery()
+def connect_cast_info(
+  info: CastInfo,
+  zconf: Zeroconf,
+  retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
+) -> Device:
+  device = get_chromecast_from_cast_info(info, zconf, retry_wait=float(retry_wait))
+  device.wait()
+
+  return device
 
-  return devices
 
+def set_retry_wait(device: Device, retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT):
+  # the socket client reads this before each reconnection attempt
+  device.socket_client.retry_wait = float(retry_wait or DEFAULT_RETRY_WAIT)
 
-def get_listed_devices(
-  name: str | None = None,
-  uuid: UUID | str | None = None,
-  retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
-) -> list[Device]:
-  devices, service_browser = get_listed_chromecasts(
-    friendly_names=[name],
-    uuids=[uuid],
-    retry_wait=float(retry_wait),
-  )
-  service_browser.stop_discovery()
 
-  return devices
+type Match = Callable[[CastInfo], bool]
+
+
+class Discovery:
+  """
+    Share one mDNS browse between lookups via name, UUID or host.
+
+    Lookups return as soon as a matching device is resolved instead of
+    waiting for the whole browse window.
+  """
+
+  retry_wait: Seconds | float | None
+  timeout: Seconds | float
+
+  browser: CastBrowser | None
+  starts: int
+
+  _found: Event
+  _started: float
+  _wanted: Match | None
+
+  def __init__(
+    self,
+    retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
+    timeout: Seconds | float = DEFAULT_DISCOVERY_WAIT,
+  ):
+    self.retry_wait = retry_wait
+    self.timeout = timeout
+
+    self.browser = None
+    self.starts = 0
+
+    self._found = Event()
+    self._started = monotonic()
+    self._wanted = None
+
+  def __enter__(self) -> Self:
+    return self
 
+  def __exit__(self, *args):
+    self.stop()
+
+  def _start(self) -> CastBrowser:
+    if browser := self.browser:
+      return browser
+
+    log.debug('Starting device discovery.')
+    self.starts += 1
+    self._started = monotonic()
+
+    listener = SimpleCastListener(add_callback=self._on_cast, update_callback=self._on_cast)
+    self.browser = browser = CastBrowser(listener, Zeroconf())
+    browser.start_discovery()
+
+    return browser
+
+  def _on_cast(self, uuid: UUID, service: str):
+    # called from zeroconf's thread
+    if not (browser := self.browser) or not (wanted := self._wanted):
+      return
+
+    if (info := browser.devices.get(uuid)) and wanted(info):
+      self._found.set()
+
+  def _remaining(self) -> float:
+    elapsed = monotonic() - self._started
+    return max(float(self.timeout) - elapsed, NO_WAIT)
+
+  def _match(self, wanted: Match) -> CastInfo | None:
+    devices = self.browser.devices.copy()
+
+    for info in devices.values():
+      if wanted(info):
+        return info
 
-def get_first(devices: list[Device]) -> Device | None:
-  if not devices:
     return None
 
-  first, *_ = devices
-  first.wait()
+  def stop(self):
+    self._wanted = None
 
-  return first
+    if browser := self.browser:
+      browser.stop_discovery()
+      self.browser = None
 
+  @property
+  def devices(self) -> list[CastInfo]:
+    """Every device found during the browse window"""
+    browser = self._start()
+    sleep(self._remaining())
 
-def get_device_via_uuid(
-  uuid: UUID | str | None = None,
-  retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
-) -> Device | None:
-  devices = get_devices(retry_wait)
+    return list(browser.devices.copy().values())
 
-  if not uuid:
-    return get_first(devices)
+  def find(
+    self,
+    name: str | None = None,
+    uuid: UUID | str | None = None,
+    host: str | None = None,
+  ) -> CastInfo | None:
+    return self.find_match(partial(is_match, name=name, uuid=uuid, host=host))
 
-  uuid = UUID(uuid)
+  def find_match(self, wanted: Match) -> CastInfo | None:
+    """The first device `wanted` accepts, waiting for one until the browse window closes"""
+    self._start()
+    self._wanted = wanted
 
-  for device in devices:
-    if device.uuid == uuid:
-      device.wait()
+    try:
+      while True:
+        self._found.clear()
 
-      return device
+        if info := self._match(wanted):
+          return info
 
-  if devices := get_listed_devices(uuid=uuid, retry_wait=retry_wait):
-    return get_first(devices)
+        if not (remaining := self._remaining()):
+          return None
 
-  return None
+        self._found.wait(remaining)
 
+    finally:
+      self._wanted = None
 
-def get_device(
+  def connect(self, info: CastInfo) -> Device:
+    return connect_cast_info(info, self.browser.zc, self.retry_wait)
+
+  def get_device(
+    self,
+    name: str | None = None,
+    uuid: UUID | str | None = None,
+    host: str | None = None,
+  ) -> Device | None:
+    start = perf_counter()
+
+    if not (info := self.find(name, uuid, host)):
+      return None
+
+    device = self.connect(info)
+    elapsed = perf_counter() - start
+    log.debug(f'Found {device} via {name=}, {uuid=}, {host=} in {elapsed:.2f}s, {self.starts} browse(s).')
+
+    return device
+
+
+type OnAdded = Callable[[CastInfo], None]
+type OnRemoved = Callable[[UUID], None]
+
+
+class Watcher:
+  """
+    Keep one browse running and report devices as they come and go.
+
+    Callbacks run on zeroconf's thread and must not block.
+  """
+
+  retry_wait: Seconds | float | None
+  on_added: OnAdded
+  on_removed: OnRemoved
+
+  browser: CastBrowser | None
+
+  def __init__(
+    self,
+    on_added: OnAdded,
+    on_removed: OnRemoved,
+    retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
+  ):
+    self.on_added = on_added
+    self.on_removed = on_removed
+    self.retry_wait = retry_wait
+
+    self.browser = None
+
+  def __enter__(self) -> Self:
+    self.start()
+    return self
+
+  def __exit__(self, *args):
+    self.stop()
+
+  def _on_add(self, uuid: UUID, service: str):
+    if (browser := self.browser) and (info := browser.devices.get(uuid)):
+      log.debug(f'Device added: {info.friendly_name} ({uuid}).')
+      self.on_added(info)
+
+  def _on_remove(self, uuid: UUID, service: str, info: CastInfo):
+    log.debug(f'Device removed: {info.friendly_name} ({uuid}).')
+    self.on_removed(uuid)
+
+  def start(self):
+    if self.browser:
+      return
+
+    log.debug('Watching for devices.')
+    listener = SimpleCastListener(add_callback=self._on_add, remove_callback=self._on_remove)
+    self.browser = browser = CastBrowser(listener, Zeroconf())
+    browser.start_discovery()
+
+  def stop(self):
+    if browser := self.browser:
+      self.browser = None
+      browser.stop_discovery()
+
+  def is_present(self, uuid: UUID) -> bool:
+    return bool(browser := self.browser) and uuid in browser.devices
+
+  def connect(self, info: CastInfo) -> Device:
+    return connect_cast_info(info, self.browser.zc, self.retry_wait)
+
+
+def is_match(
+  info: CastInfo,
   name: str | None = None,
-  retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
-) -> Device | None:
-  devices = get_devices(retry_wait)
+  uuid: UUID | str | None = None,
+  host: str | None = None,
+) -> bool:
+  if not (name or uuid or host):
+    return True
 
-  if not name:
-    return get_first(devices)
+  if uuid and info.uuid == UUID(str(uuid)):
+    return True
 
-  devices += get_listed_devices(name, retry_wait=retry_wait)
+  if host and info.host == host:
+    return True
 
-  name = name.casefold()
+  if name and info.friendly_name and info.friendly_name.casefold() == name.casefold():
+    return True
 
-  for device in devices:
-    if device.name.casefold() == name:
-      device.wait()
+  return False
 
-      return device
 
-  return None
+def get_devices(retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT) -> list[Device]:
+  with Discovery(retry_wait) as discovery:
+    return [discovery.connect(info) for info in discovery.devices]
+
+
+def get_device_via_uuid(
+  uuid: UUID | str | None = None,
+  retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
+  discovery: Discovery | None = None,
+) -> Device | None:
+  if discovery:
+    return discovery.get_device(uuid=uuid)
+
+  with Discovery(retry_wait) as discovery:
+    return discovery.get_device(uuid=uuid)
+
+
+def get_device(
+  name: str | None = None,
+  retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
+  discovery: Discovery | None = None,
+) -> Device | None:
+  if discovery:
+    return discovery.get_device(name=name)
+
+  with Discovery(retry_wait) as discovery:
+    return discovery.get_device(name=name)
 
 
 def find_device(
@@ -113,21 +499,83 @@ def find_device(
   host: str | None = None,
   uuid: UUID | str | None = None,
   retry_wait: Seconds | float | None = DEFAULT_RETRY_WAIT,
+  discovery: Discovery | None = None,
 ) -> Device | None:
   device: Device | None = None
 
-  if host:
+  if cached := find_cached_host(name, host, uuid):
+    device = get_device_via_cache(cached, retry_wait)
+
+  if host and not device:
     device = get_device_via_host(host, name, retry_wait)
 
-  if uuid and not device:
-    device = get_device_via_uuid(uuid, retry_wait)
+  no_identifiers = not (host or name or uuid)
 
-  if name and not device:
-    device = get_device(name, retry_wait)
+  # every lookup below shares one browse, which only starts if it's needed,
+  # and a browse passed in by the caller is left running for its next lookup
+  with nullcontext(discovery) if discovery else Discovery(retry_wait) as discovery:
+    if uuid and not device:
+      device = get_device_via_uuid(uuid, retry_wait, discovery)
 
-  no_identifiers = not (host or name or uuid)
+    if name and not device:
+      device = get_device(name, retry_wait, discovery)
+
+    if no_identifiers:
+      device = get_device(retry_wait=retry_wait, discovery=discovery)
 
-  if no_identifiers:
-    device = get_device(retry_wait=retry_wait)
+  if device:
+    remember_device(device)
 
   return device
+
+
+class Address(NamedTuple):
+  host: str
+  port: int
+
+
+class Announcements:
+  """
+    Wait for any of `targets` to announce itself, waking only for
+    announcements that are new since the last wait.
+
+    A device that's announced but unreachable is announced on every
+    browse, and shouldn't cut every wait short.
+  """
+
+  targets: tuple[Target, ...]
+  last: dict[Target, Address]
+
+  def __init__(self, *targets: Target):
+    self.targets = targets
+    self.last = {}
+
+  def want(self, targets: Iterable[Target]):
+    """Wait for `targets` from now on, like the ones still missing"""
+    self.targets = tuple(targets)
+    self.last = {target: address for target, address in self.last.items() if target in self.targets}
+
+  def _get_new(self, info: CastInfo) -> Target | None:
+    address = Address(info.host, info.port)
+
+    for target in self.targets:
+      if is_match(info, target.name, target.uuid, target.host) and self.last.get(target) != address:
+        return target
+
+    return None
+
+  def wait(self, timeout: Seconds | float = DEFAULT_DISCOVERY_WAIT) -> bool:
+    """Browse for up to `timeout` seconds, returning True early if a target announces itself anew"""
+    with Discovery(timeout=timeout) as discovery:
+      if info := discovery.find_match(lambda info: self._get_new(info) is not None):
+        self.last[self._get_new(info)] = Address(info.host, info.port)
+        return True
+
+      devices = discovery.devices
+
+    # targets that left are new again when they're back, even at the same address
+    for target in list(self.last):
+      if not any(is_match(info, target.name, target.uuid, target.host) for info in devices):
+        del self.last[target]
+
+    return False
@@ -2,22 +2,186 @@ from __future__ import annotations
 
 import logging
 from abc import ABC, abstractmethod
-from typing import Final, Self, override
-
-from mpris_server import EventAdapter, Server
+from collections import deque
+from collections.abc import Callable
+from threading import Lock
+from typing import Any, Final, Self, override
+
+from gi.repository import GLib
+from mpris_server import Changes, EventAdapter, Interface, MprisInterface, ON_PLAYER_PROPS, ON_ROOT_PROPS, \
+  ON_TRACKS_PROPS, Property, PropertyValues, Server, emit_properties_changed, get_changed_properties
 from pychromecast.controllers.media import MediaStatus, MediaStatusListener
 from pychromecast.controllers.receiver import CastStatus, CastStatusListener, LaunchErrorListener, LaunchFailure
 from pychromecast.socket_client import ConnectionStatus, ConnectionStatusListener
 
 from ..adapter import DeviceAdapter
-from ..base import Device, Status
+from ..base import DEFAULT_COALESCE_WAIT, Device, MS_IN_SEC, Seconds, Status
 
 
 log: Final[logging.Logger] = logging.getLogger(__name__)
 
+MAX_PENDING: Final[int] = 32  # statuses waiting for the main loop
+
+# statuses that users notice, handle them without waiting
+UrgentStatus = ConnectionStatus | LaunchFailure
+
+type Handler = Callable[[list[Status | None]], None]
+type Observer = Callable[[Props], None]
+type Emitted = dict[Interface, dict[Property, Any]]
+type Props = frozenset[Property]
+type Routes = dict[str, Props]
+type Fields = dict[str, Any]
+
+ROOT_PROPS: Final[Props] = frozenset(ON_ROOT_PROPS)
+PLAYER_PROPS: Final[Props] = frozenset(ON_PLAYER_PROPS)
+TRACKLIST_PROPS: Final[Props] = frozenset(ON_TRACKS_PROPS)
+ALL_PROPS: Final[Props] = ROOT_PROPS | PLAYER_PROPS | TRACKLIST_PROPS
+
+# props that depend on a status field
+VOLUME_PROPS: Final[Props] = frozenset({Property.Volume})
+PLAYSTATE_PROPS: Final[Props] = frozenset({Property.CanPlay, Property.PlaybackStatus})
+RATE_PROPS: Final[Props] = frozenset({Property.Rate})
+ART_PROPS: Final[Props] = frozenset({Property.Metadata})
+TRACK_PROPS: Final[Props] = frozenset({Property.HasTrackList, Property.Metadata, Property.Tracks})
+NEXT_PROPS: Final[Props] = frozenset({Property.CanGoNext})
+PREV_PROPS: Final[Props] = frozenset({Property.CanGoPrevious})
+PAUSE_PROPS: Final[Props] = frozenset({Property.CanPause})
+SEEK_PROPS: Final[Props] = frozenset({Property.CanSeek})
+
+CAST_STATUS_ROUTES: Final[Routes] = {
+  'volume_level': VOLUME_PROPS,
+  'volume_muted': VOLUME_PROPS,
+  'app_id': TRACK_PROPS,
+  'display_name': TRACK_PROPS,
+  'icon_url': ART_PROPS,
+}
+
+MEDIA_STATUS_ROUTES: Final[Routes] = {
+  'volume_level': VOLUME_PROPS,
+  'volume_muted': VOLUME_PROPS,
+  'player_state': PLAYSTATE_PROPS,
+  'playback_rate': RATE_PROPS,
+  'duration': ART_PROPS,
+  'images': ART_PROPS,
+  'content_id': TRACK_PROPS,
+  'title': TRACK_PROPS,
+  'series_title': TRACK_PROPS,
+  'artist': TRACK_PROPS,
+  'album_name': TRACK_PROPS,
+  'media_metadata': TRACK_PROPS,
+  'track': TRACK_PROPS,
+  'supports_queue_next': NEXT_PROPS,
+  'supports_queue_prev': PREV_PROPS,
+  'supports_pause': PAUSE_PROPS,
+  'supports_seek': SEEK_PROPS,
+}
+
+# statuses without routes cause a full refresh
+ROUTES: Final[dict[type[Status], Routes]] = {
+  CastStatus: CAST_STATUS_ROUTES,
+  MediaStatus: MEDIA_STATUS_ROUTES,
+}
+
+
+class Dispatcher:
+  """
+    Hand statuses from pychromecast's socket thread to the GLib main loop.
+
+    Statuses are collected for `wait` seconds and handled in one batch, urgent
+    statuses are handled as soon as the main loop is idle.
+  """
+
+  handler: Handler
+  wait: Seconds | None
+
+  _pending: deque[Status | None]
+  _idle: int | None
+  _timeout: int | None
+  _lock: Lock
+
+  def __init__(
+    self,
+    handler: Handler,
+    wait: Seconds | None = DEFAULT_COALESCE_WAIT,
+    size: int = MAX_PENDING,
+  ):
+    self.handler = handler
+    self.wait = wait
+
+    self._pending = deque(maxlen=size)  # drops the oldest status when full
+    self._idle = None
+    self._timeout = None
+    self._lock = Lock()
+
+  def _supersede(self, status: Status | None = None):
+    # pychromecast updates statuses in place, so a new status makes older ones of its type redundant
+    kind = type(status)
+    superseded = [pending for pending in self._pending if type(pending) is kind]
+
+    for pending in superseded:
+      self._pending.remove(pending)
+
+  def _take(self) -> list[Status | None]:
+    statuses = list(self._pending)
+    self._pending.clear()
+
+    return statuses
+
+  def _on_idle(self) -> bool:
+    with self._lock:
+      self._idle = None
+      statuses = self._take()
+
+    self._handle(statuses)
+    return GLib.SOURCE_REMOVE
+
+  def _on_timeout(self) -> bool:
+    with self._lock:
+      self._timeout = None
+      statuses = self._take()
+
+    self._handle(statuses)
+    return GLib.SOURCE_REMOVE
+
+  def _handle(self, statuses: list[Status | None]):
+    if not statuses:
+      return
+
+    try:
+      self.handler(statuses)
+
+    except Exception as e:
+      log.exception(e)
+      log.error("Couldn't handle statuses.")
+
+  def dispatch(self, status: Status | None = None, urgent: bool = False):
+    """Called from pychromecast's socket thread, never blocks on handling statuses"""
+    with self._lock:
+      self._supersede(status)
+      self._pending.append(status)
+
+      if urgent or not self.wait:
+        if self._idle is None:
+          self._idle = GLib.idle_add(self._on_idle)
+
+      elif self._idle is None and self._timeout is None:
+        interval = round(self.wait * MS_IN_SEC)
+        self._timeout = GLib.timeout_add(interval, self._on_timeout)
+
+  def flush(self):
+    with self._lock:
+      statuses = self._take()
+
+    self._handle(statuses)
+
+  def cancel(self):
+    with self._lock:
+      for source in self._idle, self._timeout:
+        if source is not None:
+          GLib.source_remove(source)
 
-# status with volume attributes
-VolumeStatus = MediaStatus | CastStatus
+      self._idle = self._timeout = None
+      self._pending.clear()
 
 
 class BaseEventListener(
@@ -62,6 +226,8 @@ class BaseEventAdapter(EventAdapter):
   name: str
   adapter: DeviceAdapter | None
 
+  _emitted: Emitted
+
   @override
   def __init__(self, server: Server, device: Device):
     self.server = server
@@ -70,6 +236,8 @@ class BaseEventAdapter(EventAdapter):
     self.name = self.device.name
     self.adapter = self.server.adapter
 
+    self._emitted = {}
+
     super().__init__(
       root=self.server.root,
       player=self.server.player,
@@ -87,54 +255,174 @@ class BaseEventAdapter(EventAdapter):
   def set_and_register(self):
     self.server.set_event_adapter(self)
 
+  @override
+  def emit_changes[I: MprisInterface](self, interface: I, changes: Changes):
+    """Only emit properties whose values differ from the last values emitted"""
+    emitted = self._emitted.setdefault(interface.INTERFACE, {})
+    values: PropertyValues = get_changed_properties(interface, changes)
+
+    changed: PropertyValues = {
+      prop: value
+      for prop, value in values.items()
+      if prop not in emitted or emitted[prop] != value
+    }
+
+    if not changed:
+      return
+
+    emitted.update(changed)
+    emit_properties_changed(interface, changed)
+
 
 class EventListener(BaseEventAdapter, BaseEventListener):
-  def _update_volume(self, status: Status | None = None):
-    if isinstance(status, VolumeStatus):
-      self.on_volume()
+  dispatcher: Dispatcher
+  observers: list[Observer]
+
+  _player_state: str | None
+  _fields: dict[type[Status], Fields]
+
+  @override
+  def __init__(self, server: Server, device: Device, wait: Seconds | None = DEFAULT_COALESCE_WAIT):
+    self.dispatcher = Dispatcher(self._handle_statuses, wait)
+    self.observers = []
+    self._player_state = None
+    self._fields = {}
+
+    super().__init__(server, device)
+
+  @override
+  @classmethod
+  def register(
+    cls: type[Self],
+    server: Server,
+    device: Device,
+    wait: Seconds | None = DEFAULT_COALESCE_WAIT,
+  ) -> Self:
+    events = cls(server, device, wait)
+    events.set_and_register()
+
+    return events
+
+  def _is_urgent(self, status: Status | None = None) -> bool:
+    if status is None or isinstance(status, UrgentStatus):
+      return True
+
+    if not isinstance(status, MediaStatus):
+      return False
+
+    # play, pause and stop transitions
+    player_state, self._player_state = self._player_state, status.player_state
 
-  def _update_metadata(self, status: Status | None = None):
-    self._update_volume(status)
+    return player_state != status.player_state
 
+  def _get_changes(self, status: Status | None = None) -> Props:
+    """Route changed status fields to the props that depend on them"""
+    kind = type(status)
+
+    if not (routes := ROUTES.get(kind)):
+      return ALL_PROPS
+
+    # pychromecast updates statuses in place, so keep copies of their fields
+    fields: Fields = {field: getattr(status, field) for field in routes}
+    previous: Fields | None = self._fields.get(kind)
+    self._fields[kind] = fields
+
+    if previous is None:
+      return ALL_PROPS
+
+    changes: set[Property] = set()
+
+    for field, props in routes.items():
+      if fields[field] != previous[field]:
+        changes |= props
+
+    return frozenset(changes)
+
+  def _handle_statuses(self, statuses: list[Status | None]):
+    changes: set[Property] = set()
+
+    for status in statuses:
+      changes |= self._get_changes(status)
+
+    log.debug(f'Handling {len(statuses)} coalesced statuses, {len(changes)} changed props.')
+    self._update_metadata(frozenset(changes))
+
+  def _dispatch(self, status: Status | None = None):
+    urgent = self._is_urgent(status)
+    self.dispatcher.dispatch(status, urgent)
+
+  def _update_metadata(self, changes: Props = ALL_PROPS):
     # wire up local integration with mpris
     self.adapter.on_new_status()
 
-    # wire up mpris_server with cc events
-    self.on_root_all()
-    self.on_player_all()
-    self.on_tracklist_all()
-    # self.on_playlists_all()
-    # self.emit_all()
+    # position isn't emitted as it changes, clients extrapolate it until they see a seek
+    if (seeked := self.adapter.get_seeked()) is not None:
+      self.on_seek(seeked)
+
+    # wire up mpris_server with cc events, only changed props are emitted
+    if root := changes & ROOT_PROPS:
+      self.emit_root_changes(root)
+
+    if player := changes & PLAYER_PROPS:
+      self.emit_player_changes(player)
+
+    if tracklist := changes & TRACKLIST_PROPS:
+      self.emit_tracklist_changes(tracklist)
+
+    if changes or seeked is not None:
+      self._notify(changes)
+
+  def refresh(self):
+    """Emit every prop that changed for reasons the device doesn't know about"""
+    self._dispatch()
+
+  def _notify(self, changes: Props):
+    for observer in self.observers:
+      try:
+        observer(changes)
+
+      except Exception as e:
+        log.exception(e)
+        log.error(f'Error notifying {observer}.')
 
   @override
   def set_and_register(self):
     super().set_and_register()
     register_event_listener(self, self.device)
 
+  def unregister(self):
+    """Stop handling statuses and detach from the device and server"""
+    self.dispatcher.cancel()
+    unregister_event_listener(self, self.device)
+    self.server.set_event_adapter(None)
+
+    if adapter := self.adapter:
+      adapter.wrapper.controllers.unload_all()
+
   @override
   def load_media_failed(self, item: int, error_code: int):
     log.error(f'Load media failed: {error_code=}, {item=}')
-    self._update_metadata()
+    self._dispatch()
 
   @override
   def new_cast_status(self, status: CastStatus):
     log.debug(f'Handling new cast status: {status}')
-    self._update_metadata(status)
+    self._dispatch(status)
 
   @override
   def new_connection_status(self, status: ConnectionStatus):
     log.info(f'Handling new connection status: {status}')
-    self._update_metadata(status)
+    self._dispatch(status)
 
   @override
   def new_launch_error(self, status: LaunchFailure):
     log.error(f'Handling new launch error: {status}')
-    self._update_metadata(status)
+    self._dispatch(status)
 
   @override
   def new_media_status(self, status: MediaStatus):
     log.debug(f'Handling new media status: {status}')
-    self._update_metadata(status)
+    self._dispatch(status)
 
 
 def register_event_listener[E: BaseEventListener](events: E, device: Device):
@@ -142,3 +430,18 @@ def register_event_listener[E: BaseEventListener](events: E, device: Device):
   device.register_launch_error_listener(events)
   device.register_status_listener(events)
   device.media_controller.register_status_listener(events)
+
+
+def unregister_event_listener[E: BaseEventListener](events: E, device: Device):
+  # PyChromecast can't unregister listeners, so remove them from its lists
+  socket_client = device.socket_client
+  listeners = (
+    socket_client._connection_listeners,
+    socket_client.receiver_controller._launch_error_listeners,
+    socket_client.receiver_controller._status_listeners,
+    device.media_controller._status_listeners,
+  )
+
+  for registered in listeners:
+    while events in registered:
+      registered.remove(events)
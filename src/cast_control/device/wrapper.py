@@ -1,8 +1,8 @@
 from __future__ import annotations
 
 import logging
-from decimal import Decimal
 from mimetypes import guess_type
+from time import monotonic_ns
 from typing import Final, override
 
 from mpris_server import (
@@ -13,25 +13,34 @@ from pychromecast.controllers.media import MediaController, MediaImage, MediaSta
 from pychromecast.controllers.receiver import CastStatus
 from pychromecast.socket_client import ConnectionStatus
 
-from .base import CachedIcon, Controllers, Titles, TitlesBuilder, YoutubeUrl
+from .base import Abilities, CacheInfo, CachedIcon, Controllers, PositionClock, RESOLVERS, Resolved, Snapshot, Titles, \
+  TitlesBuilder, TitlesKey, YoutubeUrl, to_microseconds, to_seconds
 from .. import TITLE
-from ..app.state import create_desktop_file, ensure_user_dirs_exist
+from ..app.state import setup_user_state
 from ..base import DEFAULT_DISC_NO, DEFAULT_THUMB, Device, \
-  LIGHT_THUMB, NO_DELTA, NO_DESKTOP_FILE, \
-  NO_DURATION, Seconds, US_IN_SEC, singleton
+  LIGHT_THUMB, NO_DELTA, \
+  NO_DURATION, US_IN_SEC
 from ..protocols import CliIntegration, ListenerIntegration, ModuleIntegration, Wrapper
 
 
 log: Final[logging.Logger] = logging.getLogger(__name__)
 
 
-RESOLUTION: Final[int] = 1
+RESOLUTION: Final[int] = 1  # decimal places of a second
+MIN_TIME: Final[Microseconds] = US_IN_SEC // 10 ** RESOLUTION // 2
+SEEK_TOLERANCE: Final[Microseconds] = US_IN_SEC  # drift allowed before a position counts as a seek
 MAX_TITLES: Final[int] = 3
 
 NO_ARTIST: Final[str] = ''
 NO_SUFFIX: Final[str] = ''
 
 PREFIX_NOT_YOUTUBE: Final[str] = 'http'
+YOUTUBE_CONTROLLER: Final[str] = 'youtube'
+
+QUICK_PLAY_TIMEOUT: Final[float] = 30.0
+
+LIGHT_THUMB_PATH: Final[str] = str(LIGHT_THUMB)
+DEFAULT_THUMB_PATH: Final[str] = str(DEFAULT_THUMB)
 
 
 class StatusMixin(Wrapper):
@@ -56,7 +65,54 @@ class StatusMixin(Wrapper):
     return self.device.media_controller
 
 
-class ControllersMixin(Wrapper):
+class SnapshotMixin(Wrapper, ListenerIntegration):
+  _snapshot: Snapshot | None
+
+  @override
+  def __init__(self):
+    self._snapshot = None
+    super().__init__()
+
+  @override
+  def on_new_status(self, *args, **kwargs):
+    # let other mixins invalidate their state before building from it
+    super().on_new_status(*args, **kwargs)
+
+    # swap in a new snapshot, getters never see a partial one
+    self._snapshot = self._new_snapshot()
+
+  @override
+  @property
+  def snapshot(self) -> Snapshot:
+    if (snapshot := self._snapshot) is None:
+      snapshot = self._snapshot = self._new_snapshot()
+
+    return snapshot
+
+  def _new_snapshot(self) -> Snapshot:
+    titles: Titles = self.titles
+    track: int | None = None
+    stream_title: str | None = titles.title
+
+    if status := self.media_status:
+      track = status.track
+      stream_title = status.title
+
+    return Snapshot(
+      titles=titles,
+      art_url=self._get_icon_from_device(titles),
+      duration=self._get_status_duration(),
+      playstate=self._get_playstate(),
+      abilities=self._get_abilities(),
+      volume=self._get_volume(),
+      is_mute=self._is_mute(),
+      url=self._get_url(),
+      track=track,
+      stream_title=stream_title,
+    )
+
+
+class ControllersMixin(Wrapper, ListenerIntegration):
   controllers: Controllers
 
   @override
@@ -65,35 +121,53 @@ class ControllersMixin(Wrapper):
     super().__init__()
 
   def _setup_controllers(self):
-    self.controllers = Controllers.new(self.device)
-    self.controllers.register(self.device)
+    # app controllers are registered lazily, when their app runs or a URI needs them
+    self.controllers = Controllers(self.device)
+    self.controllers.load_for_cast_type()
+
+  @override
+  def on_new_status(self, *args, **kwargs):
+    app_id = status.app_id if (status := self.cast_status) else None
+    self.controllers.on_app(app_id)
+
+    super().on_new_status(*args, **kwargs)
 
   def _launch_youtube(self):
-    if not (youtube := self.controllers.youtube):
+    if not (youtube := self.controllers.load(YOUTUBE_CONTROLLER)):
       return
 
     youtube.launch()
 
   def _play_youtube(self, video_id: str):
-    if not (youtube := self.controllers.youtube):
+    if not (youtube := self.controllers.load(YOUTUBE_CONTROLLER)):
       return
 
     if not youtube.is_active:
       self._launch_youtube()
 
-    youtube.quick_play(media_id=video_id, timeout=30)
+    youtube.quick_play(media_id=video_id, timeout=QUICK_PLAY_TIMEOUT)
+
+  def _play_resolved(self, resolved: Resolved) -> bool:
+    if resolved.controller == YOUTUBE_CONTROLLER:
+      self._play_youtube(resolved.content_id)
+      return YOUTUBE_CONTROLLER in self.controllers
+
+    if not (controller := self.controllers.load(resolved.controller)):
+      return False
+
+    controller.quick_play(media_id=resolved.content_id, timeout=QUICK_PLAY_TIMEOUT)
+    return True
 
   @property
   def is_youtube(self) -> bool:
-    if youtube := self.controllers.youtube:
+    if youtube := self.controllers.get(YOUTUBE_CONTROLLER):
       return youtube.is_active
 
     return False
 
   @override
   def open_uri(self, uri: str):
-    if content_id := YoutubeUrl.get_content_id(uri):
-      self._play_youtube(content_id)
+    if (resolved := RESOLVERS.resolve(uri)) and self._play_resolved(resolved):
       return
 
     mimetype, _ = guess_type(uri)
@@ -101,24 +175,77 @@ class ControllersMixin(Wrapper):
 
   @override
   def add_track(self, uri: str, after_track: DbusObj, set_as_current: bool):
-    if not (youtube := self.controllers.youtube):
+    resolved = RESOLVERS.resolve(uri)
+
+    # only YouTube has a queue we can add to
+    if not resolved or resolved.controller != YOUTUBE_CONTROLLER:
+      if set_as_current:
+        self.open_uri(uri)
+
+      return
+
+    if not (youtube := self.controllers.load(YOUTUBE_CONTROLLER)):
       self.open_uri(uri)
       return
 
-    if content_id := YoutubeUrl.get_content_id(uri):
-      youtube.add_to_queue(content_id)
+    content_id = resolved.content_id
+    youtube.add_to_queue(content_id)
 
-    if content_id and set_as_current:
+    if set_as_current:
       youtube.play_video(content_id)
 
-    elif set_as_current:
-      self.open_uri(uri)
 
+class TitlesMixin(Wrapper, ListenerIntegration):
+  _titles: Titles | None
+  _titles_key: TitlesKey | None
+  _titles_hits: int
+  _titles_misses: int
+
+  @override
+  def __init__(self):
+    self._titles = None
+    self._titles_key = None
+    self._titles_hits = 0
+    self._titles_misses = 0
+
+    super().__init__()
+
+  def _get_titles_key(self) -> TitlesKey:
+    # statuses are updated in place, so compare their fields, not their identities
+    app_name = self.device.app_display_name
+
+    if not (status := self.media_status):
+      return TitlesKey(app_name=app_name, is_youtube=self.is_youtube)
+
+    return TitlesKey(
+      status.title,
+      self.get_subtitle(),
+      status.series_title,
+      status.artist,
+      status.album_name,
+      app_name,
+      self.is_youtube,
+    )
 
-class TitlesMixin(Wrapper):
   @override
   @property
   def titles(self) -> Titles:
+    key = self._get_titles_key()
+
+    if self._titles is not None and key == self._titles_key:
+      self._titles_hits += 1
+      return self._titles
+
+    self._titles_misses += 1
+    self._titles = self._build_titles()
+    self._titles_key = key
+
+    return self._titles
+
+  def titles_cache_info(self) -> CacheInfo:
+    return CacheInfo(self._titles_hits, self._titles_misses)
+
+  def _build_titles(self) -> Titles:
     titles: TitlesBuilder = TitlesBuilder()
 
     if title := self.media_status.title:
@@ -166,39 +293,86 @@ class TitlesMixin(Wrapper):
 
 class TimeMixin(Wrapper, ListenerIntegration, ModuleIntegration):
   _longest_duration: Microseconds | None
+  _clock: PositionClock | None
+  _seeked: Microseconds | None
 
   @override
   def __init__(self):
     self._longest_duration = NO_DURATION
+    self._clock = None
+    self._seeked = None
+
     super().__init__()
 
   def _reset_longest_duration(self):
     if not self.has_current_time():
       self._longest_duration = None
 
+  def _new_clock(self, now: int) -> PositionClock:
+    if not (status := self.media_status):
+      return PositionClock(now)
+
+    position = to_microseconds(status.adjusted_current_time or status.current_time)
+
+    return PositionClock(
+      anchor=now,
+      position=position or BEGINNING,
+      rate=status.playback_rate or DEFAULT_RATE,
+      is_playing=status.player_is_playing,
+      content_id=status.content_id,
+    )
+
+  def _update_clock(self):
+    now = monotonic_ns()
+    previous: PositionClock | None = self._clock
+    self._clock = clock = self._new_clock(now)
+    self._seeked = None
+
+    if not previous or previous.content_id != clock.content_id:
+      return
+
+    expected: Microseconds = previous.get_position(now)
+
+    if abs(clock.position - expected) > SEEK_TOLERANCE:
+      self._seeked = clock.position
+
   @override
   def on_new_status(self, *args, **kwargs):
+    self._update_clock()
     self._reset_longest_duration()
     super().on_new_status(*args, **kwargs)
 
   @override
+  def get_seeked(self) -> Microseconds | None:
+    return self._seeked
+
   @property
-  def current_time(self) -> Seconds | None:
-    if not (status := self.media_status):
+  def clock(self) -> PositionClock:
+    if (clock := self._clock) is None:
+      clock = self._clock = self._new_clock(monotonic_ns())
+
+    return clock
+
+  @property
+  def current_time(self) -> Microseconds | None:
+    if not self.media_status:
       return None
 
-    if time := status.adjusted_current_time or status.current_time:
-      return Seconds(time)
+    if time := self.clock.get_position():
+      return time
+
+    return None
+
+  def _get_status_duration(self) -> Microseconds | None:
+    if status := self.media_status:
+      return to_microseconds(status.duration)
 
     return None
 
   @override
   def get_duration(self) -> Microseconds:
-    if (status := self.media_status) and (duration := status.duration) is not None:
-      duration = Seconds(duration)
-      duration_us = duration * US_IN_SEC
-
-      return round(duration_us)
+    if (duration := self.snapshot.duration) is not None:
+      return duration
 
     current: Microseconds = self.get_current_position()
     longest: Microseconds = self._longest_duration
@@ -214,30 +388,22 @@ class TimeMixin(Wrapper, ListenerIntegration, ModuleIntegration):
 
   @override
   def get_current_position(self) -> Microseconds:
-    position: Seconds | None = self.current_time
+    if position := self.current_time:
+      return position
 
-    if not position:
-      return BEGINNING
-
-    position_us = position * US_IN_SEC
-    return round(position_us)
+    return BEGINNING
 
   @override
   def has_current_time(self) -> bool:
-    current_time: Seconds | None = self.current_time
-
-    if current_time is None:
+    if (current_time := self.current_time) is None:
       return False
 
-    current_time = round(current_time, RESOLUTION)
-
-    return current_time > BEGINNING
+    # times that round to zero at RESOLUTION are the beginning
+    return current_time >= MIN_TIME
 
   @override
   def seek(self, time: Microseconds, *_):
-    microseconds = Decimal(time)
-    seconds: int = round(microseconds / US_IN_SEC)
-
+    seconds: int = to_seconds(time)
     self.media_controller.seek(seconds)
 
   @override
@@ -259,41 +425,41 @@ class IconsMixin(Wrapper, CliIntegration):
   cached_icon: CachedIcon | None
   light_icon: bool
 
-  def _set_cached_icon(self, url: str | None = None):
+  def _set_cached_icon(self, titles: Titles, url: str | None = None):
     if not url:
       self.cached_icon = None
       return
 
     app_id = self.device.app_id
-    title, *_ = self.titles
+    title, *_ = titles
     self.cached_icon = CachedIcon(url, app_id, title)
 
-  def _can_use_cache(self) -> bool:
+  def _can_use_cache(self, titles: Titles) -> bool:
     if not (icon := self.cached_icon) or not icon.url:
       return False
 
     app_id = self.device.app_id
-    title, *_ = self.titles
+    title, *_ = titles
 
     return icon.app_id == app_id and icon.title == title
 
-  def _get_icon_from_device(self) -> str | None:
+  def _get_icon_from_device(self, titles: Titles) -> str | None:
     url: str | None
 
     if (status := self.media_status) and (images := status.images):
       first: MediaImage
 
       first, *_ = images
-      url, *_ = first
-      self._set_cached_icon(url)
+      url = first.url
+      self._set_cached_icon(titles, url)
 
       return url
 
     if (status := self.cast_status) and (url := status.icon_url):
-      self._set_cached_icon(url)
+      self._set_cached_icon(titles, url)
       return url
 
-    if not self._can_use_cache():
+    if not self._can_use_cache(titles):
       return None
 
     if icon := self.cached_icon:
@@ -301,31 +467,20 @@ class IconsMixin(Wrapper, CliIntegration):
 
     return None
 
-  @ensure_user_dirs_exist
   def _get_default_icon(self) -> str:
-    if self.light_icon:
-      return str(LIGHT_THUMB)
-
-    return str(DEFAULT_THUMB)
+    return LIGHT_THUMB_PATH if self.light_icon else DEFAULT_THUMB_PATH
 
   @override
   def get_art_url(self, track: int | None = None) -> str:
-    if icon := self._get_icon_from_device():
+    if icon := self.snapshot.art_url:
       return icon
 
     return self._get_default_icon()
 
   @override
-  @singleton
   def get_desktop_entry(self) -> Paths:
-    try:
-      return create_desktop_file(self.light_icon)
-
-    except Exception as e:
-      log.exception(e)
-      log.error("Couldn't load desktop file.")
-
-      return NO_DESKTOP_FILE
+    # desktop files are written once, at startup
+    return setup_user_state().get(self.light_icon)
 
   @override
   def set_icon(self, lighter: bool = False):
@@ -345,7 +500,7 @@ class MetadataMixin(Wrapper):
     return content_id
 
   def _is_youtube_video(self, content_id: str | None) -> bool:
-    if not (youtube := self.controllers.youtube):
+    if not (youtube := self.controllers.get(YOUTUBE_CONTROLLER)):
       return False
 
     if not content_id or not youtube.is_active:
@@ -355,15 +510,12 @@ class MetadataMixin(Wrapper):
 
   @override
   def metadata(self) -> ValidMetadata:
-    title, artist, album, comments = self.titles
+    snapshot: Snapshot = self.snapshot
+    title, artist, album, comments = snapshot.titles
 
     dbus_name: DbusObj = get_track_id(title)
     artists: list[str] = [artist] if artist else []
     comments: list[str] = [comments] if comments else []
-    track_no: int | None = None
-
-    if status := self.media_status:
-      track_no = status.track
 
     return MetadataObj(
       album=album,
@@ -375,29 +527,23 @@ class MetadataMixin(Wrapper):
       length=self.get_duration(),
       title=title,
       track_id=dbus_name,
-      track_number=track_no,
-      url=self._get_url(),
+      track_number=snapshot.track,
+      url=snapshot.url,
     )
 
   @override
   def get_stream_title(self) -> str:
-    if status := self.media_status:
-      return status.title
-
-    return self.titles.title
+    return self.snapshot.stream_title
 
   @override
   def get_current_track(self) -> Track:
-    title, artist, album, comments = self.titles
+    snapshot: Snapshot = self.snapshot
+    title, artist, album, comments = snapshot.titles
 
     dbus_name: DbusObj = get_track_id(title)
     artists: list[Artist] = [Artist(artist)] if artist else []
-    track_no: int | None = None
     art_url = self.get_art_url()
 
-    if status := self.media_status:
-      track_no = status.track
-
     return Track(
       album=Album(art_url, artists, album),
       art_url=art_url,
@@ -407,21 +553,27 @@ class MetadataMixin(Wrapper):
       length=self.get_duration(),
       name=title,
       track_id=dbus_name,
-      track_number=track_no,
+      track_number=snapshot.track,
     )
 
 
 class PlaybackMixin(Wrapper):
-  @override
-  def get_playstate(self) -> PlayState:
-    if self.media_status.player_is_playing:
+  def _get_playstate(self) -> PlayState:
+    if not (status := self.media_status):
+      return PlayState.STOPPED
+
+    if status.player_is_playing:
       return PlayState.PLAYING
 
-    elif self.media_status.player_is_paused:
+    elif status.player_is_paused:
       return PlayState.PAUSED
 
     return PlayState.STOPPED
 
+  @override
+  def get_playstate(self) -> PlayState:
+    return self.snapshot.playstate
+
   @override
   def is_repeating(self) -> bool:
     return False
@@ -476,13 +628,22 @@ class PlaybackMixin(Wrapper):
 
 
 class VolumeMixin(Wrapper):
-  @override
-  def get_volume(self) -> Volume | None:
+  def _get_volume(self) -> Volume | None:
     if status := self.cast_status:
       return Volume(status.volume_level)
 
     return None
 
+  def _is_mute(self) -> bool:
+    if status := self.cast_status or self.media_status:
+      return status.volume_muted
+
+    return False
+
+  @override
+  def get_volume(self) -> Volume | None:
+    return self.snapshot.volume
+
   @override
   def set_volume(self, value: Volume):
     if (current := self.get_volume()) is None:
@@ -500,10 +661,7 @@ class VolumeMixin(Wrapper):
 
   @override
   def is_mute(self) -> bool | None:
-    if status := self.cast_status or self.media_status:
-      return status.volume_muted
-
-    return False
+    return self.snapshot.is_mute
 
   @override
   def set_mute(self, value: bool):
@@ -532,33 +690,32 @@ class AbilitiesMixin(Wrapper):
   def can_edit_tracks(self) -> bool:
     return False
 
+  def _get_abilities(self) -> Abilities:
+    if not (status := self.media_status):
+      return Abilities()
+
+    return Abilities(
+      can_pause=status.supports_pause,
+      can_play_next=status.supports_queue_next,
+      can_play_prev=status.supports_queue_prev,
+      can_seek=status.supports_seek,
+    )
+
   @override
   def can_play_next(self) -> bool:
-    if status := self.media_status:
-      return status.supports_queue_next
-
-    return False
+    return self.snapshot.abilities.can_play_next
 
   @override
   def can_play_prev(self) -> bool:
-    if status := self.media_status:
-      return status.supports_queue_prev
-
-    return False
+    return self.snapshot.abilities.can_play_prev
 
   @override
   def can_pause(self) -> bool:
-    if status := self.media_status:
-      return status.supports_pause
-
-    return False
+    return self.snapshot.abilities.can_pause
 
   @override
   def can_seek(self) -> bool:
-    if status := self.media_status:
-      return status.supports_seek
-
-    return False
+    return self.snapshot.abilities.can_seek
 
 
 class TracklistMixin(Wrapper):
@@ -568,7 +725,7 @@ class TracklistMixin(Wrapper):
 
   @override
   def get_tracks(self) -> list[DbusObj]:
-    title, *_ = self.titles
+    title, *_ = self.snapshot.titles
 
     if title:
       return [get_track_id(title)]
@@ -582,6 +739,7 @@ class DeviceWrapper(
   IconsMixin,
   MetadataMixin,
   PlaybackMixin,
+  SnapshotMixin,
   StatusMixin,
   TimeMixin,
   TitlesMixin,
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from tempfile import gettempdir
+from typing import Final
+
+from appdirs import AppDirs
+
+from . import NAME, __author__, __version__
+
+
+# kept light, importing only appdirs, so CLI commands that just need
+# these paths start quickly
+
+ARGS_STEM: Final[str] = '-args'
+
+DIRS: Final[AppDirs] = AppDirs(NAME, __author__, __version__)
+DATA_DIR: Final[Path] = Path(DIRS.user_data_dir)
+LOG_DIR: Final[Path] = Path(DIRS.user_log_dir)
+STATE_DIR: Final[Path] = Path(DIRS.user_state_dir)
+
+# per-user and short, for sockets, falls back to STATE_DIR where it isn't set
+RUNTIME_DIR: Final[Path | None] = Path(runtime) / NAME if (runtime := os.environ.get('XDG_RUNTIME_DIR')) else None
+TMP_DIR: Final[Path] = Path(gettempdir()) / f'{NAME}-{os.getuid()}'  # for sockets when both are too long
+
+USER_DIRS: Final[tuple[Path, ...]] = DATA_DIR, LOG_DIR, STATE_DIR
+
+PID: Final[Path] = STATE_DIR / f'{NAME}.pid'
+ARGS: Final[Path] = STATE_DIR / f'service{ARGS_STEM}.json'
+LOG: Final[Path] = LOG_DIR / f'{NAME}.log'
+DEVICES: Final[Path] = STATE_DIR / 'devices.json'
@@ -9,7 +9,7 @@ from pychromecast.controllers.receiver import CastStatus
 from pychromecast.socket_client import ConnectionStatus
 
 from .base import DEFAULT_ICON, Device, NAME
-from .device.base import CachedIcon, Controllers, Titles
+from .device.base import CachedIcon, Controllers, Snapshot, Titles
 
 
 @runtime_checkable
@@ -22,6 +22,9 @@ class ListenerIntegration(Protocol):
   def on_new_status(self, *args, **kwargs):
     """Callback for event listener"""
 
+  def get_seeked(self) -> Microseconds | None:
+    """Position after a discontinuity in the last status, if there was one"""
+
 
 @runtime_checkable
 class ModuleIntegration(Protocol):
@@ -58,6 +61,9 @@ class Properties(Protocol):
   @property
   def is_youtube(self) -> bool: ...
 
+  @property
+  def snapshot(self) -> Snapshot: ...
+
   @property
   def titles(self) -> Titles: ...
 
@@ -259,6 +265,10 @@ class DeviceIntegration[W: Wrapper](CliIntegration, ListenerIntegration, ModuleI
   def get_duration(self) -> Microseconds:
     return self.wrapper.get_duration()
 
+  @override
+  def get_seeked(self) -> Microseconds | None:
+    return self.wrapper.get_seeked()
+
   @override
   def on_new_status(self, *args, **kwargs):
     self.wrapper.on_new_status(*args, **kwargs)
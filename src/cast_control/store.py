@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Callable, Mapping
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from types import NoneType
+from typing import Any, Final
+
+
+# only import the standard library here, so reading saved state doesn't
+# pull in the device or D-Bus modules, and survives upgrades that move them
+
+VERSION: Final[int] = 1
+NO_VERSION: Final[int] = 0  # files written before they were versioned
+KIND_KEY: Final[str] = 'kind'
+VERSION_KEY: Final[str] = 'version'
+DATA_KEY: Final[str] = 'data'
+TMP_SUFFIX: Final[str] = '.tmp'
+INDENT: Final[int] = 2
+
+OPTIONAL_STR: Final[tuple[type, ...]] = (str, NoneType)
+NUMBER: Final[tuple[type, ...]] = (int, float)
+OPTIONAL_NUMBER: Final[tuple[type, ...]] = (*NUMBER, NoneType)
+
+type Data = dict[str, Any]
+type Schema = Mapping[str, tuple[type, ...]]
+type Migration = Callable[[Any], Any]
+type Migrations = Mapping[int, Migration]
+
+
+class StoreError(ValueError):
+  pass
+
+
+def get_names(types: tuple[type, ...]) -> str:
+  return ' or '.join('null' if kind is NoneType else kind.__name__ for kind in types)
+
+
+def check(data: Any, schema: Schema) -> Data:
+  """Keep the fields in `schema`, and make sure their values have the right types"""
+  if not isinstance(data, dict):
+    raise StoreError(f'Expected an object, got {type(data).__name__}.')
+
+  checked: Data = {}
+
+  for key, types in schema.items():
+    if key not in data:
+      continue  # the reader's default applies
+
+    value = data[key]
+
+    # bools are ints, but a bool where a number belongs is a mistake
+    if isinstance(value, bool) and bool not in types:
+      raise StoreError(f'{key} should be {get_names(types)}, got bool.')
+
+    if not isinstance(value, types):
+      raise StoreError(f'{key} should be {get_names(types)}, got {type(value).__name__}.')
+
+    checked[key] = value
+
+  return checked
+
+
+def dumps(kind: str, data: Any) -> str:
+  doc = {KIND_KEY: kind, VERSION_KEY: VERSION, DATA_KEY: data}
+  return json.dumps(doc, indent=INDENT)
+
+
+def loads(text: str | bytes, kind: str, migrations: Migrations | None = None) -> Any:
+  """
+    Read a document written by `dumps()`, upgrading older versions via `migrations`.
+
+    A document without a version is the bare data from before versioning.
+  """
+  try:
+    doc = json.loads(text)
+
+  except ValueError as e:
+    raise StoreError(f"Can't parse the {kind} file: {e}") from e
+
+  if not isinstance(doc, dict) or VERSION_KEY not in doc:
+    version, data = NO_VERSION, doc
+
+  elif doc.get(KIND_KEY) != kind:
+    raise StoreError(f'Expected a {kind} file, got {doc.get(KIND_KEY)}.')
+
+  else:
+    version, data = doc[VERSION_KEY], doc.get(DATA_KEY)
+
+  if not isinstance(version, int) or version > VERSION:
+    raise StoreError(f'Unsupported {kind} version {version}, this is version {VERSION}.')
+
+  migrations = migrations or {}
+
+  while version < VERSION:
+    if not (migrate := migrations.get(version)):
+      raise StoreError(f"Can't upgrade {kind} from version {version}.")
+
+    data = migrate(data)
+    version += 1
+
+  return data
+
+
+def read(path: Path, kind: str, migrations: Migrations | None = None) -> Any | None:
+  if not path.exists():
+    return None
+
+  return loads(path.read_bytes(), kind, migrations)
+
+
+def write(path: Path, kind: str, data: Any) -> Path:
+  path.parent.mkdir(parents=True, exist_ok=True)
+
+  # write and rename so readers never see a partial file, and give each
+  # writer its own temporary file so concurrent writes can't mix
+  with NamedTemporaryFile(
+    'w', dir=path.parent, prefix=f'{path.name}.', suffix=TMP_SUFFIX, delete=False,
+  ) as file:
+    tmp = Path(file.name)
+
+  try:
+    tmp.write_text(dumps(kind, data))
+    tmp.replace(path)
+
+  except BaseException:
+    tmp.unlink(missing_ok=True)
+    raise
+
+  return path
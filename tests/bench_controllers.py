@@ -0,0 +1,162 @@
+"""
+  Cost of app controllers, registered up front like before or lazily like now: setting
+  them up for a new device, and routing each message through pychromecast.
+
+  Run from the repo: PYTHONPATH=src python tests/bench_controllers.py
+"""
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from collections.abc import Callable
+from timeit import Timer
+from typing import Final
+from uuid import uuid4
+
+from pychromecast.controllers.heartbeat import HeartbeatController
+from pychromecast.controllers.media import MediaController
+from pychromecast.controllers.receiver import ReceiverController
+from pychromecast.generated.cast_channel_pb2 import CastMessage
+from pychromecast.socket_client import SocketClient
+
+from cast_control.device.base import Controllers, FACTORIES
+
+
+REPEAT: Final[int] = 5
+NS_IN_SEC: Final[int] = 1_000_000_000
+NS_IN_US: Final[int] = 1_000
+
+# what devices send most, and what they're sent on
+MESSAGES: Final[dict[str, tuple[str, dict]]] = {
+  'heartbeat': ('urn:x-cast:com.google.cast.tp.heartbeat', {'type': 'PONG'}),
+  'media': ('urn:x-cast:com.google.cast.media', {'type': 'UNKNOWN'}),
+  'receiver': ('urn:x-cast:com.google.cast.receiver', {'type': 'UNKNOWN'}),
+}
+
+
+class Client:
+  """Just enough of SocketClient to register controllers and route messages to them"""
+
+  register_handler = SocketClient.register_handler
+  unregister_handler = SocketClient.unregister_handler
+  route = SocketClient._route_message
+
+  def __init__(self, cast_type: str):
+    self.logger = logging.getLogger(__name__)
+    self.fn = self.host = 'bench'
+    self.port = 8009
+    self.is_stopped = False
+    self.app_namespaces = []
+    self._handlers = defaultdict(set)
+    self._request_callbacks = {}
+
+    self.heartbeat_controller = HeartbeatController()
+    self.receiver_controller = ReceiverController(cast_type)
+    self.media_controller = MediaController()
+
+    for controller in self.heartbeat_controller, self.receiver_controller, self.media_controller:
+      self.register_handler(controller)
+
+  def send_app_message(self, *args, **kwargs):
+    pass
+
+  send_message = send_platform_message = send_app_message
+
+
+class Device:
+  def __init__(self, cast_type: str):
+    self.uuid = uuid4()
+    self.cast_type = cast_type
+    self.socket_client = Client(cast_type)
+
+  def register_handler(self, controller):
+    self.socket_client.register_handler(controller)
+
+  def unregister_handler(self, controller):
+    self.socket_client.unregister_handler(controller)
+
+  @property
+  def handlers(self) -> int:
+    return sum(len(handlers) for handlers in self.socket_client._handlers.values())
+
+
+def set_up_eager(device: Device) -> Controllers:
+  # what the old Controllers.new() and register() did
+  controllers = Controllers(device)
+
+  for name in FACTORIES:
+    controllers.load(name)
+
+  return controllers
+
+
+def set_up_lazy(device: Device) -> Controllers:
+  controllers = Controllers(device)
+  controllers.load_for_cast_type()
+
+  return controllers
+
+
+SETUPS: Final[dict[str, Callable[[Device], Controllers]]] = {
+  'eager': set_up_eager,
+  'lazy': set_up_lazy,
+}
+
+
+def get_message(namespace: str) -> CastMessage:
+  message = CastMessage()
+  message.namespace = namespace
+  message.source_id = 'receiver-0'
+  message.destination_id = 'sender-0'
+
+  return message
+
+
+def get_cost(func: Callable) -> float:
+  """Nanoseconds per call, best of REPEAT runs"""
+  timer = Timer(func)
+  number, _ = timer.autorange()
+  best = min(timer.repeat(REPEAT, number))
+
+  return best / number * NS_IN_SEC
+
+
+def main():
+  # imports are paid once a process, warm them so they don't count
+  for setup in SETUPS.values():
+    setup(Device('group'))
+
+  for cast_type in 'cast', 'group':
+    print(f'{cast_type} device')
+    print(f"{'':<14}{'eager':>10}{'lazy':>10}{'speedup':>10}")
+
+    devices = {name: Device(cast_type) for name in SETUPS}
+
+    for name, setup in SETUPS.items():
+      setup(devices[name])
+
+    handlers = {name: device.handlers for name, device in devices.items()}
+    print(f"{'handlers':<14}{handlers['eager']:>10}{handlers['lazy']:>10}")
+
+    # a new device with its socket client's own controllers, then ours
+    setup_us = {
+      name: get_cost(lambda setup=setup: setup(Device(cast_type))) / NS_IN_US
+      for name, setup in SETUPS.items()
+    }
+    eager, lazy = setup_us['eager'], setup_us['lazy']
+    print(f"{'startup':<14}{eager:>8.0f}us{lazy:>8.0f}us{eager / lazy:>9.1f}x")
+
+    for message, (namespace, data) in MESSAGES.items():
+      cast_message = get_message(namespace)
+      costs = {
+        name: get_cost(lambda client=device.socket_client: client.route(cast_message, data))
+        for name, device in devices.items()
+      }
+      eager, lazy = costs['eager'], costs['lazy']
+      print(f'{message:<14}{eager:>8.0f}ns{lazy:>8.0f}ns{eager / lazy:>9.1f}x')
+
+    print()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,76 @@
+"""
+  Per-call cost of TimeMixin's conversions, Decimal against integer microseconds.
+
+  Run from the repo: PYTHONPATH=src python tests/bench_time.py
+"""
+from __future__ import annotations
+
+from collections.abc import Callable
+from decimal import Decimal, ROUND_HALF_UP, localcontext
+from timeit import Timer
+from typing import Final
+
+from cast_control.base import US_IN_SEC
+from cast_control.device.base import to_microseconds, to_seconds
+from cast_control.device.wrapper import MIN_TIME, RESOLUTION
+
+
+OLD_PRECISION: Final[int] = 4
+REPEAT: Final[int] = 5
+NS_IN_SEC: Final[int] = 1_000_000_000
+SECONDS: Final[float] = 754.321  # a position pychromecast reports
+MICROSECONDS: Final[int] = 754_321_000
+
+
+def old_position() -> int:
+  return round(Decimal(SECONDS) * US_IN_SEC)
+
+
+def old_has_current_time() -> bool:
+  return round(Decimal(SECONDS), RESOLUTION) > 0
+
+
+def old_seek() -> int:
+  return round(Decimal(MICROSECONDS) / US_IN_SEC)
+
+
+def new_position() -> int:
+  return to_microseconds(SECONDS)
+
+
+def new_has_current_time() -> bool:
+  return to_microseconds(SECONDS) >= MIN_TIME
+
+
+def new_seek() -> int:
+  return to_seconds(MICROSECONDS)
+
+
+CASES: Final[dict[str, tuple[Callable, Callable]]] = {
+  'position': (old_position, new_position),
+  'has_current_time': (old_has_current_time, new_has_current_time),
+  'seek': (old_seek, new_seek),
+}
+
+
+def get_cost(func: Callable) -> float:
+  """Nanoseconds per call, best of REPEAT runs"""
+  timer = Timer(func)
+  number, _ = timer.autorange()
+  best = min(timer.repeat(REPEAT, number))
+
+  return best / number * NS_IN_SEC
+
+
+def main():
+  print(f"{'':<18}{'decimal':>10}{'integer':>10}{'speedup':>10}")
+
+  # the old code ran under this process-wide context
+  with localcontext(prec=OLD_PRECISION, rounding=ROUND_HALF_UP):
+    for name, (old, new) in CASES.items():
+      old_ns, new_ns = get_cost(old), get_cost(new)
+      print(f'{name:<18}{old_ns:>8.0f}ns{new_ns:>8.0f}ns{old_ns / new_ns:>9.1f}x')
+
+
+if __name__ == '__main__':
+  main()
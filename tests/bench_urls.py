@@ -0,0 +1,90 @@
+"""
+  Per-URL cost of classify() and RESOLVERS.resolve() over a corpus of media URLs like
+  the ones Cast devices report. Cold looks each URL up once on empty caches, warm looks
+  it up again for each status that repeats it, like position updates do.
+
+  Run from the repo: PYTHONPATH=src python tests/bench_urls.py
+"""
+from __future__ import annotations
+
+import random
+from collections.abc import Callable
+from string import ascii_letters, digits
+from timeit import Timer
+from typing import Final
+
+from cast_control.device.base import RESOLVERS, classify, match_route
+
+
+CORPUS_SIZE: Final[int] = 5_000
+REPEAT: Final[int] = 5
+SEED: Final[int] = 7
+STATUSES: Final[int] = 10  # statuses that report the same URL
+NS_IN_SEC: Final[int] = 1_000_000_000
+ID_CHARS: Final[str] = f'{ascii_letters}{digits}-_'
+
+TEMPLATES: Final[tuple[str, ...]] = (
+  'https://www.youtube.com/watch?v={id}',
+  'https://m.youtube.com/watch?v={id}&t={n}',
+  'https://youtube.com/watch?feature=share&v={id}',
+  'https://youtu.be/{id}?t={n}',
+  'https://www.youtube.com/playlist?list=PL{id}',
+  'https://www.bbc.co.uk/iplayer/episode/m{n:07}',
+  'https://www.bbc.co.uk/sounds/play/p{n:07}',
+  'https://www.supla.fi/audio/{n}',
+  'https://areena.yle.fi/podcastit/1-{n}',
+  'https://cdn.example.com/media/{id}/track{n}.mp3',
+  'http://192.168.1.20:8000/stream{n}.flac',
+)
+
+
+def get_corpus(size: int = CORPUS_SIZE) -> list[str]:
+  rand = random.Random(SEED)
+  corpus = []
+
+  for _ in range(size):
+    template = rand.choice(TEMPLATES)
+    content_id = ''.join(rand.choices(ID_CHARS, k=11))
+    corpus.append(template.format(id=content_id, n=rand.randrange(1, 10_000_000)))
+
+  return corpus
+
+
+def clear():
+  classify.cache_clear()
+  match_route.cache_clear()
+
+
+def run_all(func: Callable, corpus: list[str], statuses: int) -> Callable[[], None]:
+  def run():
+    for uri in corpus:
+      for _ in range(statuses):
+        func(uri)
+
+  return run
+
+
+def get_cost(func: Callable, corpus: list[str], *, cold: bool) -> float:
+  """Nanoseconds per lookup, best of REPEAT runs over the whole corpus"""
+  statuses = 1 if cold else STATUSES
+  timer = Timer(run_all(func, corpus, statuses), clear)
+  best = min(timer.repeat(REPEAT, number=1))
+
+  return best / (len(corpus) * statuses) * NS_IN_SEC
+
+
+def main():
+  corpus = get_corpus()
+  cases = {'classify': classify, 'resolve': RESOLVERS.resolve}
+
+  print(f'{len(corpus)} URLs, {len(set(corpus))} distinct')
+  print(f"{'':<12}{'cold':>10}{'warm':>10}{'speedup':>10}")
+
+  for name, func in cases.items():
+    cold_ns = get_cost(func, corpus, cold=True)
+    warm_ns = get_cost(func, corpus, cold=False)
+    print(f'{name:<12}{cold_ns:>8.0f}ns{warm_ns:>8.0f}ns{cold_ns / warm_ns:>9.1f}x')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import stat
+import threading
+from pathlib import Path
+from queue import Queue
+from tempfile import TemporaryDirectory
+from time import monotonic, sleep
+from types import SimpleNamespace
+from typing import Final
+
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('mpris_server')
+
+from cast_control.app import control as control_module
+from cast_control.app import instances
+from cast_control.app.control import ControlError, ControlServer
+from cast_control.app.instances import Instance, MAX_SOCKET_PATH
+
+
+TIMEOUT: Final[float] = 5.0
+SHORT_DIR: Final[str] = '/tmp'
+
+
+class Loop:
+  """Stands in for GLib's loop, running callbacks on its own thread"""
+
+  SOURCE_REMOVE: Final[bool] = False
+
+  def __init__(self):
+    self.calls: Queue = Queue()
+    self.thread = threading.Thread(target=self.run, daemon=True)
+    self.thread.start()
+
+  def idle_add(self, func, *args) -> int:
+    self.calls.put((func, args))
+    return 1
+
+  def run(self):
+    while (call := self.calls.get()) is not None:
+      func, args = call
+      func(*args)
+
+  def stop(self):
+    self.calls.put(None)
+
+
+class Wrapper:
+  def __init__(self):
+    self.threads: list[int] = []
+
+  def play(self):
+    self.threads.append(threading.get_ident())
+
+
+@pytest.fixture
+def loop(monkeypatch) -> Loop:
+  loop = Loop()
+  monkeypatch.setattr(control_module, 'GLib', loop)
+  monkeypatch.setattr(control_module, 'get_status', lambda name, server: dict(player=name))
+  monkeypatch.setattr(control_module, 'CLOSED_CHECK', 0.05)
+
+  yield loop
+  loop.stop()
+
+
+@pytest.fixture
+def service(loop: Loop):
+  wrapper = Wrapper()
+  player = SimpleNamespace(adapter=SimpleNamespace(wrapper=wrapper))
+
+  # short enough to bind wherever the tests run
+  with TemporaryDirectory(dir=SHORT_DIR) as directory:
+    control = ControlServer(Path(directory) / 'test.sock', lambda: {'player': player})
+    control.start()
+
+    yield control, wrapper
+    control.stop()
+
+
+def connect(control: ControlServer) -> socket.socket:
+  client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  client.settimeout(TIMEOUT)
+  client.connect(str(control.path))
+
+  return client
+
+
+def request(control: ControlServer, line: str) -> dict:
+  with connect(control) as client, client.makefile('rwb') as file:
+    file.write(f'{line}\n'.encode())
+    file.flush()
+
+    return json.loads(file.readline())
+
+
+def test_commands_run_on_loop(service, loop: Loop):
+  control, wrapper = service
+
+  assert request(control, 'play') == dict(ok=True, player='player')
+  assert wrapper.threads == [loop.thread.ident]
+
+
+def test_status_runs_on_loop(service, loop: Loop, monkeypatch):
+  control, _ = service
+  threads = []
+
+  def get_status(name, server) -> dict:
+    threads.append(threading.get_ident())
+    return dict(player=name)
+
+  monkeypatch.setattr(control_module, 'get_status', get_status)
+
+  assert request(control, 'status')['players'] == [dict(player='player')]
+  assert threads == [loop.thread.ident]
+
+
+def test_busy_loop_is_an_error(service, loop: Loop, monkeypatch):
+  control, _ = service
+  monkeypatch.setattr(control_module.call_in_loop, '__defaults__', (0.1,))
+  loop.idle_add(sleep, 0.5)
+
+  reply = request(control, 'play')
+  assert not reply['ok'] and "didn't answer" in reply['error']
+
+
+def test_subscriber_leaves_after_hang_up(service):
+  control, _ = service
+
+  with connect(control) as client, client.makefile('rwb') as file:
+    file.write(b'subscribe\n')
+    file.flush()
+    file.readline()
+
+    assert len(control._subscribers) == 1
+
+  deadline = monotonic() + TIMEOUT
+
+  while control._subscribers and monotonic() < deadline:
+    sleep(0.01)
+
+  assert not control._subscribers
+
+
+@pytest.mark.parametrize('name', ['service', 'a' * 20, '+'.join(['Living Room TV'] * 10)])
+def test_socket_path_fits(name: str, monkeypatch):
+  monkeypatch.setattr(instances, 'RUNTIME_DIR', Path('/run/user/1000/cast_control'))
+  path = Instance.new(name).socket
+
+  assert len(bytes(path)) <= MAX_SOCKET_PATH
+  assert path.suffix == '.sock'
+
+
+def test_socket_path_keeps_short_names(monkeypatch):
+  monkeypatch.setattr(instances, 'RUNTIME_DIR', Path('/run/user/1000/cast_control'))
+  assert Instance.new('kitchen').socket.name == 'cast_control-kitchen.sock'
+
+
+def test_long_state_dir_hashes(monkeypatch):
+  monkeypatch.setattr(instances, 'RUNTIME_DIR', None)
+  monkeypatch.setattr(instances, 'STATE_DIR', Path('/home') / ('u' * 40) / '.local/state/cast_control/0.16.1')
+  monkeypatch.setattr(instances, 'TMP_DIR', Path('/tmp/cast_control-1000'))
+
+  first, second = Instance.new('a' * 40).socket, Instance.new('b' * 40).socket
+
+  assert len(bytes(first)) <= MAX_SOCKET_PATH
+  assert first.parent == Path('/tmp/cast_control-1000')
+  assert first != second
+
+
+@pytest.mark.parametrize('arg', ['nan', 'NaN', 'inf', '-Infinity', 'snan'])
+def test_non_finite_numbers(arg: str):
+  with pytest.raises(ControlError, match='finite'):
+    control_module.get_number([arg])
+
+
+def test_socket_is_private_when_bound(loop: Loop, monkeypatch):
+  umask = os.umask(0o022)
+  monkeypatch.setattr(control_module.os, 'chmod', lambda path, mode: None)
+
+  try:
+    with TemporaryDirectory(dir=SHORT_DIR) as directory:
+      control = ControlServer(Path(directory) / 'test.sock', dict)
+      mode = stat.S_IMODE(control.path.stat().st_mode)
+      control.server_close()
+
+  finally:
+    assert os.umask(umask) == 0o022, 'umask restored'
+
+  assert mode == control_module.SOCKET_MODE
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('mpris_server')
+
+from cast_control.device import base
+from cast_control.device.base import Controllers
+
+
+YOUTUBE_APP: str = base.FACTORIES['youtube'].app_id
+OTHER_APP: str = 'other'
+
+
+class FakeController:
+  def __init__(self, namespace: str = 'urn:x-cast:com.google.youtube.mdx'):
+    self.namespace = namespace
+    self.connected = 0
+    self.socket_client = None
+
+  @property
+  def is_active(self) -> bool:
+    return bool(self.socket_client) and self.namespace in self.socket_client.app_namespaces
+
+  def channel_connected(self):
+    self.connected += 1
+
+
+class FakeSocketClient:
+  def __init__(self):
+    self.app_namespaces: list[str] = []
+
+
+class FakeDevice:
+  uuid = None
+
+  def __init__(self, cast_type: str = 'cast'):
+    self.cast_type = cast_type
+    self.socket_client = FakeSocketClient()
+    self.handlers: list[FakeController] = []
+
+  def register_handler(self, controller: FakeController):
+    self.handlers.append(controller)
+    controller.socket_client = self.socket_client
+
+  def unregister_handler(self, controller: FakeController):
+    self.handlers.remove(controller)
+    controller.socket_client = None
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+  now = [0.0]
+  monkeypatch.setattr(base, 'monotonic', lambda: now[0])
+  monkeypatch.setattr(Controllers, '_new', lambda self, name: FakeController())
+
+  return now
+
+
+def test_get_doesnt_keep_controller_loaded(clock: list[float]):
+  device = FakeDevice()
+  controllers = Controllers(device, idle=10.0)
+
+  controllers.on_app(YOUTUBE_APP)
+  assert 'youtube' in controllers
+
+  # statuses keep asking for it after its app stopped
+  for second in range(1, 30):
+    clock[0] = float(second)
+    controllers.get('youtube')
+    controllers.on_app(OTHER_APP)
+
+  assert 'youtube' not in controllers
+  assert not device.handlers
+
+
+def test_late_registration_connects(clock: list[float]):
+  device = FakeDevice()
+  device.socket_client.app_namespaces = ['urn:x-cast:com.google.youtube.mdx']
+  controllers = Controllers(device)
+
+  controller = controllers.load('youtube')
+  assert controller.connected == 1
+
+  # loading it again doesn't reconnect it
+  controllers.load('youtube')
+  assert controller.connected == 1
+
+
+def test_registration_before_app_waits(clock: list[float]):
+  controllers = Controllers(FakeDevice())
+  assert controllers.load('youtube').connected == 0
+
+
+def test_unload_all(clock: list[float]):
+  device = FakeDevice()
+  controllers = Controllers(device)
+
+  controllers.load('youtube')
+  controllers.load('plex')
+  controllers.unload_all()
+
+  assert not device.handlers
+  assert not list(controllers)
+
+
+@pytest.mark.parametrize('cast_type, loaded', [('group', True), ('cast', False), ('audio', False)])
+def test_multizone_for_groups(clock: list[float], cast_type: str, loaded: bool):
+  device = FakeDevice(cast_type)
+  controllers = Controllers(device, idle=10.0)
+  controllers.load_for_cast_type()
+
+  assert ('multizone' in controllers) is loaded
+
+  # it isn't an app's, so it stays through app changes
+  for second in range(1, 30):
+    clock[0] = float(second)
+    controllers.on_app(YOUTUBE_APP if second % 2 else OTHER_APP)
+
+  assert ('multizone' in controllers) is loaded
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import threading
+from time import perf_counter, sleep
+from types import SimpleNamespace
+from typing import Final
+from uuid import UUID, uuid4
+
+import pytest
+
+from pychromecast.models import CastInfo
+
+from cast_control.device import device as device_module
+from cast_control.base import DEFAULT_DEVICE_NAME
+from cast_control.device.device import Discovery, Host, find_cached_host, find_device, get_device_via_cache
+
+
+RETRY_WAIT: Final[float] = 0.1
+TIMEOUT: Final[float] = 0.5  # the browse window, a miss waits all of it
+ANNOUNCE_DELAY: Final[float] = 0.02  # how long devices take to answer the browse
+
+KITCHEN: Final[UUID] = uuid4()
+LIVING_ROOM: Final[UUID] = uuid4()
+MISSING: Final[UUID] = uuid4()
+
+
+def get_info(uuid: UUID, name: str, host: str) -> CastInfo:
+  return CastInfo(
+    services=set(), uuid=uuid, model_name='Chromecast', friendly_name=name, host=host, port=8009,
+    cast_type='cast', manufacturer='Google Inc.',
+  )
+
+
+INFOS: Final[tuple[CastInfo, ...]] = (
+  get_info(KITCHEN, 'Kitchen', '192.168.1.20'),
+  get_info(LIVING_ROOM, 'Living Room', '192.168.1.21'),
+)
+
+
+class Browser:
+  """Stands in for CastBrowser, devices answer from zeroconf's thread after a moment"""
+
+  starts: list[Browser] = []
+
+  def __init__(self, listener, zc):
+    self.listener = listener
+    self.zc = zc
+    self.devices: dict[UUID, CastInfo] = {}
+    self.stopped = False
+
+  def start_discovery(self):
+    type(self).starts.append(self)
+    threading.Thread(target=self._announce, daemon=True).start()
+
+  def _announce(self):
+    for info in INFOS:
+      sleep(ANNOUNCE_DELAY)
+
+      if self.stopped:
+        return
+
+      self.devices[info.uuid] = info
+      self.listener.add_cast(info.uuid, info.friendly_name)
+
+  def stop_discovery(self):
+    self.stopped = True
+
+
+@pytest.fixture(autouse=True)
+def browser(monkeypatch) -> type[Browser]:
+  monkeypatch.setattr(Browser, 'starts', [])
+  monkeypatch.setattr(device_module, 'CastBrowser', Browser)
+  monkeypatch.setattr(device_module, 'Zeroconf', lambda: None)
+  monkeypatch.setattr(device_module, 'connect_cast_info', lambda info, zc, retry_wait: SimpleNamespace(info=info))
+  monkeypatch.setattr(device_module, 'remember_device', lambda device: None)
+  monkeypatch.setattr(device_module, 'load_hosts', dict)
+  monkeypatch.setattr(device_module, 'get_device_via_host', lambda host, name, retry_wait: None)
+  monkeypatch.setattr(Discovery.__init__, '__defaults__', (RETRY_WAIT, TIMEOUT))
+
+  return Browser
+
+
+@pytest.mark.parametrize('mode, wanted, expected', [
+  ('name', dict(name='living room'), LIVING_ROOM),
+  ('uuid', dict(uuid=str(LIVING_ROOM)), LIVING_ROOM),
+  ('host', dict(host='192.168.1.21'), LIVING_ROOM),
+  ('first', dict(), KITCHEN),
+])
+def test_lookup_returns_when_found(
+  mode: str, wanted: dict, expected: UUID, browser: type[Browser], record_property,
+):
+  with Discovery() as discovery:
+    start = perf_counter()
+    device = discovery.get_device(**wanted)
+    elapsed = perf_counter() - start
+
+  record_property(f'{mode}_seconds', round(elapsed, 3))
+
+  assert device.info.uuid == expected
+  assert len(browser.starts) == 1
+  # found as the device answers, not at the end of the window
+  assert elapsed < TIMEOUT / 2, f'{mode} took {elapsed:.3f}s'
+
+
+def test_miss_waits_for_the_window(browser: type[Browser]):
+  with Discovery() as discovery:
+    start = perf_counter()
+    assert discovery.get_device(uuid=MISSING) is None
+
+  assert perf_counter() - start >= TIMEOUT
+  assert len(browser.starts) == 1
+
+
+@pytest.mark.parametrize('wanted', [
+  dict(name='Kitchen'),
+  dict(uuid=KITCHEN),
+  dict(name=None),
+  # the host doesn't answer, the UUID isn't around, the name is
+  dict(host='192.168.1.99', uuid=MISSING, name='Kitchen'),
+  dict(host='192.168.1.99', uuid=KITCHEN, name='Kitchen'),
+])
+def test_one_browse_per_find_device(wanted: dict, browser: type[Browser]):
+  device = find_device(retry_wait=RETRY_WAIT, **wanted)
+
+  assert device.info.uuid == KITCHEN
+  assert len(browser.starts) == 1
+  assert all(started.stopped for started in browser.starts)
+
+
+def test_no_browse_when_host_answers(browser: type[Browser], monkeypatch):
+  direct = SimpleNamespace(info=INFOS[0])
+  monkeypatch.setattr(device_module, 'get_device_via_host', lambda host, name, retry_wait: direct)
+
+  assert find_device(host='192.168.1.20', uuid=KITCHEN, retry_wait=RETRY_WAIT) is direct
+  assert not browser.starts
+
+
+def test_shared_browse_stays_running(browser: type[Browser]):
+  with Discovery() as discovery:
+    first = find_device('Kitchen', retry_wait=RETRY_WAIT, discovery=discovery)
+    second = find_device('Living Room', retry_wait=RETRY_WAIT, discovery=discovery)
+
+    assert not discovery.browser.stopped
+
+  assert (first.info.uuid, second.info.uuid) == (KITCHEN, LIVING_ROOM)
+  assert len(browser.starts) == 1
+
+
+@pytest.mark.parametrize('port, expected', [(32187, 32187), (None, device_module.CAST_PORT)])
+def test_cached_port_is_checked(monkeypatch, port: int | None, expected: int):
+  checked = []
+
+  def get_device_info(host, services=None, **kwargs):
+    checked.extend(services)
+
+  monkeypatch.setattr(device_module, 'get_device_info', get_device_info)
+  cached = Host('192.168.1.30', port, str(KITCHEN), 'Google Cast Group', 'Everywhere')
+
+  assert get_device_via_cache(cached, RETRY_WAIT) is None
+  assert [(service.host, service.port) for service in checked] == [('192.168.1.30', expected)]
+
+
+def test_default_name_isnt_cached(monkeypatch):
+  cached = Host('192.168.1.30', friendly_name=DEFAULT_DEVICE_NAME)
+  monkeypatch.setattr(device_module, 'load_hosts', lambda: {str(KITCHEN): cached})
+
+  assert find_cached_host(DEFAULT_DEVICE_NAME) is None
+  assert find_cached_host(DEFAULT_DEVICE_NAME, '192.168.1.30') == cached
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import random
+import threading
+from collections import deque
+from threading import Lock, Thread
+from time import sleep
+from types import SimpleNamespace
+from typing import Final
+from uuid import UUID, uuid4
+
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('mpris_server')
+
+from cast_control.app import hub as hub_module
+from cast_control.app.hub import Hub, Player
+from cast_control.device.device import Target
+
+
+DEVICES: Final[int] = 4
+THREADS: Final[int] = 4
+EVENTS: Final[int] = 500
+SETTLE_ROUNDS: Final[int] = 1_000
+
+
+class Loop:
+  """Stands in for GLib's loop, callbacks run in order when drained"""
+
+  SOURCE_REMOVE: Final[bool] = False
+  SOURCE_CONTINUE: Final[bool] = True
+
+  def __init__(self):
+    self.queue = deque()
+    self.lock = Lock()
+
+  def idle_add(self, func, *args) -> int:
+    with self.lock:
+      self.queue.append((func, args))
+
+    return 1
+
+  def drain(self) -> int:
+    count = 0
+
+    while True:
+      with self.lock:
+        if not self.queue:
+          return count
+
+        func, args = self.queue.popleft()
+
+      func(*args)
+      count += 1
+
+
+class FakeDevice:
+  def __init__(self, uuid: UUID, name: str):
+    self.uuid = uuid
+    self.cast_info = SimpleNamespace(friendly_name=name)
+    self.connected = True
+
+  def disconnect(self, timeout: float | None = None):
+    self.connected = False
+
+
+class FakeServer:
+  def __init__(self, name: str):
+    self.name = name
+    self.published = True
+
+  def unpublish(self):
+    self.published = False
+
+
+class FakeEvents:
+  def unregister(self):
+    pass
+
+
+def publish(device: FakeDevice, name: str | None = None, icon: bool = False) -> Player:
+  return Player(FakeServer(name), device, FakeEvents())
+
+
+class FakeWatcher:
+  """Tracks which devices are on the network, and every connection made to them"""
+
+  def __init__(self):
+    self.present: set[UUID] = set()
+    self.devices: list[FakeDevice] = []
+    self.lock = Lock()
+
+  def is_present(self, uuid: UUID) -> bool:
+    with self.lock:
+      return uuid in self.present
+
+  def connect(self, info: SimpleNamespace) -> FakeDevice:
+    # give other threads a chance to come and go mid-connection
+    sleep(random.random() / 1_000)
+    device = FakeDevice(info.uuid, info.friendly_name)
+
+    with self.lock:
+      self.devices.append(device)
+
+    return device
+
+  def stop(self):
+    pass
+
+
+@pytest.fixture
+def loop(monkeypatch) -> Loop:
+  loop = Loop()
+  monkeypatch.setattr(hub_module, 'GLib', loop)
+  monkeypatch.setattr(hub_module, 'publish_device', publish)
+
+  return loop
+
+
+def settle(hub: Hub, loop: Loop):
+  for _ in range(SETTLE_ROUNDS):
+    if not loop.drain() and not hub._connecting:
+      return
+
+    sleep(0.001)
+
+  raise AssertionError('The hub never settled.')
+
+
+def churn(hub: Hub, watcher: FakeWatcher, infos: list[SimpleNamespace], seed: int):
+  rand = random.Random(seed)
+
+  for _ in range(EVENTS):
+    info = rand.choice(infos)
+
+    # the watcher's state and callbacks change together, like zeroconf's
+    with watcher.lock:
+      if rand.random() < 0.5:
+        watcher.present.add(info.uuid)
+        hub._on_added(info)
+
+      else:
+        watcher.present.discard(info.uuid)
+        hub._on_removed(info.uuid)
+
+
+def test_add_and_remove_churn(loop: Loop):
+  hub = Hub()
+  hub._watcher = watcher = FakeWatcher()
+  infos = [SimpleNamespace(uuid=uuid4(), friendly_name=f'Device {num}') for num in range(DEVICES)]
+
+  threads = [Thread(target=churn, args=(hub, watcher, infos, seed)) for seed in range(THREADS)]
+
+  for thread in threads:
+    thread.start()
+
+  # run the loop while devices come and go, letting events pile up between runs
+  while any(thread.is_alive() for thread in threads):
+    loop.drain()
+    sleep(0.001)
+
+  for thread in threads:
+    thread.join()
+
+  settle(hub, loop)
+
+  # every device on the network ends up served, and nothing else is
+  served = {player.device.uuid for player in hub.players.values()}
+  assert served == watcher.present
+
+  # every other connection was closed
+  devices = {id(player.device) for player in hub.players.values()}
+  leaked = [device for device in watcher.devices if device.connected and id(device) not in devices]
+  assert not leaked
+
+  hub._pool.shutdown()
+
+
+def test_return_after_leaving(loop: Loop):
+  hub = Hub()
+  hub._watcher = watcher = FakeWatcher()
+  info = SimpleNamespace(uuid=uuid4(), friendly_name='Device')
+
+  watcher.present.add(info.uuid)
+  hub._on_added(info)
+  settle(hub, loop)
+  first = hub.players[str(info.uuid)].device
+
+  # leaves and comes back before the loop handles the removal
+  watcher.present.discard(info.uuid)
+  hub._on_removed(info.uuid)
+  watcher.present.add(info.uuid)
+  hub._on_added(info)
+  settle(hub, loop)
+
+  assert not first.connected
+  assert (player := hub.players.get(str(info.uuid)))
+  assert player.device is not first and player.device.connected
+
+  hub._pool.shutdown()
+
+
+def test_add_disconnects_duplicate(loop: Loop):
+  hub = Hub()
+  uuid = uuid4()
+  first, second = FakeDevice(uuid, 'Device'), FakeDevice(uuid, 'Device')
+
+  assert hub.add(first) is hub.add(second)
+  assert first.connected and not second.connected
+
+  hub._pool.shutdown()
+
+
+def test_retry_wakes_for_missing(loop: Loop, monkeypatch):
+  hub = Hub(wait=60)
+  kitchen, bedroom = Target('Kitchen'), Target('Bedroom')
+  found = iter([[kitchen, bedroom], [bedroom], []])
+  waits = []
+
+  def wait(wake=None, delay=None):
+    # the announcements the retry wakes for, as it waits
+    waits.append(wake.__self__.targets)
+
+  monkeypatch.setattr(hub, 'find', lambda targets: next(found))
+  monkeypatch.setattr(hub.backoff, 'wait', wait)
+
+  assert hub.attach([kitchen, bedroom]) == [kitchen, bedroom]
+
+  for thread in threading.enumerate():
+    if thread.name == 'retry':
+      thread.join(5.0)
+
+  assert waits == [(kitchen, bedroom), (bedroom,)]
+  assert [attempt.found for attempt in hub.backoff] == [False, False, True]
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from itertools import count
+from typing import Final
+
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('mpris_server')
+
+from mpris_server import Property
+from pychromecast.controllers.media import CMD_SUPPORT_SEEK, MediaStatus
+from pychromecast.controllers.receiver import CastStatus, LaunchFailure
+
+from cast_control.base import DEFAULT_COALESCE_WAIT, MS_IN_SEC
+from cast_control.device import listeners
+from cast_control.device.listeners import Dispatcher, EventListener
+
+
+COALESCE_MS: Final[int] = round(DEFAULT_COALESCE_WAIT * MS_IN_SEC)
+
+
+class Loop:
+  """Stands in for GLib's loop, sources run when the test runs them"""
+
+  SOURCE_REMOVE: Final[bool] = False
+
+  def __init__(self):
+    self.ids = count(1)
+    self.idle: dict[int, Callable] = {}
+    self.timeouts: dict[int, tuple[int, Callable]] = {}
+
+  def idle_add(self, func: Callable) -> int:
+    self.idle[source := next(self.ids)] = func
+    return source
+
+  def timeout_add(self, interval: int, func: Callable) -> int:
+    self.timeouts[source := next(self.ids)] = interval, func
+    return source
+
+  def source_remove(self, source: int):
+    self.idle.pop(source, None)
+    self.timeouts.pop(source, None)
+
+  def run_idle(self):
+    while self.idle:
+      source, func = self.idle.popitem()
+      func()
+
+  def run_timeouts(self):
+    """The coalescing window ends"""
+    while self.timeouts:
+      source, (_, func) = self.timeouts.popitem()
+      func()
+
+
+@pytest.fixture
+def loop(monkeypatch) -> Loop:
+  loop = Loop()
+  monkeypatch.setattr(listeners, 'GLib', loop)
+
+  return loop
+
+
+class Batches(list):
+  """Handler that keeps each batch it's handed"""
+
+  def __call__(self, statuses: list):
+    self.append(statuses)
+
+
+def get_cast_status(volume_level: float = 0.5, volume_muted: bool = False, app_id: str | None = 'app') -> CastStatus:
+  return CastStatus(
+    is_active_input=None, is_stand_by=None, volume_level=volume_level, volume_muted=volume_muted,
+    app_id=app_id, display_name='App', namespaces=[], session_id=None, transport_id=None,
+    status_text='', icon_url=None, volume_control_type='attenuation',
+  )
+
+
+def get_media_status(player_state: str = 'PLAYING', **fields) -> MediaStatus:
+  status = MediaStatus()
+  status.player_state = player_state
+
+  for name, value in fields.items():
+    setattr(status, name, value)
+
+  return status
+
+
+def get_listener() -> EventListener:
+  """Only the state statuses are tracked with, without a server or device"""
+  events = EventListener.__new__(EventListener)
+  events._player_state = None
+  events._fields = {}
+  events._emitted = {}
+
+  return events
+
+
+def test_burst_is_coalesced(loop: Loop):
+  batches = Batches()
+  dispatcher = Dispatcher(batches)
+
+  cast, media = get_cast_status(), get_media_status()
+  dispatcher.dispatch(cast)
+  dispatcher.dispatch(media)
+  dispatcher.dispatch(None)
+
+  # one window for the whole burst, nothing handled before it ends
+  assert [interval for interval, _ in loop.timeouts.values()] == [COALESCE_MS]
+  assert not loop.idle and not batches
+
+  loop.run_timeouts()
+  assert batches == [[cast, media, None]]
+
+  # the next status opens a new window
+  dispatcher.dispatch(cast)
+  assert len(loop.timeouts) == 1
+
+
+def test_urgent_flushes_now(loop: Loop):
+  batches = Batches()
+  dispatcher = Dispatcher(batches)
+
+  cast = get_cast_status()
+  failure = LaunchFailure(reason='NOT_FOUND', app_id='app', request_id=1)
+  dispatcher.dispatch(cast)
+  dispatcher.dispatch(failure, urgent=True)
+
+  # the idle source takes what was waiting too
+  loop.run_idle()
+  assert batches == [[cast, failure]]
+
+  # and the window ends with nothing left to handle
+  loop.run_timeouts()
+  assert len(batches) == 1
+
+
+def test_no_wait_is_urgent(loop: Loop):
+  batches = Batches()
+  Dispatcher(batches, wait=None).dispatch(get_cast_status())
+
+  assert loop.idle and not loop.timeouts
+
+
+def test_cancel(loop: Loop):
+  batches = Batches()
+  dispatcher = Dispatcher(batches)
+  dispatcher.dispatch(get_cast_status())
+  dispatcher.dispatch(None, urgent=True)
+  dispatcher.cancel()
+
+  assert not loop.idle and not loop.timeouts
+
+  dispatcher.flush()
+  assert not batches
+
+
+@pytest.mark.parametrize('status, urgent', [
+  (None, True),
+  (LaunchFailure(reason='NOT_FOUND', app_id='app', request_id=1), True),
+  (get_cast_status(), False),
+])
+def test_urgent_statuses(status, urgent: bool):
+  assert get_listener()._is_urgent(status) is urgent
+
+
+def test_play_state_changes_are_urgent():
+  events = get_listener()
+  states = ['PLAYING', 'PLAYING', 'PAUSED', 'PAUSED', 'PLAYING', 'IDLE']
+
+  assert [events._is_urgent(get_media_status(state)) for state in states] == [
+    True, False, True, False, True, True,
+  ]
+
+
+class Interface:
+  """Just the props an interface serves"""
+
+  INTERFACE: Final[str] = 'org.mpris.MediaPlayer2.Player'
+
+  def __init__(self, **props):
+    self.__dict__.update(props)
+
+
+@pytest.fixture
+def emitted(monkeypatch) -> list[dict]:
+  emitted = []
+  monkeypatch.setattr(listeners, 'emit_properties_changed', lambda interface, changed: emitted.append(changed))
+
+  return emitted
+
+
+def test_unchanged_values_arent_emitted(emitted: list[dict]):
+  events = get_listener()
+  player = Interface(Volume=0.5, PlaybackStatus='Playing', CanPause=True)
+  props = [Property.Volume, Property.PlaybackStatus, Property.CanPause]
+
+  events.emit_changes(player, props)
+  assert emitted == [{Property.Volume: 0.5, Property.PlaybackStatus: 'Playing', Property.CanPause: True}]
+
+  # nothing at all when no value changed
+  events.emit_changes(player, props)
+  assert len(emitted) == 1
+
+  # only what changed
+  player.Volume = 0.75
+  events.emit_changes(player, props)
+  assert emitted[-1] == {Property.Volume: 0.75}
+
+
+def test_emitted_per_interface(emitted: list[dict]):
+  events = get_listener()
+  root = Interface(CanQuit=True)
+  root.INTERFACE = 'org.mpris.MediaPlayer2'
+
+  events.emit_changes(Interface(CanQuit=True), [Property.CanQuit])
+  events.emit_changes(root, [Property.CanQuit])
+
+  assert len(emitted) == 2
+
+
+def test_first_status_changes_everything():
+  assert get_listener()._get_changes(get_cast_status()) == listeners.ALL_PROPS
+
+
+@pytest.mark.parametrize('status', [None, LaunchFailure(reason='NOT_FOUND', app_id='app', request_id=1)])
+def test_unrouted_status_changes_everything(status):
+  events = get_listener()
+  events._get_changes(get_cast_status())
+
+  assert events._get_changes(status) == listeners.ALL_PROPS
+
+
+@pytest.mark.parametrize('fields', [dict(volume_level=0.75), dict(volume_muted=True)])
+def test_volume_only_cast_status(fields: dict):
+  events = get_listener()
+  events._get_changes(get_cast_status())
+
+  assert events._get_changes(get_cast_status(**fields)) == {Property.Volume}
+  assert events._get_changes(get_cast_status(**fields)) == frozenset()
+
+
+def test_app_change_is_a_new_track():
+  events = get_listener()
+  events._get_changes(get_cast_status())
+
+  assert events._get_changes(get_cast_status(app_id='other')) == listeners.TRACK_PROPS
+
+
+def test_media_status_updated_in_place():
+  events = get_listener()
+  status = get_media_status(media_metadata={'title': 'Song'}, supported_media_commands=0)
+  events._get_changes(status)
+
+  # pychromecast changes the same object, so earlier fields have to be copies
+  status.media_metadata = {'title': 'Next song'}
+  status.supported_media_commands = CMD_SUPPORT_SEEK
+  assert events._get_changes(status) == listeners.TRACK_PROPS | listeners.SEEK_PROPS
+
+  # the current time isn't routed, clients extrapolate it
+  status.current_time = 42.0
+  assert events._get_changes(status) == frozenset()
+
+
+def test_batch_changes_are_merged(monkeypatch):
+  events = get_listener()
+  updated = []
+  monkeypatch.setattr(events, '_update_metadata', updated.append, raising=False)
+
+  cast, media = get_cast_status(), get_media_status()
+  events._handle_statuses([cast, media])
+  events._handle_statuses([get_cast_status(volume_level=0.1), get_media_status('PAUSED')])
+
+  assert updated == [listeners.ALL_PROPS, {Property.Volume} | listeners.PLAYSTATE_PROPS]
+
+
+def test_newer_status_supersedes_its_type(loop: Loop):
+  batches = Batches()
+  dispatcher = Dispatcher(batches)
+
+  old_cast, media, new_cast = get_cast_status(), get_media_status(), get_cast_status(volume_level=0.1)
+  dispatcher.dispatch(old_cast)
+  dispatcher.dispatch(media)
+  dispatcher.dispatch(None)
+  dispatcher.dispatch(new_cast)
+  dispatcher.dispatch(None)
+
+  loop.run_timeouts()
+  assert batches == [[media, new_cast, None]]
+
+
+def test_oldest_dropped_when_full(loop: Loop):
+  batches = Batches()
+  dispatcher = Dispatcher(batches, size=3)
+
+  # statuses of different types don't supersede each other
+  kinds = [type(f'Status{index}', (), {}) for index in range(5)]
+  statuses = [kind() for kind in kinds]
+
+  for status in statuses:
+    dispatcher.dispatch(status)
+
+  loop.run_timeouts()
+  assert batches == [statuses[-3:]]
+
+
+def test_dispatch_doesnt_handle(loop: Loop):
+  handled = []
+  dispatcher = Dispatcher(handled.append)
+
+  # the socket thread only queues, the loop handles
+  dispatcher.dispatch(get_media_status(), urgent=True)
+  assert not handled
+
+  loop.run_idle()
+  assert len(handled) == 1
+
+
+def test_handler_errors_are_contained(loop: Loop):
+  def fail(statuses: list):
+    raise ValueError(statuses)
+
+  dispatcher = Dispatcher(fail)
+  dispatcher.dispatch(None, urgent=True)
+  loop.run_idle()
+
+  # and the next batch is still handled
+  dispatcher.handler = batches = Batches()
+  dispatcher.dispatch(None, urgent=True)
+  loop.run_idle()
+
+  assert batches == [[None]]
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import random
+import threading
+from collections.abc import Iterator
+from io import BytesIO
+from pathlib import Path
+from typing import Final
+
+import pytest
+
+from cast_control.app import logs
+from cast_control.app.logs import BLOCK_SIZE, LogFilter, Poll, follow, parse, read_log, tail
+
+
+SEED: Final[int] = 7
+RECORDS: Final[int] = 3_000  # enough for a few blocks
+TIMEOUT: Final[float] = 5.0
+LOGGERS: Final[tuple[str, ...]] = ('cast_control.device.wrapper', 'cast_control.app.hub', 'pychromecast')
+LEVELS: Final[tuple[str, ...]] = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+
+def get_record(rand: random.Random, index: int) -> list[str]:
+  level, logger = rand.choice(LEVELS), rand.choice(LOGGERS)
+  # lengths vary, so lines and records land across block boundaries
+  lines = [f'{level}:{logger}:record {index} {"x" * rand.randrange(200)}\n']
+
+  if rand.random() < 0.1:
+    lines += ['Traceback (most recent call last):\n', f'  File "x.py", line {index}\n', 'ValueError\n']
+
+  return lines
+
+
+@pytest.fixture(scope='module')
+def records() -> list[list[str]]:
+  rand = random.Random(SEED)
+  return [get_record(rand, index) for index in range(RECORDS)]
+
+
+def get_file(records: list[list[str]], prelude: str = '', trailing: str = '') -> BytesIO:
+  text = prelude + ''.join(line for record in records for line in record) + trailing
+  return BytesIO(text.encode())
+
+
+def expected_tail(records: list[list[str]], count: int, keep: LogFilter) -> list[str]:
+  """Whole records from the end, forwards and all at once"""
+  kept = [record for record in records if keep.matches(parse(record[0]))]
+  taken: list[list[str]] = []
+  lines = 0
+
+  for record in reversed(kept):
+    if taken and lines + len(record) > count:
+      break
+
+    taken.append(record)
+
+    if (lines := lines + len(record)) >= count:
+      break
+
+  return [line for record in reversed(taken) for line in record]
+
+
+def test_records_span_blocks(records: list[list[str]]):
+  size = len(get_file(records).getvalue())
+  assert size > 3 * BLOCK_SIZE
+
+
+@pytest.mark.parametrize('count', [1, 2, 3, 50, 1_000, 2_500, 100_000])
+def test_tail_across_blocks(records: list[list[str]], count: int):
+  file = get_file(records)
+  lines, offset = tail(file, count, LogFilter())
+
+  assert lines == expected_tail(records, count, LogFilter())
+  assert offset == len(file.getvalue())
+
+
+@pytest.mark.parametrize('level, loggers', [
+  ('warning', ()),
+  (None, ('cast_control.device',)),
+  ('error', ('cast_control', 'pychromecast')),
+  (None, ('cast_control.dev',)),  # not a parent of cast_control.device
+])
+@pytest.mark.parametrize('count', [1, 10, 500])
+def test_tail_filters(records: list[list[str]], level: str | None, loggers: tuple[str, ...], count: int):
+  keep = LogFilter(level, loggers)
+  lines, _ = tail(get_file(records), count, keep)
+
+  assert lines == expected_tail(records, count, keep)
+
+  # never starts in the middle of a record
+  if lines:
+    assert parse(lines[0])
+
+
+def test_tail_keeps_tracebacks_whole():
+  record = ['ERROR:cast_control.app.hub:failed\n', 'Traceback (most recent call last):\n', 'ValueError\n']
+  file = get_file([['INFO:cast_control.app.hub:before\n'], record])
+
+  assert tail(file, 1, LogFilter())[0] == record
+  assert tail(file, 3, LogFilter('error'))[0] == record
+  assert tail(file, 4, LogFilter())[0] == ['INFO:cast_control.app.hub:before\n', *record]
+
+
+def test_tail_leaves_unfinished_line(records: list[list[str]]):
+  file = get_file(records[-5:], trailing='INFO:cast_control.app.hub:still being wri')
+  lines, offset = tail(file, 100, LogFilter())
+
+  assert lines == [line for record in records[-5:] for line in record]
+  assert file.getvalue()[offset:] == b'INFO:cast_control.app.hub:still being wri'
+
+
+def test_tail_prelude():
+  file = get_file([['INFO:cast_control.app.hub:first\n']], prelude='started\n')
+
+  assert tail(file, 10, LogFilter())[0] == ['started\n', 'INFO:cast_control.app.hub:first\n']
+  assert tail(file, 10, LogFilter('info'))[0] == ['INFO:cast_control.app.hub:first\n']
+
+
+def test_tail_nothing():
+  assert tail(BytesIO(), 10, LogFilter()) == ([], 0)
+  assert tail(BytesIO(b'no newline yet'), 10, LogFilter()) == ([], 0)
+  assert tail(get_file([['INFO:a:b\n']]), 0, LogFilter()) == ([], len('INFO:a:b\n'))
+
+
+@pytest.fixture
+def poll(monkeypatch):
+  monkeypatch.setattr(logs, 'POLL_WAIT', 0.01)
+  monkeypatch.setattr(logs, 'get_watch', lambda directory: Poll())
+
+
+def get_next(lines: Iterator[str]) -> str:
+  """The next line, failing instead of hanging if it never comes"""
+  result = []
+  thread = threading.Thread(target=lambda: result.append(next(lines)), daemon=True)
+  thread.start()
+  thread.join(TIMEOUT)
+
+  assert result, 'no line'
+  return result[0]
+
+
+def append(path: Path, text: str):
+  with path.open('a') as file:
+    file.write(text)
+
+
+@pytest.mark.parametrize('watch', ['poll', 'inotify'])
+def test_follow_appended_lines(tmp_path: Path, watch: str, request):
+  if watch == 'poll':
+    request.getfixturevalue('poll')
+
+  path = tmp_path / 'service.log'
+  path.write_text('INFO:cast_control:old\n')
+  lines = read_log(path, count=1, follow_log=True)
+
+  assert get_next(lines) == 'INFO:cast_control:old\n'
+
+  timer = threading.Timer(0.05, append, (path, 'INFO:cast_control:new\nINFO:cast_control:half'))
+  timer.start()
+  assert get_next(lines) == 'INFO:cast_control:new\n'
+
+  # finished later
+  append(path, ' done\n')
+  assert get_next(lines) == 'INFO:cast_control:half done\n'
+  lines.close()
+
+
+@pytest.mark.parametrize('newest, shown', [('WARNING', True), ('DEBUG', False)])
+def test_follow_continues_tail_record(tmp_path: Path, poll, newest: str, shown: bool):
+  path = tmp_path / 'service.log'
+  path.write_text(f'INFO:cast_control:kept\n{newest}:cast_control:newest\n')
+  lines = read_log(path, LogFilter('info'), count=5, follow_log=True)
+
+  tailed = ['INFO:cast_control:kept\n', *([f'{newest}:cast_control:newest\n'] if shown else [])]
+  assert [get_next(lines) for _ in tailed] == tailed
+
+  # a traceback written later goes with the newest record
+  append(path, 'Traceback (most recent call last):\nINFO:cast_control:next\n')
+  expected = ['Traceback (most recent call last):\n'] if shown else []
+  assert [get_next(lines) for _ in range(len(expected) + 1)] == [*expected, 'INFO:cast_control:next\n']
+  lines.close()
+
+
+def test_follow_after_truncation(tmp_path: Path, poll):
+  path = tmp_path / 'service.log'
+  path.write_text(''.join(f'INFO:cast_control:before {index}\n' for index in range(3)))
+  lines = follow(path, 0, LogFilter('info'))
+
+  assert [get_next(lines) for _ in range(3)] == [f'INFO:cast_control:before {index}\n' for index in range(3)]
+
+  # the service truncates its log when it restarts, and a new log starts
+  # without a record, so the filtered prelude is left out
+  path.write_text('started\nINFO:cast_control:after\n')
+
+  assert get_next(lines) == 'INFO:cast_control:after\n'
+  lines.close()
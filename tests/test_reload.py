@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip('gi')
+
+from cast_control.app import reload
+from cast_control.app.daemon import Args
+from cast_control.app.reload import Reloader
+
+
+class Service:
+  """Keeps what it was told to change"""
+
+  def __init__(self, fail: bool = False):
+    self.fail = fail
+    self.icons: list[bool] = []
+    self.waits: list[tuple] = []
+
+  def set_icon(self, icon: bool):
+    if self.fail:
+      raise OSError('gone')
+
+    self.icons.append(icon)
+
+  def set_waits(self, wait, retry_wait):
+    self.waits.append((wait, retry_wait))
+
+
+@pytest.fixture
+def saved(monkeypatch) -> list[Args]:
+  saved = [Args(name='Kitchen', icon=True)]
+  monkeypatch.setattr(Args, 'load', staticmethod(lambda instance: saved[-1]))
+  monkeypatch.setattr(reload, 'set_log_level', lambda level: None)
+
+  return saved
+
+
+def test_nothing_changed(saved: list[Args]):
+  assert Reloader(saved[-1], Service()).reload() == dict(ok=True, changed=[], restart=False)
+
+
+def test_applied_in_place(saved: list[Args]):
+  service = Service()
+  reloader = Reloader(saved[-1], service)
+  saved.append(saved[-1]._replace(icon=False, wait=5))
+
+  assert reloader.reload() == dict(ok=True, changed=['icon', 'wait'], restart=False)
+  assert service.icons == [False] and len(service.waits) == 1
+  assert reloader.args == saved[-1]
+
+
+@pytest.mark.parametrize('fields', [dict(name='Living Room'), dict(host='192.168.1.20'), dict(devices=('a',))])
+def test_restart_fields(saved: list[Args], fields: dict):
+  service = Service()
+  reloader = Reloader(saved[0], service)
+  saved.append(saved[0]._replace(icon=False, **fields))
+
+  assert reloader.reload()['restart']
+
+  # nothing applied, so nothing kept
+  assert not service.icons
+  assert reloader.args == saved[0]
+
+
+def test_failed_apply_isnt_kept(saved: list[Args]):
+  reloader = Reloader(saved[0], Service(fail=True))
+  saved.append(saved[0]._replace(icon=False))
+
+  with pytest.raises(OSError):
+    reloader.reload()
+
+  assert reloader.args == saved[0]
+
+  # and is tried again
+  reloader.service = service = Service()
+  assert reloader.reload()['changed'] == ['icon']
+  assert service.icons == [False]
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import gc
+import weakref
+
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('mpris_server')
+
+from cast_control.device.base import (
+  NOT_YOUTUBE, RESOLVERS, Resolved, Resolvers, Route, YoutubeUri, YoutubeUrl, classify,
+)
+
+
+YOUTUBE_URIS: list[str] = [
+  'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+  'https://youtube.com/watch?feature=share&v=dQw4w9WgXcQ',
+  'https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=42',
+  'https://www.youtube.com/playlist?list=PLFgquLnL59alCl_2TQvOiD5Vgm1hCaGSI',
+  'https://youtu.be/dQw4w9WgXcQ',
+  'https://youtu.be/dQw4w9WgXcQ?t=42',
+  'https://www.youtube.com/',
+  'https://www.youtube.com/channel/UC38IQsAvIsxxjztdMZQtwHA',
+]
+
+LONG: YoutubeUrl = YoutubeUrl.long
+SHORT: YoutubeUrl = YoutubeUrl.short
+VIDEO: YoutubeUrl = YoutubeUrl.video
+PLAYLIST: YoutubeUrl = YoutubeUrl.playlist
+
+CLASSIFIED: dict[str, YoutubeUri] = {
+  # long
+  'https://www.youtube.com/watch?v=dQw4w9WgXcQ': YoutubeUri(LONG, VIDEO, 'dQw4w9WgXcQ'),
+  'https://youtube.com/watch?feature=share&v=dQw4w9WgXcQ': YoutubeUri(LONG, VIDEO, 'dQw4w9WgXcQ'),
+  'https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL1': YoutubeUri(LONG, VIDEO, 'dQw4w9WgXcQ'),
+  # short
+  'https://youtu.be/dQw4w9WgXcQ': YoutubeUri(SHORT, VIDEO, 'dQw4w9WgXcQ'),
+  'https://youtu.be/dQw4w9WgXcQ?t=42': YoutubeUri(SHORT, VIDEO, 'dQw4w9WgXcQ'),
+  'https://youtu.be/': YoutubeUri(SHORT, VIDEO),
+  # playlist only
+  'https://www.youtube.com/playlist?list=PL1': YoutubeUri(LONG, PLAYLIST, 'PL1'),
+  # no v
+  'https://www.youtube.com/watch?feature=share': YoutubeUri(LONG, VIDEO),
+  'https://www.youtube.com/': YoutubeUri(LONG),
+  # m. and other subdomains
+  'https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=42': YoutubeUri(LONG, VIDEO, 'dQw4w9WgXcQ'),
+  'https://m.youtube.com/playlist?list=PL2': YoutubeUri(LONG, PLAYLIST, 'PL2'),
+  'https://music.youtube.com/watch?v=dQw4w9WgXcQ': YoutubeUri(LONG, VIDEO, 'dQw4w9WgXcQ'),
+  # lookalikes and junk
+  'https://youtube.com.example.org/watch?v=dQw4w9WgXcQ': NOT_YOUTUBE,
+  'https://example.com/watch?v=dQw4w9WgXcQ': NOT_YOUTUBE,
+  'not a uri': NOT_YOUTUBE,
+  '': NOT_YOUTUBE,
+}
+
+OTHER_URIS: dict[str, Resolved | None] = {
+  'https://www.bbc.co.uk/iplayer/episode/m000abcd': Resolved('bbc_ip', 'bbc_ip', 'm000abcd'),
+  'https://www.bbc.co.uk/sounds/play/p0abcdef': Resolved('bbc_sound', 'bbc_sound', 'p0abcdef'),
+  'https://www.supla.fi/audio/4512345': Resolved('supla', 'supla', '4512345'),
+  'https://areena.yle.fi/podcastit/1-4567890': Resolved('yle', 'yle', '1-4567890'),
+  'https://example.com/video.mp4': None,
+  'not a uri': None,
+  '': None,
+}
+
+
+@pytest.mark.parametrize('uri, expected', CLASSIFIED.items())
+def test_classify(uri: str, expected: YoutubeUri):
+  assert classify(uri) == expected
+
+
+def test_classify_none():
+  assert classify(None) is NOT_YOUTUBE
+
+
+@pytest.mark.parametrize('uri', YOUTUBE_URIS)
+def test_youtube_agrees_with_classify(uri: str):
+  resolved = RESOLVERS.resolve(uri)
+  content_id = classify(uri).content_id
+
+  if content_id is None:
+    assert resolved is None
+
+  else:
+    assert resolved == Resolved('youtube', 'youtube', content_id)
+
+
+@pytest.mark.parametrize('uri, expected', OTHER_URIS.items())
+def test_other_apps(uri: str, expected: Resolved | None):
+  assert RESOLVERS.resolve(uri) == expected
+
+
+def test_register_needs_named_group():
+  with pytest.raises(ValueError):
+    Resolvers(plex=Route('plex', r'https?://plex\.tv/(\w+)'))
+
+
+def test_cache_doesnt_keep_resolvers_alive():
+  resolvers = Resolvers(plex=Route('plex', r'https?://app\.plex\.tv/(?P<plex>\w+)'))
+  assert resolvers.resolve('https://app.plex.tv/abc') == Resolved('plex', 'plex', 'abc')
+
+  ref = weakref.ref(resolvers)
+  del resolvers
+  gc.collect()
+
+  assert ref() is None
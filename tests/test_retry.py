@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from cast_control.app import retry
+from cast_control.app.retry import Backoff
+from cast_control.device import device as device_module
+from cast_control.device.device import Announcements, Target
+
+
+def test_delay_is_capped_without_overflow():
+  backoff = Backoff(cap=300, start=1, factor=2)
+
+  for _ in range(5_000):
+    backoff.record(0.0, 0.0, found=False)
+
+  assert backoff.max_exponent == 9
+  assert 150 <= backoff.get_delay() <= 300
+
+
+@pytest.mark.parametrize('cap, start, factor', [(1, 1, 2), (5, 10, 2), (60, 0, 2), (60, 1, 1)])
+def test_degenerate_backoffs(cap: float, start: float, factor: int):
+  backoff = Backoff(cap=cap, start=start, factor=factor)
+
+  for _ in range(2_000):
+    backoff.record(0.0, 0.0, found=False)
+
+  assert 0 <= backoff.get_delay() <= cap
+
+
+def test_delay_grows_until_cap(monkeypatch):
+  # take the top of each jittered range
+  monkeypatch.setattr(retry, 'uniform', lambda low, high: high)
+  backoff = Backoff(cap=100, start=1, factor=2)
+  delays = []
+
+  for _ in range(10):
+    backoff.record(0.0, 0.0, found=False)
+    delays.append(backoff.get_delay())
+
+  assert delays == [1, 2, 4, 8, 16, 32, 64, 100, 100, 100]
+
+
+class FakeDiscovery:
+  """Each browse finds the devices next in `browses`, the way mDNS would"""
+
+  browses: list[list] = []
+
+  def __init__(self, *args, **kwargs):
+    self.devices = self.browses.pop(0)
+
+  def __enter__(self) -> FakeDiscovery:
+    return self
+
+  def __exit__(self, *args):
+    pass
+
+  def find_match(self, wanted):
+    return next(filter(wanted, self.devices), None)
+
+
+@pytest.fixture
+def discovery(monkeypatch) -> type[FakeDiscovery]:
+  monkeypatch.setattr(device_module, 'Discovery', FakeDiscovery)
+  FakeDiscovery.browses = []
+
+  return FakeDiscovery
+
+
+def get_info(name: str, host: str) -> SimpleNamespace:
+  return SimpleNamespace(friendly_name=name, uuid=None, host=host, port=8009)
+
+
+def test_announcements_wake_once(discovery: type[FakeDiscovery]):
+  info = get_info('Device', '10.0.0.2')
+  moved = get_info('Device', '10.0.0.3')
+  discovery.browses = [[info], [info], [info], [], [info], [moved], [moved]]
+  announcements = Announcements(Target('Device'))
+
+  woken = [announcements.wait(1.0) for _ in discovery.browses.copy()]
+
+  # the same unreachable device only wakes a retry after it leaves or moves
+  assert woken == [True, False, False, False, True, True, False]
+
+
+def test_announcements_for_several_targets(discovery: type[FakeDiscovery]):
+  kitchen, bedroom, other = get_info('Kitchen', '10.0.0.2'), get_info('Bedroom', '10.0.0.3'), get_info('TV', '10.0.0.4')
+  discovery.browses = [[other], [kitchen], [kitchen], [kitchen, bedroom], [kitchen, bedroom]]
+  announcements = Announcements(Target('Kitchen'), Target('Bedroom'))
+
+  woken = [announcements.wait(1.0) for _ in range(3)]
+  assert woken == [False, True, False]
+
+  # the kitchen was found, only the bedroom is missing now
+  announcements.want([Target('Bedroom')])
+  assert announcements.wait(1.0)
+  assert not announcements.wait(1.0)
+
+
+@pytest.mark.parametrize('cap', [0, 0.0, -1, 0.2])
+def test_cap_has_a_floor(cap: float):
+  backoff = Backoff(cap=cap)
+  backoff.record(0.0, 0.0, found=False)
+
+  assert backoff.cap == retry.MIN_CAP
+  assert backoff.get_delay() >= retry.MIN_CAP / 2
+
+  backoff.set_cap(300)
+  backoff.set_cap(cap)
+  assert backoff.cap == retry.MIN_CAP
+
+
+def test_timed_attempt_records():
+  backoff = Backoff()
+
+  assert retry.timed_attempt(backoff, lambda: None) is None
+  assert retry.timed_attempt(backoff, lambda: [], found=lambda missing: not missing) == []
+
+  assert [attempt.found for attempt in backoff] == [False, True]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Final
+
+import pytest
+
+
+SRC: Final[Path] = Path(__file__).parent.parent / 'src'
+US_IN_MS: Final[int] = 1_000
+
+# what commands that don't talk to a device must never load
+HEAVY: Final[tuple[str, ...]] = ('pychromecast', 'mpris_server', 'gi', 'rich')
+
+# milliseconds of imports, measured at about 90 ms, almost all of it click and the stdlib
+BUDGET: Final[int] = 250
+
+COMMANDS: Final[tuple[tuple[str, ...], ...]] = (
+  ('--version',),
+  ('service', 'list', '--help'),
+  ('service', 'log', '--help'),
+  ('service', 'disconnect', '--help'),
+  ('status', '--help'),
+)
+
+# run the CLI like `python -m cast_control`, then report what it imported. app.cli
+# asserts its own module name, so it can't run as __main__ itself
+RUN_CLI: Final[str] = '''
+import json, runpy, sys
+
+sys.argv = ['castctl', *sys.argv[1:]]
+
+try:
+  runpy.run_module('cast_control', run_name='__main__', alter_sys=True)
+
+except SystemExit:
+  pass
+
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+class Startup:
+  modules: set[str]
+  total: float  # milliseconds
+
+  def __init__(self, modules: set[str], total: float):
+    self.modules = modules
+    self.total = total
+
+
+def get_import_time(stderr: str) -> float:
+  """Milliseconds spent importing, the sum of every module's own time"""
+  total = 0
+
+  for line in stderr.splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+
+    _, times = line.split(':', 1)
+    own, *_ = times.split('|')
+    total += int(own)
+
+  return total / US_IN_MS
+
+
+def start(*args: str) -> Startup:
+  env = {**os.environ, 'PYTHONPATH': str(SRC)}
+  result = subprocess.run(
+    [sys.executable, '-X', 'importtime', '-c', RUN_CLI, *args],
+    capture_output=True, text=True, env=env, check=True,
+  )
+  *_, modules = result.stdout.splitlines()
+
+  return Startup(set(json.loads(modules)), get_import_time(result.stderr))
+
+
+def is_loaded(package: str, modules: set[str]) -> bool:
+  return any(module == package or module.startswith(f'{package}.') for module in modules)
+
+
+@pytest.mark.parametrize('args', COMMANDS, ids=' '.join)
+def test_light_commands(args: tuple[str, ...]):
+  startup = start(*args)
+  loaded = [package for package in HEAVY if is_loaded(package, startup.modules)]
+
+  assert not loaded, f'{" ".join(args)} imported {loaded}'
+  assert startup.total < BUDGET, f'{" ".join(args)} took {startup.total:.0f} ms to import'
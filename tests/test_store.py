@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+from decimal import Decimal
+from pathlib import Path
+from typing import Final
+from uuid import UUID
+
+import pytest
+
+from cast_control import store
+from cast_control.app.daemon import ARGS_KIND, Args
+from cast_control.store import NUMBER, OPTIONAL_STR, Schema, StoreError
+
+
+KIND: Final[str] = 'things'
+SCHEMA: Final[Schema] = {'name': OPTIONAL_STR, 'wait': NUMBER, 'icon': (bool,)}
+UUID_STR: Final[str] = '6fe4e0d2-1a4f-4c4e-9c5a-6f0e3b8c2d1a'
+
+ARGS: Final[Args] = Args(
+  name='Kitchen',
+  host='192.168.1.20',
+  uuid=UUID(UUID_STR),
+  wait=Decimal('2.5'),
+  retry_wait=None,
+  icon=True,
+  log_level='DEBUG',
+  devices=('Kitchen', 'Living Room'),
+)
+
+
+def test_args_round_trip(tmp_path: Path):
+  path = store.write(tmp_path / 'args.json', ARGS_KIND, ARGS.to_data())
+  loaded = Args.from_data(store.read(path, ARGS_KIND))
+
+  # UUIDs come back as strings, and Decimals as floats that compare equal
+  assert loaded == ARGS._replace(uuid=UUID_STR)
+  assert loaded.devices == ('Kitchen', 'Living Room')
+
+
+def test_args_defaults_round_trip():
+  assert Args.from_data(store.loads(store.dumps(ARGS_KIND, Args().to_data()), ARGS_KIND)) == Args()
+
+
+def test_args_keep_what_they_know():
+  data = dict(ARGS.to_data(), added_later=True)
+  assert Args.from_data(data) == ARGS._replace(uuid=UUID_STR)
+
+
+def test_unversioned_is_migrated():
+  text = json.dumps({'name': 'Kitchen'})
+  migrations = {store.NO_VERSION: lambda data: dict(data, migrated=True)}
+
+  assert store.loads(text, KIND, migrations) == {'name': 'Kitchen', 'migrated': True}
+
+
+def test_unversioned_without_migration():
+  with pytest.raises(StoreError, match="upgrade"):
+    store.loads(json.dumps({'name': 'Kitchen'}), KIND)
+
+
+def test_newer_version_is_rejected():
+  text = json.dumps({store.KIND_KEY: KIND, store.VERSION_KEY: store.VERSION + 1, store.DATA_KEY: {}})
+
+  with pytest.raises(StoreError, match='Unsupported'):
+    store.loads(text, KIND, {store.NO_VERSION: lambda data: data})
+
+
+def test_other_kind_is_rejected():
+  with pytest.raises(StoreError, match='Expected'):
+    store.loads(store.dumps('other', {}), KIND)
+
+
+@pytest.mark.parametrize('data', [
+  {'name': 1},
+  {'wait': '2.5'},
+  {'wait': None},
+  {'icon': 'yes'},
+  {'icon': 0},
+  ['name'],
+  None,
+])
+def test_wrong_types(data):
+  with pytest.raises(StoreError):
+    store.check(data, SCHEMA)
+
+
+@pytest.mark.parametrize('key', ['wait', 'retry_wait'])
+def test_bool_isnt_a_number(key: str):
+  with pytest.raises(StoreError, match='got bool'):
+    Args.from_data({key: True})
+
+
+def test_check_keeps_schema_fields():
+  assert store.check({'name': None, 'wait': 1, 'other': 2}, SCHEMA) == {'name': None, 'wait': 1}
+
+
+@pytest.mark.parametrize('text', ['', '{', '{"kind": "things", "version": 1, "da', 'not json', b'\xff\xfe'])
+def test_bad_json(text: str | bytes, tmp_path: Path):
+  with pytest.raises(StoreError, match="Can't parse"):
+    store.loads(text, KIND)
+
+  path = tmp_path / 'things.json'
+  path.write_bytes(text if isinstance(text, bytes) else text.encode())
+
+  with pytest.raises(StoreError):
+    store.read(path, KIND)
+
+
+def test_truncated_file(tmp_path: Path):
+  path = store.write(tmp_path / 'args.json', ARGS_KIND, ARGS.to_data())
+  text = path.read_bytes()
+  path.write_bytes(text[:len(text) // 2])
+
+  with pytest.raises(StoreError):
+    store.read(path, ARGS_KIND)
+
+
+def test_read_missing(tmp_path: Path):
+  assert store.read(tmp_path / 'missing.json', KIND) is None
+
+
+def get_leftovers(directory: Path) -> list[Path]:
+  return [path for path in directory.iterdir() if path.name.endswith(store.TMP_SUFFIX)]
+
+
+def test_failed_rename_leaves_no_partial_file(tmp_path: Path, monkeypatch):
+  path = store.write(tmp_path / 'things.json', KIND, {'name': 'old'})
+  before = path.read_bytes()
+
+  def fail(self, target):
+    raise OSError('disk full')
+
+  monkeypatch.setattr(Path, 'replace', fail)
+
+  with pytest.raises(OSError, match='disk full'):
+    store.write(path, KIND, {'name': 'new'})
+
+  assert path.read_bytes() == before
+  assert not get_leftovers(tmp_path)
+
+
+def test_failed_dump_leaves_no_partial_file(tmp_path: Path):
+  path = store.write(tmp_path / 'things.json', KIND, {'name': 'old'})
+  before = path.read_bytes()
+
+  with pytest.raises(TypeError):
+    store.write(path, KIND, {'name': object()})
+
+  assert path.read_bytes() == before
+  assert not get_leftovers(tmp_path)
+
+
+def test_write_replaces_whole_file(tmp_path: Path):
+  path = tmp_path / 'nested' / 'things.json'
+  store.write(path, KIND, {'name': 'a much longer name than the next one'})
+  store.write(path, KIND, {'name': 'short'})
+
+  assert store.read(path, KIND) == {'name': 'short'}
+  assert not get_leftovers(path.parent)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import random
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP, localcontext
+from typing import Final
+
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('mpris_server')
+
+from cast_control.base import US_IN_SEC
+from cast_control.device.base import to_microseconds, to_seconds
+from cast_control.device.wrapper import MIN_TIME, RESOLUTION
+
+
+SAMPLES: Final[int] = 20_000
+SEED: Final[int] = 7
+HOURS: Final[float] = 12 * 60 * 60.0  # longer than any stream we'd see
+EXACT: Final[int] = 50  # digits, enough that the old arithmetic never rounds
+OLD_PRECISION: Final[int] = 4  # the old process-wide context
+MIN_SECONDS: Final[Decimal] = Decimal(MIN_TIME) / US_IN_SEC
+
+
+# the Decimal versions these replaced, run in a context that doesn't round
+
+def old_to_microseconds(seconds: float) -> int:
+  with localcontext(prec=EXACT, rounding=ROUND_HALF_UP):
+    return round(Decimal(seconds) * US_IN_SEC)
+
+
+def old_has_current_time(seconds: float) -> bool:
+  with localcontext(prec=EXACT, rounding=ROUND_HALF_UP):
+    return round(Decimal(seconds), RESOLUTION) > 0
+
+
+def old_seek(microseconds: int) -> int:
+  with localcontext(prec=EXACT, rounding=ROUND_HALF_UP):
+    return round(Decimal(microseconds) / US_IN_SEC)
+
+
+def get_seconds(rand: random.Random) -> float:
+  # mostly everyday times, with some just around the edges
+  match rand.randrange(4):
+    case 0:
+      return rand.uniform(0, 1)
+
+    case 1:
+      return round(rand.uniform(0, HOURS), rand.randrange(7))
+
+    case 2:
+      return float(MIN_SECONDS) + rand.uniform(-1e-5, 1e-5)
+
+    case _:
+      return rand.uniform(0, HOURS)
+
+
+@pytest.fixture
+def samples() -> list[float]:
+  rand = random.Random(SEED)
+  return [get_seconds(rand) for _ in range(SAMPLES)]
+
+
+def test_to_microseconds_matches_old(samples: list[float]):
+  for seconds in samples:
+    new = to_microseconds(seconds)
+    old = old_to_microseconds(seconds)
+
+    # the float product can land on the other side of a half microsecond
+    assert abs(new - old) <= 1, seconds
+
+    exact = Decimal(seconds) * US_IN_SEC
+
+    if abs(exact - int(exact) - Decimal('0.5')) > Decimal('1e-3'):
+      assert new == old, seconds
+
+
+def test_to_microseconds_none():
+  assert to_microseconds(None) is None
+
+
+def test_has_current_time_matches_old(samples: list[float]):
+  for seconds in samples:
+    # within a microsecond of the cutoff, whole microseconds can't tell
+    if abs(Decimal(seconds) - MIN_SECONDS) * US_IN_SEC <= 1:
+      continue
+
+    assert (to_microseconds(seconds) >= MIN_TIME) == old_has_current_time(seconds), seconds
+
+
+def test_to_seconds_matches_old_seek():
+  rand = random.Random(SEED)
+  halves = [seconds * US_IN_SEC + US_IN_SEC // 2 for seconds in range(100)]
+  edges = [seconds * US_IN_SEC + offset for seconds in range(100) for offset in (-1, 0, 1)]
+  everyday = [rand.randrange(int(HOURS * US_IN_SEC)) for _ in range(SAMPLES)]
+
+  for microseconds in (*halves, *edges, *everyday):
+    if microseconds < 0:
+      continue
+
+    assert to_seconds(microseconds) == old_seek(microseconds), microseconds
+
+
+def test_old_context_was_lossy():
+  # why the process-wide context had to go, 20 minutes and change
+  seconds = 1_234.5678
+
+  with localcontext(prec=OLD_PRECISION, rounding=ROUND_HALF_UP):
+    assert round(Decimal(seconds) * US_IN_SEC) == 1_235_000_000
+
+    with pytest.raises(InvalidOperation):
+      round(Decimal(seconds), RESOLUTION)
+
+  assert to_microseconds(seconds) == 1_234_567_800
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('mpris_server')
+
+from cast_control.device.base import CacheInfo
+from cast_control.device.wrapper import TitlesMixin
+
+
+class Wrapper(TitlesMixin):
+  """Only what titles are built from"""
+
+  # plain attributes in place of the protocol's properties
+  media_status = None
+  device = None
+  is_youtube = False
+
+  def __init__(self):
+    self.media_status = SimpleNamespace(
+      title='Song', series_title=None, artist='Artist', album_name=None, media_metadata={},
+    )
+    self.device = SimpleNamespace(app_display_name='Spotify')
+    self.is_youtube = False
+    super().__init__()
+
+
+def test_titles_hit_until_a_field_changes():
+  wrapper = Wrapper()
+  first = wrapper.titles
+
+  # statuses without new titles, like position updates
+  for _ in range(3):
+    assert wrapper.titles is first
+
+  assert wrapper.titles_cache_info() == CacheInfo(hits=3, misses=1)
+
+  # statuses are updated in place
+  wrapper.media_status.title = 'Next song'
+  assert wrapper.titles.title == 'Next song'
+  assert wrapper.titles_cache_info() == CacheInfo(hits=3, misses=2)
+
+
+def test_titles_follow_app_and_youtube():
+  wrapper = Wrapper()
+  wrapper.media_status.media_metadata = {'subtitle': 'Channel'}
+  wrapper.media_status.artist = None
+  wrapper.titles
+
+  wrapper.is_youtube = True
+  assert wrapper.titles.artist == 'Channel'
+
+  wrapper.device.app_display_name = 'YouTube'
+  wrapper.titles
+  assert wrapper.titles_cache_info().misses == 3
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import sys
+import threading
+from typing import Final
+
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('mpris_server')
+
+from mpris_server import Microseconds, PlayState
+from pychromecast.controllers.media import MediaStatus
+
+from cast_control.base import US_IN_SEC
+from cast_control.device import wrapper as wrapper_module
+from cast_control.device.base import Abilities, Snapshot, Titles, to_microseconds
+from cast_control.device.wrapper import SEEK_TOLERANCE, SnapshotMixin, TimeMixin
+
+
+STATUSES: Final[int] = 500
+READERS: Final[int] = 2
+SWITCH_INTERVAL: Final[float] = 1e-5  # seconds, switch threads often so reads land mid-update
+NS_IN_SEC: Final[int] = 1_000_000_000
+
+
+class SnapshotWrapper(SnapshotMixin):
+  """Every value comes from the status generation it was read in"""
+
+  media_status = None
+
+  def __init__(self):
+    self.generation = 0
+    super().__init__()
+
+  def _read(self) -> int:
+    return self.generation
+
+  @property
+  def titles(self) -> Titles:
+    return Titles(title=str(self._read()))
+
+  def _get_icon_from_device(self, titles: Titles) -> str:
+    return f'icon-{self._read()}'
+
+  def _get_status_duration(self) -> int:
+    return self._read()
+
+  def _get_playstate(self) -> PlayState:
+    return PlayState.PLAYING if self._read() % 2 else PlayState.PAUSED
+
+  def _get_abilities(self) -> Abilities:
+    return Abilities(can_seek=bool(self._read() % 2))
+
+  def _get_volume(self) -> float:
+    return self._read() / STATUSES
+
+  def _is_mute(self) -> bool:
+    return bool(self._read() % 2)
+
+  def _get_url(self) -> str:
+    return f'https://example.com/{self._read()}'
+
+
+def get_generation(snapshot: Snapshot) -> int:
+  generation = int(snapshot.titles.title)
+  odd = bool(generation % 2)
+
+  assert snapshot == Snapshot(
+    titles=Titles(title=str(generation)),
+    art_url=f'icon-{generation}',
+    duration=generation,
+    playstate=PlayState.PLAYING if odd else PlayState.PAUSED,
+    abilities=Abilities(can_seek=odd),
+    volume=generation / STATUSES,
+    is_mute=odd,
+    url=f'https://example.com/{generation}',
+    track=None,
+    stream_title=str(generation),
+  ), f'snapshot mixes statuses: {snapshot}'
+
+  return generation
+
+
+def test_snapshot_is_built_once_per_status():
+  wrapper = SnapshotWrapper()
+  first = wrapper.snapshot
+
+  assert wrapper.snapshot is first
+
+  wrapper.generation += 1
+  assert wrapper.snapshot is first, 'built from a status, not on read'
+
+  wrapper.on_new_status()
+  assert get_generation(wrapper.snapshot) == 1
+
+
+@pytest.fixture
+def switch_often():
+  interval = sys.getswitchinterval()
+  sys.setswitchinterval(SWITCH_INTERVAL)
+
+  yield
+  sys.setswitchinterval(interval)
+
+
+def test_readers_see_whole_snapshots(switch_often):
+  wrapper = SnapshotWrapper()
+  wrapper.on_new_status()
+  done = threading.Event()
+  errors: list[AssertionError] = []
+
+  def read():
+    last = 0
+
+    while not done.is_set():
+      try:
+        generation = get_generation(wrapper.snapshot)
+
+        # and never an older one than they've seen
+        assert generation >= last, f'{generation} after {last}'
+
+      except AssertionError as e:
+        errors.append(e)
+        return
+
+      last = generation
+
+  readers = [threading.Thread(target=read) for _ in range(READERS)]
+
+  for reader in readers:
+    reader.start()
+
+  for _ in range(STATUSES):
+    wrapper.generation += 1
+    wrapper.on_new_status()
+
+  done.set()
+
+  for reader in readers:
+    reader.join()
+
+  assert not errors, errors[0]
+  assert get_generation(wrapper.snapshot) == STATUSES
+
+
+class TimeWrapper(TimeMixin):
+  """Only what the position clock is built from"""
+
+  media_status = None
+
+  def __init__(self):
+    self.media_status = None
+    super().__init__()
+
+  def report(self, seconds: float, content_id: str = 'song', state: str = 'PLAYING') -> Microseconds | None:
+    """A new status with the position the device reports, and whether it was a seek"""
+    status = MediaStatus()
+    status.current_time = seconds
+    status.content_id = content_id
+    status.player_state = state
+    self.media_status = status
+
+    self._update_clock()
+    return self.get_seeked()
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[int]:
+  now = [0]
+  monkeypatch.setattr(wrapper_module, 'monotonic_ns', lambda: now[0])
+
+  return now
+
+
+def after(clock: list[int], seconds: float):
+  clock[0] += round(seconds * NS_IN_SEC)
+
+
+def test_first_status_isnt_a_seek(clock: list[int]):
+  assert TimeWrapper().report(30.0) is None
+
+
+@pytest.mark.parametrize('reported', [11.0, 11.9, 10.2, 12.0])
+def test_drift_isnt_a_seek(clock: list[int], reported: float):
+  wrapper = TimeWrapper()
+  wrapper.report(10.0)
+  after(clock, 1.0)
+
+  # within SEEK_TOLERANCE of where playback should be
+  assert wrapper.report(reported) is None
+
+
+@pytest.mark.parametrize('reported', [30.0, 0.0, 12.5, 9.0])
+def test_jump_is_a_seek(clock: list[int], reported: float):
+  wrapper = TimeWrapper()
+  wrapper.report(10.0)
+  after(clock, 1.0)
+
+  assert wrapper.report(reported) == to_microseconds(reported)
+
+  # and only for the status that jumped
+  after(clock, 1.0)
+  assert wrapper.report(reported + 1.0) is None
+
+
+def test_tolerance_edge(clock: list[int]):
+  wrapper = TimeWrapper()
+  wrapper.report(10.0)
+  after(clock, 1.0)
+
+  # 11s expected, off by exactly the tolerance
+  assert wrapper.report((11 * US_IN_SEC + SEEK_TOLERANCE) / US_IN_SEC) is None
+
+  # 13s expected, off by a microsecond more
+  after(clock, 1.0)
+  assert wrapper.report((13 * US_IN_SEC + SEEK_TOLERANCE + 1) / US_IN_SEC) is not None
+
+
+@pytest.mark.parametrize('content_id', ['next song', 'https://example.com/next.mp3'])
+def test_new_content_isnt_a_seek(clock: list[int], content_id: str):
+  wrapper = TimeWrapper()
+  wrapper.report(200.0, 'https://example.com/song.mp3')
+  after(clock, 1.0)
+
+  assert wrapper.report(0.0, content_id) is None
+
+
+def test_paused_position_change_is_a_seek(clock: list[int]):
+  wrapper = TimeWrapper()
+  wrapper.report(10.0, state='PAUSED')
+
+  # a paused clock stays put
+  after(clock, 5.0)
+  assert wrapper.report(10.0, state='PAUSED') is None
+
+  after(clock, 1.0)
+  assert wrapper.report(40.0, state='PAUSED') == to_microseconds(40.0)
+
+
+def test_resume_isnt_a_seek(clock: list[int]):
+  wrapper = TimeWrapper()
+  wrapper.report(10.0, state='PAUSED')
+  after(clock, 60.0)
+
+  assert wrapper.report(10.0) is None
+
+  after(clock, 1.0)
+  assert wrapper.report(11.0) is None